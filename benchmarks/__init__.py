@@ -0,0 +1,12 @@
+'''
+benchmarks, each run as `python -m benchmarks.<name>` from the repository root
+
+- `end_to_end`: `DocumentTranslator` on a synthetic corpus (see `corpus`)
+- `micro`: primitives of parsing and markup handling, compared to a baseline
+- `cold_start`: import times, and the time of a fresh process to its first
+  translated document
+- `worker_pool`: throughput of a `TranslationPool` by its number of workers
+- `precision`: speed, RSS and agreement of int8 and bf16 inference with fp32
+- `debug_logging`, `fuzzy_memory`, `latex_context`, `logger_startup`,
+  `textitem_memory`: individual parts of the pipeline
+'''
@@ -0,0 +1,124 @@
+'''
+measures the import time of the main modules of the package, and the time a
+fresh process takes to translate a small document (see `corpus.py`), each in
+new interpreters; reports the best of `--repeats` runs as a single JSON object
+
+by default, `NullTranslatorAligner` is used; `--marian <checkpoint>` instead
+uses a tiny Marian model (see `end_to_end.py`), including the time to load it
+
+usage: `python -m benchmarks.cold_start [--repeats N] [--marian TOKENIZER_CHECKPOINT] [--output results.jsonl]`
+'''
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from .corpus import CorpusGenerator, CorpusParams
+from .end_to_end import git_revision, save_tiny_marian
+
+# type imports
+from pathlib import Path
+
+
+modules = [
+    'latexmt_core.markup_string',
+    'latexmt_core.parsing.to_text',
+    'latexmt_core.alignment',
+    'latexmt_core.document_processor',
+    'latexmt_core.get_translator',
+    'latexmt_core.translation.opus',
+]
+
+# imported modules worth reporting, as they take long to import
+heavy_modules = ['numpy', 'torch', 'transformers']
+
+_import_script = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - start,
+                  'heavy_modules': [name for name in {heavy_modules!r} if name in sys.modules]}}))
+'''
+
+_translate_script = '''
+import json, time
+start = time.perf_counter()
+from pathlib import Path
+from latexmt_core.document_processor import DocumentTranslator
+from latexmt_core.get_translator import get_translator_aligner
+translator, aligner = get_translator_aligner('de', 'en', {trans_type!r}, {trans_type!r}, opus_model_base={model_base!r})
+DocumentTranslator(translator, aligner).process_document(Path({root_document!r}), Path({output_dir!r}))
+print(json.dumps({{'seconds': time.perf_counter() - start}}))
+'''
+
+
+def run_script(script: str) -> tuple[dict, float]:
+    '''
+    returns the JSON printed by `script` and the wall time of its process
+    '''
+    start = time.perf_counter()
+    output = subprocess.check_output([sys.executable, '-c', script], text=True, cwd=Path(__file__).parent.parent)
+    return json.loads(output.splitlines()[-1]), time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--paragraphs', type=int, default=20)
+    parser.add_argument('--marian', metavar='TOKENIZER_CHECKPOINT', default=None)
+    parser.add_argument('--output', type=Path, default=None,
+                        help='append the result as a line of JSON to this file')
+    args = parser.parse_args()
+
+    imports = dict[str, dict]()
+    for module in modules:
+        best = min((run_script(_import_script.format(module=module, heavy_modules=heavy_modules))[0]
+                    for _ in range(args.repeats)), key=lambda result: result['seconds'])
+        imports[module] = best
+        print(f'{module:40} {best['seconds'] * 1e3:8.1f} ms  {' '.join(best['heavy_modules'])}', file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        params = CorpusParams(paragraphs=args.paragraphs, input_fanout=0, tikz_blocks=0, verbatim_blocks=0)
+        root_document = CorpusGenerator(params).generate(Path(work_dir, 'corpus'))
+
+        model_base = None
+        if args.marian is not None:
+            model_base = str(Path(work_dir, 'model'))
+            save_tiny_marian(args.marian, Path(model_base))
+
+        script = _translate_script.format(trans_type='null' if args.marian is None else 'opus',
+                                          model_base=model_base, root_document=str(root_document),
+                                          output_dir=str(Path(work_dir, 'output')))
+        runs = [run_script(script) for _ in range(args.repeats)]
+
+    # in the process, and including interpreter startup
+    translate_seconds = min(result['seconds'] for result, _ in runs)
+    process_seconds = min(wall_time for _, wall_time in runs)
+    print(f'{'first document':40} {translate_seconds * 1e3:8.1f} ms  ({process_seconds * 1e3:.1f} ms per process)',
+          file=sys.stderr)
+
+    result = {
+        'benchmark': 'cold_start',
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'backend': 'null' if args.marian is None else 'tiny-marian',
+        'import_seconds': {module: imports[module]['seconds'] for module in modules},
+        'heavy_modules': {module: imports[module]['heavy_modules'] for module in modules},
+        'first_document_seconds': translate_seconds,
+        'process_seconds': process_seconds,
+    }
+
+    print(json.dumps(result, indent=2))
+    if args.output is not None:
+        with open(args.output, 'a') as output_file:
+            output_file.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+'''
+generates synthetic LaTeX documents for benchmarking, with scalable amounts
+of paragraphs, math, nested markup, citations, `\\input` files and large
+non-translatable (tikz/verbatim) blocks
+
+usage: `python -m benchmarks.corpus <output_dir> [paragraphs] [input_fanout]`
+'''
+
+from dataclasses import dataclass
+import random
+import sys
+
+# type imports
+from pathlib import Path
+
+
+# syllables from which the words of the synthetic (German-looking) text are built
+_syllables = ['ab', 'an', 'be', 'ber', 'bil', 'da', 'de', 'der', 'die', 'ein', 'en', 'er', 'fa',
+              'ge', 'gen', 'hal', 'hei', 'in', 'keit', 'lich', 'lung', 'ma', 'mit', 'ne', 'nen',
+              'rung', 'sch', 'sei', 'ste', 'ten', 'ter', 'tung', 'um', 'un', 'ver', 'wei', 'zu', 'ün']
+
+_markup_macros = ['emph', 'textbf', 'textit', 'underline']
+_math_snippets = [r'x^2', r'\alpha + \beta', r'f(x) = \sum_{i=1}^n a_i x^i', r'\mathbb{R}^n',
+                  r'\frac{a}{b}', r'\|v\|_2 \leq 1', r'n \in \mathbb{N}']
+
+
+@dataclass
+class CorpusParams:
+    # paragraphs per file
+    paragraphs: int = 200
+    sentences_per_paragraph: tuple[int, int] = (2, 6)
+    words_per_sentence: tuple[int, int] = (6, 20)
+    paragraphs_per_section: int = 10
+
+    # probabilities per sentence
+    math_density: float = 0.3
+    markup_density: float = 0.3
+    cite_frequency: float = 0.1
+    # macros unknown to the LaTeX context, with an argument and followed by a
+    # group, which are told apart by the state of the masked-text converter
+    unknown_macro_density: float = 0.0
+    # maximum depth of nested markup macros
+    markup_depth: int = 2
+
+    # number of files included by each file, and levels of inclusion
+    input_fanout: int = 0
+    input_depth: int = 1
+
+    # large non-translatable blocks per file, and their number of lines
+    tikz_blocks: int = 1
+    verbatim_blocks: int = 1
+    block_lines: int = 200
+
+    seed: int = 0
+
+
+class CorpusGenerator:
+    params: CorpusParams
+
+    __rng: random.Random
+    __num_files: int
+    __num_paragraphs: int
+
+    def __init__(self, params: CorpusParams = CorpusParams()):
+        self.params = params
+        self.__rng = random.Random(params.seed)
+        self.__num_files = 0
+        self.__num_paragraphs = 0
+
+    @property
+    def num_files(self) -> int:
+        return self.__num_files
+
+    @property
+    def num_paragraphs(self) -> int:
+        '''
+        number of paragraphs of running text generated so far
+        '''
+        return self.__num_paragraphs
+
+    def __word(self) -> str:
+        return ''.join(self.__rng.choices(_syllables, k=self.__rng.randint(1, 4)))
+
+    def __markup(self, depth: int) -> str:
+        words = ' '.join(self.__word() for _ in range(self.__rng.randint(1, 4)))
+        if depth < self.params.markup_depth and self.__rng.random() < 0.5:
+            words += ' ' + self.__markup(depth + 1)
+        return f'\\{self.__rng.choice(_markup_macros)}{{{words}}}'
+
+    def __sentence(self) -> str:
+        params = self.params
+        words = [self.__word() for _ in range(self.__rng.randint(*params.words_per_sentence))]
+        words[0] = words[0].capitalize()
+
+        if self.__rng.random() < params.math_density:
+            words.insert(self.__rng.randrange(1, len(words) + 1), f'${self.__rng.choice(_math_snippets)}$')
+        if self.__rng.random() < params.markup_density:
+            words.insert(self.__rng.randrange(1, len(words) + 1), self.__markup(1))
+        if self.__rng.random() < params.cite_frequency:
+            words.append(f'\\cite{{ref{self.__rng.randrange(1000)}}}')
+        # checked only if enabled, so that other corpora stay the same
+        if params.unknown_macro_density > 0 and self.__rng.random() < params.unknown_macro_density:
+            words.insert(self.__rng.randrange(1, len(words) + 1),
+                         f'\\x{self.__word()}{{{self.__word()}}} {{{self.__word()}}}')
+
+        return ' '.join(words) + '.'
+
+    def __paragraph(self) -> str:
+        self.__num_paragraphs += 1
+        return ' '.join(self.__sentence()
+                        for _ in range(self.__rng.randint(*self.params.sentences_per_paragraph)))
+
+    def __tikz_block(self) -> str:
+        lines = [f'\\draw ({i},{self.__rng.randrange(100)}) -- ({i + 1},{self.__rng.randrange(100)}) '
+                 f'node {{{self.__word()}}};' for i in range(self.params.block_lines)]
+        return '\\begin{tikzpicture}\n' + '\n'.join(lines) + '\n\\end{tikzpicture}'
+
+    def __verbatim_block(self) -> str:
+        lines = [f'{self.__word()} = {self.__rng.randrange(10**6)}  # {self.__word()} \\emph{{{self.__word()}}}'
+                 for _ in range(self.params.block_lines)]
+        return '\\begin{verbatim}\n' + '\n'.join(lines) + '\n\\end{verbatim}'
+
+    def __body(self, name: str, depth: int, output_dir: Path) -> str:
+        params = self.params
+
+        blocks = list[str]()
+        for paragraph_idx in range(params.paragraphs):
+            if paragraph_idx % params.paragraphs_per_section == 0:
+                blocks.append(f'\\section{{{self.__word().capitalize()} {self.__word()}}}')
+            blocks.append(self.__paragraph())
+
+        for _ in range(params.tikz_blocks):
+            blocks.insert(self.__rng.randrange(len(blocks) + 1), self.__tikz_block())
+        for _ in range(params.verbatim_blocks):
+            blocks.insert(self.__rng.randrange(len(blocks) + 1), self.__verbatim_block())
+
+        if depth < params.input_depth:
+            for input_idx in range(params.input_fanout):
+                input_name = f'{name}-{input_idx}'
+                self.__write_file(output_dir, input_name, self.__body(input_name, depth + 1, output_dir))
+                blocks.insert(self.__rng.randrange(len(blocks) + 1), f'\\input{{{input_name}}}')
+
+        return '\n\n'.join(blocks) + '\n'
+
+    def __write_file(self, output_dir: Path, name: str, text: str):
+        output_dir.joinpath(f'{name}.tex').write_text(text)
+        self.__num_files += 1
+
+    def generate(self, output_dir: Path) -> Path:
+        '''
+        write the corpus to `output_dir`; returns the path of the root document
+        '''
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        body = self.__body('main', 0, output_dir)
+        preamble = '\n'.join([
+            '\\documentclass{article}',
+            '\\usepackage{amsmath,amssymb}',
+            '\\usepackage{tikz}',
+            '\\newcommand{\\R}{\\mathbb{R}}',
+            '\\begin{document}',
+            f'\\title{{{self.__word().capitalize()}}}',
+            '\\maketitle',
+        ])
+        self.__write_file(output_dir, 'main', f'{preamble}\n\n{body}\n\\end{{document}}\n')
+
+        return output_dir.joinpath('main.tex')
+
+
+def main(output_dir: str, paragraphs: int = 200, input_fanout: int = 0):
+    generator = CorpusGenerator(CorpusParams(paragraphs=paragraphs, input_fanout=input_fanout))
+    root_document = generator.generate(Path(output_dir))
+    print(f'{root_document}: {generator.num_files} files, {generator.num_paragraphs} paragraphs')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], *map(int, sys.argv[2:4]))
@@ -0,0 +1,77 @@
+'''
+measures the time per textitem of translating a LaTeX document with the null
+translator, with logging at INFO and at DEBUG level
+
+at INFO level, no debug payloads should be computed at all, so the difference
+between both levels is the cost saved when debug logging is off
+
+the document is taken from `--input`, or else generated (see `corpus.py`)
+
+usage: `python -m benchmarks.debug_logging [--input main.tex] [--paragraphs N] [--repeats N]`
+'''
+
+from argparse import ArgumentParser
+import io
+import logging
+import tempfile
+import time
+
+from latexmt_core.context_logger import logger_from_kwargs
+from latexmt_core.document_processor import DocumentTranslator
+from latexmt_core.metrics import MetricsRegistry
+from latexmt_core.translation.null import NullTranslatorAligner
+from .corpus import CorpusGenerator, CorpusParams
+
+# type imports
+from pathlib import Path
+
+
+class ContextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return f'{super().format(record)} {getattr(record, 'context', {})}'
+
+
+def run(input_path: Path, repeats: int):
+    # records are formatted, including their context, as a handler would
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setFormatter(ContextFormatter('%(levelname)s %(message)s'))
+    logging.getLogger().addHandler(handler)
+
+    logger = logger_from_kwargs(logger_name='benchmark')
+    translator = NullTranslatorAligner('de', 'en', logger=logger)
+
+    for level in (logging.INFO, logging.DEBUG):
+        logging.getLogger().setLevel(level)
+
+        best = float('inf')
+        num_textitems = 0
+        for _ in range(repeats):
+            metrics = MetricsRegistry()
+            document_translator = DocumentTranslator(translator, translator, metrics=metrics, logger=logger)
+            with tempfile.TemporaryDirectory() as output_dir:
+                start = time.perf_counter()
+                document_translator.process_document(input_path, Path(output_dir))
+                best = min(best, time.perf_counter() - start)
+            num_textitems = int(metrics.counter('textitems_total').value)
+
+        print(f'{logging.getLevelName(level)}: {best * 1e3:.1f} ms, '
+              f'{best / max(num_textitems, 1) * 1e6:.0f} us/textitem ({num_textitems} textitems)')
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--input', type=Path, default=None)
+    parser.add_argument('--paragraphs', type=int, default=200,
+                        help='paragraphs of the generated document, without `--input`')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        input_path = args.input
+        if input_path is None:
+            input_path = CorpusGenerator(CorpusParams(paragraphs=args.paragraphs)).generate(Path(corpus_dir))
+        run(input_path, args.repeats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+'''
+runs `DocumentTranslator` end-to-end on a synthetic corpus (see `corpus.py`)
+and reports files/s, paragraphs/s and peak RSS as a single JSON object, for
+tracking regressions across commits
+
+by default, `NullTranslatorAligner` is used, so only the LaTeX pipeline itself
+is measured; `--marian <checkpoint>` instead uses a tiny, randomly initialised
+Marian model with the tokenizer of `checkpoint`, which must be available
+offline (e.g. in the Hugging Face cache)
+
+usage: `python -m benchmarks.end_to_end [--paragraphs N] [--input-fanout N] ... [--output results.jsonl]`
+'''
+
+from argparse import ArgumentParser
+from dataclasses import asdict, fields
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+
+from latexmt_core.document_processor import DocumentTranslator
+from latexmt_core.metrics import MetricsRegistry
+from .corpus import CorpusGenerator, CorpusParams
+
+# type imports
+from pathlib import Path
+from latexmt_core.alignment import Aligner
+from latexmt_core.translation import Translator
+
+
+def save_tiny_marian(tokenizer_checkpoint: str, model_dir: Path):
+    '''
+    save a randomly initialised Marian model, as small as the aligner permits
+    (which reads the cross attentions of the sixth decoder layer), along with
+    the tokenizer of `tokenizer_checkpoint`
+    '''
+    from transformers import AutoTokenizer, MarianConfig, MarianMTModel
+
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_checkpoint)
+    config = MarianConfig(
+        vocab_size=len(tokenizer),
+        d_model=32, encoder_layers=1, decoder_layers=6,
+        encoder_attention_heads=2, decoder_attention_heads=2,
+        encoder_ffn_dim=64, decoder_ffn_dim=64,
+        pad_token_id=tokenizer.pad_token_id, eos_token_id=tokenizer.eos_token_id,
+        decoder_start_token_id=tokenizer.pad_token_id,
+        max_length=64,
+    )
+    MarianMTModel(config).save_pretrained(model_dir)
+    tokenizer.save_pretrained(model_dir)
+
+
+def get_translator_aligner(marian_checkpoint: str | None, model_dir: Path) -> tuple[Translator, Aligner]:
+    if marian_checkpoint is None:
+        from latexmt_core.translation.null import NullTranslatorAligner
+        translator = NullTranslatorAligner('de', 'en')
+        return translator, translator
+
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    save_tiny_marian(marian_checkpoint, model_dir)
+
+    from latexmt_core.translation.opus import OpusTransformersTranslatorAligner
+    translator = OpusTransformersTranslatorAligner('de', 'en', opus_model_base=str(model_dir))
+    return translator, translator
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL, cwd=Path(__file__).parent).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    defaults = CorpusParams()
+    for field in fields(CorpusParams):
+        default = getattr(defaults, field.name)
+        if isinstance(default, (int, float)):
+            parser.add_argument(f'--{field.name.replace('_', '-')}', type=type(default), default=default)
+    parser.add_argument('--output-mode', choices=['nodes', 'spans'], default='nodes')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--marian', metavar='TOKENIZER_CHECKPOINT', default=None)
+    parser.add_argument('--output', type=Path, default=None,
+                        help='append the result as a line of JSON to this file')
+    args = parser.parse_args()
+
+    params = CorpusParams(**{field.name: getattr(args, field.name) for field in fields(CorpusParams)
+                             if hasattr(args, field.name)})
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        generator = CorpusGenerator(params)
+        root_document = generator.generate(Path(work_dir, 'corpus'))
+        translator, aligner = get_translator_aligner(args.marian, Path(work_dir, 'model'))
+
+        best_time = float('inf')
+        metrics = MetricsRegistry()
+        for repeat in range(args.repeats):
+            metrics.clear()
+            document_translator = DocumentTranslator(translator, aligner, output_mode=args.output_mode,
+                                                     metrics=metrics)
+            start = time.perf_counter()
+            document_translator.process_document(root_document, Path(work_dir, f'output-{repeat}'))
+            best_time = min(best_time, time.perf_counter() - start)
+
+    num_files = metrics.counter('files_total', status='translated').value
+    num_paragraphs = sum(metrics.counter('paragraphs_total', status=status).value
+                         for status in ['translated', 'reused', 'failed'])
+
+    result = {
+        'benchmark': 'end_to_end',
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'backend': 'null' if args.marian is None else 'tiny-marian',
+        'output_mode': args.output_mode,
+        'corpus': asdict(params),
+        'files': num_files,
+        'paragraphs': num_paragraphs,
+        'seconds': best_time,
+        'files_per_second': num_files / best_time,
+        'paragraphs_per_second': num_paragraphs / best_time,
+        # kilobytes on Linux
+        'peak_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        # of the last repeat
+        'stage_seconds': {
+            '/'.join(histogram['labels'].values()): histogram['sum']
+            for histogram in metrics.to_json()['histograms'] if histogram['name'] == 'stage_seconds'
+        },
+    }
+
+    print(json.dumps(result, indent=2))
+    if args.output is not None:
+        with open(args.output, 'a') as output_file:
+            output_file.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
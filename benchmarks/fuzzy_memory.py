@@ -0,0 +1,64 @@
+'''
+measures the lookup latency of the fuzzy translation-memory index on a
+synthetic corpus of sentences
+
+usage: `python -m benchmarks.fuzzy_memory [entries] [queries]`
+'''
+
+import random
+import sys
+import time
+
+from latexmt_core.document_processor.fuzzy import MinHashIndex
+
+
+def random_sentence(rng: random.Random, vocabulary: list[str]) -> str:
+    return ' '.join(rng.choices(vocabulary, k=rng.randint(8, 30))) + '.'
+
+
+def perturb(rng: random.Random, sentence: str, vocabulary: list[str]) -> str:
+    '''
+    replace a single word, as in a revised sentence
+    '''
+    words = sentence.split(' ')
+    words[rng.randrange(len(words))] = rng.choice(vocabulary)
+    return ' '.join(words)
+
+
+def main(entries: int = 1_000_000, queries: int = 1000, threshold: float = 0.8):
+    rng = random.Random(0)
+    vocabulary = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyzäöü', k=rng.randint(2, 10)))
+                  for _ in range(20_000)]
+
+    index = MinHashIndex()
+    sample = list[str]()
+
+    start = time.perf_counter()
+    for entry in range(entries):
+        sentence = random_sentence(rng, vocabulary)
+        index.add(sentence)
+        if entry % (entries // queries or 1) == 0:
+            sample.append(sentence)
+    build_time = time.perf_counter() - start
+    print(f'indexed {entries} entries in {build_time:.1f} s ({build_time / entries * 1e6:.1f} us/entry)')
+
+    for label, texts in [
+        ('near-duplicate', [perturb(rng, sentence, vocabulary) for sentence in sample[:queries]]),
+        ('unseen', [random_sentence(rng, vocabulary) for _ in range(queries)]),
+    ]:
+        hits = 0
+        latencies = list[float]()
+        for text in texts:
+            start = time.perf_counter()
+            matches = index.query(text, threshold)
+            latencies.append(time.perf_counter() - start)
+            hits += len(matches) > 0
+
+        latencies.sort()
+        print(f'{label} queries: {hits}/{len(texts)} matched, '
+              f'median {latencies[len(latencies) // 2] * 1e6:.0f} us, '
+              f'p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f} us')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
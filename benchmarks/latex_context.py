@@ -0,0 +1,38 @@
+'''
+measures the import cost of the parsing modules and the per-file cost of
+setting up the LaTeX context used for parsing
+
+usage: `python -m benchmarks.latex_context [repetitions]`
+'''
+
+import subprocess
+import sys
+import timeit
+
+from latexmt_core.parsing.latex_context import get_latex_context, get_static_latex_context
+
+
+def measure_import(module: str) -> float:
+    '''
+    import `module` in a fresh interpreter and return the time taken in seconds
+    '''
+    code = ('import time; t = time.perf_counter(); '
+            f'import {module}; '
+            'print(time.perf_counter() - t)')
+    return float(subprocess.check_output([sys.executable, '-c', code], text=True))
+
+
+def main(repetitions: int = 1000):
+    for module in ['latexmt_core.parsing.latex_context', 'latexmt_core.parsing.unpack']:
+        print(f'import {module}: {measure_import(module) * 1e3:.1f} ms')
+
+    # building the full context was previously done for every file
+    full_time = timeit.timeit(get_static_latex_context.__wrapped__, number=repetitions)
+    print(f'full context build: {full_time / repetitions * 1e6:.1f} us')
+
+    layered_time = timeit.timeit(lambda: get_latex_context([]), number=repetitions)
+    print(f'get_latex_context(): {layered_time / repetitions * 1e6:.1f} us/file')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,52 @@
+'''
+measures the cost of constructing loggers through `logger_from_kwargs`, as
+done by every translator, aligner and `DocumentTranslator`, compared to
+resolving the caller through `inspect.stack` as done previously
+
+usage: `python -m benchmarks.logger_startup [--iterations N]`
+'''
+
+from argparse import ArgumentParser
+import inspect
+import time
+
+from latexmt_core.context_logger import logger_from_kwargs
+from latexmt_core.document_processor import DocumentTranslator
+from latexmt_core.translation.null import NullTranslatorAligner
+
+
+def inspect_caller_name() -> str:
+    caller_module = inspect.getmodule(inspect.stack()[1][0])
+    assert caller_module is not None
+    return caller_module.__name__
+
+
+def measure(label: str, func, iterations: int):
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f'{label}: {elapsed / iterations * 1e6:.1f} us')
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--iterations', type=int, default=1000)
+    iterations = parser.parse_args().iterations
+
+    # `inspect.stack` reads the source of every frame on the stack, so its
+    # cost grows with the depth at which loggers are created
+    measure('caller resolution via inspect.stack', inspect_caller_name, iterations)
+    measure('logger_from_kwargs()', lambda: logger_from_kwargs(), iterations)
+    measure('logger_from_kwargs(logger_name=...)', lambda: logger_from_kwargs(logger_name=__name__), iterations)
+
+    def construct():
+        translator = NullTranslatorAligner('de', 'en')
+        DocumentTranslator(translator, translator)
+
+    measure('NullTranslatorAligner + DocumentTranslator', construct, iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+'''
+micro-benchmarks of the primitives dominating the CPU time of the pipeline,
+on inputs generated by `corpus.py` and scaled by `--size` (in paragraphs)
+
+usage:
+- `python -m benchmarks.micro run [--size N] [--filter TEXT] [--save BASELINE]`
+- `python -m benchmarks.micro compare [--baseline BASELINE] [--threshold 0.1]`
+
+`compare` runs the benchmarks with the size stored in the baseline, and exits
+with status 1 if any of them got slower by more than `threshold`; baselines
+are specific to the machine they were recorded on, so none is stored in the
+repository: record one with `run --save` before making changes
+'''
+
+from argparse import ArgumentParser
+import json
+import platform
+import sys
+import tempfile
+import time
+
+from latexmt_core.alignment import words_spans_to_markupstr
+from latexmt_core.alignment.wordsplit import get_words_and_spans, split_words
+from latexmt_core.document_processor.helpers import textitem_flatlist_to_nodelist
+from latexmt_core.parsing.latex_context import get_latex_context
+from latexmt_core.parsing.parsplit import parsplit
+from latexmt_core.parsing.repack import nodelist_to_latex, replace_nodes
+from latexmt_core.parsing.unpack import latex_to_nodelist, get_textitems
+from .corpus import CorpusGenerator, CorpusParams
+from .end_to_end import git_revision
+
+# type imports
+from pathlib import Path
+from typing import Callable
+
+
+default_baseline = Path(__file__).parent.joinpath('baselines', 'micro.json')
+
+
+def get_cases(size: int) -> dict[str, Callable[[], object]]:
+    '''
+    returns the benchmarked calls, by name; all inputs are prepared here
+    '''
+    params = CorpusParams(paragraphs=size, paragraphs_per_section=size, tikz_blocks=0, verbatim_blocks=0)
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        input_text = CorpusGenerator(params).generate(Path(corpus_dir)).read_text()
+
+    latex_context = get_latex_context([])
+    nodelist = latex_to_nodelist(input_text, latex_context)
+    # the section body, holding all paragraphs
+    textitem = max(get_textitems(nodelist, latex_context), key=lambda textitem: len(textitem.text))
+
+    text = textitem.text
+    plaintext = str(text)
+    half = len(text) // 2
+    first_half, second_half = text[:half], text[half:]
+    words, spans = get_words_and_spans(text)
+    flatlist = text.to_markup_list()
+    translated_nodelist = textitem_flatlist_to_nodelist(textitem, flatlist)
+
+    return {
+        'MarkupString.__add__': lambda: first_half + second_half,
+        'MarkupString.__getitem__': lambda: text[len(text) // 4:3 * len(text) // 4],
+        'MarkupString.re_sub': lambda: text.re_sub(r'\s+', ' '),
+        'MarkupString.to_markup_list': lambda: text.to_markup_list(),
+        'parsplit': lambda: parsplit(text),
+        'split_words': lambda: list(split_words(plaintext)),
+        'get_words_and_spans': lambda: get_words_and_spans(text),
+        'words_spans_to_markupstr': lambda: words_spans_to_markupstr(words, spans),
+        'textitem_flatlist_to_nodelist': lambda: textitem_flatlist_to_nodelist(textitem, flatlist),
+        # nodes are replaced in a copy of their parent, so they can be found again
+        'replace_nodes': lambda: replace_nodes(list(textitem.parent_nodelist), textitem.nodelist, translated_nodelist),
+        'nodelist_to_latex': lambda: nodelist_to_latex(nodelist),
+    }
+
+
+def measure(func: Callable[[], object], min_time: float = 0.2, repeats: int = 5) -> float:
+    '''
+    returns the best time per call in seconds, over `repeats` rounds of at
+    least `min_time` seconds each
+    '''
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10:
+            break
+        number *= 2
+    number = max(1, int(number * min_time / (elapsed * 10)) * 10)
+
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def run(size: int, name_filter: str = '') -> dict:
+    results = dict[str, float]()
+    for name, func in get_cases(size).items():
+        if name_filter in name:
+            results[name] = measure(func)
+            print(f'{name:32} {results[name] * 1e6:12.2f} us', file=sys.stderr)
+
+    return {
+        'size': size,
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.node(),
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    '''
+    print the relative change of every benchmark; returns the names of those
+    which got slower by more than `threshold`
+    '''
+    regressions = list[str]()
+    for name, seconds in current['results'].items():
+        if name not in baseline['results']:
+            print(f'{name:32} {seconds * 1e6:12.2f} us  (new)')
+            continue
+
+        change = seconds / baseline['results'][name] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:32} {seconds * 1e6:12.2f} us  {change:+7.1%}{flag}')
+
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run')
+    run_parser.add_argument('--size', type=int, default=50)
+    run_parser.add_argument('--filter', default='')
+    run_parser.add_argument('--save', type=Path, nargs='?', const=default_baseline, default=None,
+                            metavar='BASELINE', help=f'store the results as a baseline (default: {default_baseline})')
+
+    compare_parser = subparsers.add_parser('compare')
+    compare_parser.add_argument('--baseline', type=Path, default=default_baseline)
+    compare_parser.add_argument('--threshold', type=float, default=0.1)
+    compare_parser.add_argument('--filter', default='')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        result = run(args.size, args.filter)
+        print(json.dumps(result, indent=2))
+        if args.save is not None:
+            args.save.parent.mkdir(parents=True, exist_ok=True)
+            args.save.write_text(json.dumps(result, indent=2) + '\n')
+    else:
+        if not args.baseline.exists():
+            compare_parser.error(f'no baseline at \'{args.baseline}\', '
+                                 f'record one with `python -m benchmarks.micro run --save [BASELINE]`')
+        baseline = json.loads(args.baseline.read_text())
+        if baseline['machine'] != platform.node():
+            print(f'warning: baseline was recorded on \'{baseline['machine']}\'', file=sys.stderr)
+
+        regressions = compare(baseline, run(baseline['size'], args.filter), args.threshold)
+        if len(regressions) > 0:
+            print(f'{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+'''
+compares the inference precisions of `OpusTransformersTranslatorAligner` (and
+optionally `AwesomeAligner`) against fp32: speed, peak RSS, and agreement of
+the translations, of the word alignments and of the markup mapped into the
+translations (which depends on the attention values)
+
+each precision runs in a process of its own, so that their RSS can be told
+apart; models must be available offline (e.g. in the Hugging Face cache), or
+`--marian <checkpoint>` uses a tiny, randomly initialised Marian model (see
+`end_to_end.py`), whose agreement is of no significance
+
+paragraphs are taken from `--input` (a LaTeX file) or from a synthetic corpus
+(see `corpus.py`)
+
+usage: `python -m benchmarks.precision [--model-base BASE | --marian CHECKPOINT] [--awesome] [--input main.tex] [--output results.jsonl]`
+'''
+
+from argparse import ArgumentParser, Namespace
+from datetime import datetime, timezone
+import difflib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from latexmt_core.document_processor.manifest import flatlist_to_json
+from latexmt_core.model_weights import precisions
+from latexmt_core.parsing.latex_context import get_latex_context
+from latexmt_core.parsing.parsplit import parsplit
+from latexmt_core.parsing.to_text import is_space_or_masked
+from latexmt_core.parsing.unpack import get_textitems, latex_to_nodelist
+from .corpus import CorpusGenerator, CorpusParams
+from .end_to_end import git_revision, save_tiny_marian
+
+# type imports
+from pathlib import Path
+from latexmt_core.markup_string import MarkupString
+
+
+def get_paragraphs(input_path: Path | None, num_paragraphs: int) -> list[MarkupString]:
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        if input_path is None:
+            params = CorpusParams(paragraphs=num_paragraphs, tikz_blocks=0, verbatim_blocks=0)
+            input_path = CorpusGenerator(params).generate(Path(corpus_dir))
+        input_text = input_path.read_text()
+
+    latex_context = get_latex_context([])
+    paragraphs = list[MarkupString]()
+    for textitem in get_textitems(latex_to_nodelist(input_text, latex_context), latex_context):
+        paragraphs.extend(paragraph for paragraph in parsplit(textitem.text)[1]
+                          if not is_space_or_masked(paragraph, textitem.mask_str))
+    return paragraphs[:num_paragraphs]
+
+
+def alignment_pairs(alignments) -> set[tuple[int, int]]:
+    '''
+    (target word, source word) pairs of an alignment matrix
+    '''
+    return {(int(target), int(source)) for target, source in zip(*alignments.nonzero())}
+
+
+def run_precision(args: Namespace):
+    '''
+    translate (and align) the paragraphs at `args.run`, printing the results
+    as JSON; runs in a process of its own
+    '''
+    from latexmt_core.translation.opus import OpusTransformersTranslatorAligner
+
+    paragraphs = get_paragraphs(args.input, args.paragraphs)
+
+    start = time.perf_counter()
+    translator = OpusTransformersTranslatorAligner(args.src, args.tgt, opus_model_base=args.model_base,
+                                                   precision=args.run)
+    load_seconds = time.perf_counter() - start
+
+    results = list[dict]()
+    start = time.perf_counter()
+    for paragraph in paragraphs:
+        translator.translate(paragraph)
+        translator.align(paragraph, translator.output_text)
+        results.append({
+            'output_text': translator.output_text,
+            'alignments': sorted(alignment_pairs(translator.alignments)),
+            'target': flatlist_to_json(translator.target_text.to_markup_list()),
+        })
+    seconds = time.perf_counter() - start
+
+    awesome_seconds = None
+    if args.awesome:
+        from latexmt_core.alignment.awesome_align import AwesomeAligner
+        aligner = AwesomeAligner(args.src, args.tgt, precision=args.run)
+        # the same targets (those of fp32) are aligned at every precision
+        targets = [result['output_text'] for result in results] if args.awesome_targets is None \
+            else json.loads(args.awesome_targets.read_text())
+        start = time.perf_counter()
+        for paragraph, target, result in zip(paragraphs, targets, results):
+            aligner.align(paragraph, target)
+            result['awesome_alignments'] = sorted(alignment_pairs(aligner.alignments))
+            result['awesome_target'] = flatlist_to_json(aligner.target_text.to_markup_list())
+        awesome_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        'precision': translator.precision,
+        'load_seconds': load_seconds,
+        'seconds': seconds,
+        'awesome_seconds': awesome_seconds,
+        # kilobytes on Linux
+        'peak_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'results': results,
+    }))
+
+
+def f1(reference: set, candidate: set) -> float:
+    if len(reference) == 0 and len(candidate) == 0:
+        return 1.0
+    return 2 * len(reference & candidate) / (len(reference) + len(candidate))
+
+
+def mean(values: list[float]) -> float:
+    return sum(values) / max(1, len(values))
+
+
+def agreement(reference: list[dict], candidate: list[dict]) -> dict[str, float]:
+    '''
+    agreement of `candidate` results with `reference` ones, averaged over all
+    paragraphs; alignments of the translator are only compared where the
+    translations are the same, those of `AwesomeAligner` (aligning the same
+    targets) everywhere
+    '''
+    pairs = list(zip(reference, candidate))
+    same_output = [(ref, cand) for ref, cand in pairs if ref['output_text'] == cand['output_text']]
+
+    def alignment_f1(pairs: list[tuple[dict, dict]], key: str) -> float:
+        return mean([f1({tuple(pair) for pair in ref[key]}, {tuple(pair) for pair in cand[key]})
+                     for ref, cand in pairs])
+
+    def same_markup(key: str) -> float:
+        return mean([ref[key] == cand[key] for ref, cand in pairs])
+
+    result = {
+        'same_output': len(same_output) / max(1, len(pairs)),
+        'output_similarity': mean([difflib.SequenceMatcher(None, ref['output_text'].split(),
+                                                           cand['output_text'].split()).ratio()
+                                   for ref, cand in pairs]),
+        'alignment_f1': alignment_f1(same_output, 'alignments'),
+        'same_markup': same_markup('target'),
+    }
+    if len(pairs) > 0 and 'awesome_alignments' in pairs[0][0]:
+        result['awesome_alignment_f1'] = alignment_f1(pairs, 'awesome_alignments')
+        result['awesome_same_markup'] = same_markup('awesome_target')
+    return result
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--src', default='de')
+    parser.add_argument('--tgt', default='en')
+    parser.add_argument('--model-base', default=None, help='see `OpusTransformersTranslatorAligner`')
+    parser.add_argument('--marian', metavar='TOKENIZER_CHECKPOINT', default=None)
+    parser.add_argument('--awesome', action='store_true', help='also compare `AwesomeAligner`')
+    parser.add_argument('--precisions', default=','.join(precisions))
+    parser.add_argument('--paragraphs', type=int, default=50)
+    parser.add_argument('--input', type=Path, default=None)
+    parser.add_argument('--output', type=Path, default=None,
+                        help='append the result as a line of JSON to this file')
+    # internal: run a single precision
+    parser.add_argument('--run', choices=precisions, default=None, help='(internal)')
+    parser.add_argument('--awesome-targets', type=Path, default=None, help='(internal)')
+    args = parser.parse_args()
+
+    if args.run is not None:
+        run_precision(args)
+        return
+
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    with tempfile.TemporaryDirectory() as work_dir:
+        model_base = args.model_base
+        if args.marian is not None:
+            model_base = str(Path(work_dir, 'model'))
+            save_tiny_marian(args.marian, Path(model_base))
+
+        def run(precision: str, awesome: bool, awesome_targets: Path | None = None) -> dict:
+            command = [sys.executable, '-m', 'benchmarks.precision', '--run', precision,
+                       '--src', args.src, '--tgt', args.tgt, '--paragraphs', str(args.paragraphs)]
+            command += ['--model-base', model_base] if model_base is not None else []
+            command += ['--input', str(args.input)] if args.input is not None else []
+            command += ['--awesome'] if awesome else []
+            command += ['--awesome-targets', str(awesome_targets)] if awesome_targets is not None else []
+            output = subprocess.check_output(command, text=True, cwd=Path(__file__).parent.parent)
+            return json.loads(output.splitlines()[-1])
+
+        reference = run('fp32', args.awesome)
+        # the fp32 translations are the targets aligned by `AwesomeAligner`
+        awesome_targets = Path(work_dir, 'targets.json')
+        awesome_targets.write_text(json.dumps([result['output_text'] for result in reference['results']]))
+
+        runs = list[dict]()
+        for precision in args.precisions.split(','):
+            run_result = reference if precision == 'fp32' \
+                else run(precision, args.awesome, awesome_targets if args.awesome else None)
+            summary = {key: value for key, value in run_result.items() if key != 'results'}
+            summary['requested_precision'] = precision
+            summary['speedup'] = reference['seconds'] / run_result['seconds']
+            summary |= agreement(reference['results'], run_result['results'])
+            runs.append(summary)
+            print(f'{precision:5} {run_result['seconds']:8.2f} s  x{summary['speedup']:.2f}  '
+                  f'{run_result['peak_rss_kib'] / 1024:8.1f} MiB  same output {summary['same_output']:.1%}  '
+                  f'alignment F1 {summary['alignment_f1']:.3f}  same markup {summary['same_markup']:.1%}',
+                  file=sys.stderr)
+
+    result = {
+        'benchmark': 'precision',
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'model': 'tiny-marian' if args.marian is not None else args.model_base or 'default',
+        'paragraphs': len(reference['results']),
+        'runs': runs,
+    }
+
+    print(json.dumps(result, indent=2))
+    if args.output is not None:
+        with open(args.output, 'a') as output_file:
+            output_file.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+'''
+measures the memory held by the textitems extracted from a LaTeX document
+
+usage: `python -m benchmarks.textitem_memory <file.tex>`
+'''
+
+import sys
+import tracemalloc
+
+from latexmt_core.parsing.latex_context import get_latex_context
+from latexmt_core.parsing.unpack import latex_to_nodelist, get_textitems
+
+
+def main(input_filename: str):
+    with open(input_filename, 'r') as input_file:
+        input_text = input_file.read()
+
+    latex_context = get_latex_context([])
+    nodelist = latex_to_nodelist(input_text, latex_context)
+
+    # the first extraction caches some attributes on the nodes themselves,
+    # which should not be attributed to the textitems
+    get_textitems(nodelist, latex_context)
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    textitems = get_textitems(nodelist, latex_context)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'textitems: {len(textitems)}')
+    print(f'retained: {(after - before) / 1024:.1f} KiB '
+          f'({(after - before) / max(len(textitems), 1):.0f} B/textitem)')
+    print(f'peak: {(peak - before) / 1024:.1f} KiB')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
@@ -0,0 +1,79 @@
+'''
+stress test of textitem extraction on many threads at once: every copy of a
+synthetic document (see `corpus.py`, with macros unknown to the LaTeX context)
+must yield the same textitems as a serial run; exits with status 1 otherwise
+
+the thread switch interval is lowered, so that conversions interleave as much
+as possible
+
+usage: `python -m benchmarks.to_text_threads [--threads 8] [--copies 16] [--paragraphs N] [--input main.tex]`
+'''
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import tempfile
+import time
+
+from latexmt_core.document_processor.manifest import flatlist_to_json
+from latexmt_core.parsing.latex_context import get_latex_context
+from latexmt_core.parsing.unpack import get_textitems, latex_to_nodelist
+from .corpus import CorpusGenerator, CorpusParams
+
+# type imports
+from pathlib import Path
+import pylatexenc.latexnodes.nodes as lw
+
+
+def extract(nodelist: list[lw.LatexNode]) -> list[tuple]:
+    '''
+    the textitems of `nodelist`, in a form which can be compared across copies
+    '''
+    latex_context = get_latex_context([])
+    return [(flatlist_to_json(textitem.text.to_markup_list()),
+             [node.latex_verbatim() for node in textitem.masked_nodes])
+            for textitem in get_textitems(nodelist, latex_context)]
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--copies', type=int, default=16)
+    parser.add_argument('--paragraphs', type=int, default=300)
+    parser.add_argument('--input', type=Path, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        input_path = args.input
+        if input_path is None:
+            params = CorpusParams(paragraphs=args.paragraphs, tikz_blocks=0, verbatim_blocks=0,
+                                  unknown_macro_density=0.5)
+            input_path = CorpusGenerator(params).generate(Path(corpus_dir))
+        input_text = input_path.read_text()
+
+    latex_context = get_latex_context([])
+    # every copy is converted once, as the conversion modifies the nodes (see
+    # `LatexNodes2MarkupText`)
+    nodelists = [latex_to_nodelist(input_text, latex_context) for _ in range(args.copies + 1)]
+
+    start = time.perf_counter()
+    expected = extract(nodelists.pop())
+    serial_seconds = time.perf_counter() - start
+
+    sys.setswitchinterval(1e-6)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as executor:
+        results = list(executor.map(extract, nodelists))
+    threaded_seconds = time.perf_counter() - start
+
+    mismatches = [copy for copy, result in enumerate(results) if result != expected]
+    print(f'{len(expected)} textitems x {args.copies} copies on {args.threads} threads: '
+          f'{serial_seconds:.3f} s per copy serially, {threaded_seconds:.3f} s in total threaded')
+    if len(mismatches) > 0:
+        print(f'MISMATCH in copies {mismatches}', file=sys.stderr)
+        sys.exit(1)
+    print('OK: all copies match the serial run')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+'''
+measures how the throughput of `DocumentTranslator` scales with the number of
+processes of a `TranslationPool`, on a synthetic corpus (see `corpus.py`)
+
+by default, every paragraph costs `--work-ms` of pure-Python CPU time (held
+under the GIL, as model inference largely is for small models) on top of
+`NullTranslatorAligner`; `--marian <checkpoint>` instead uses a tiny Marian
+model (see `end_to_end.py`)
+
+usage: `python -m benchmarks.worker_pool [--workers 1,2,4,8] [--paragraphs N] [--work-ms MS] [--output results.jsonl]`
+'''
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+import json
+import platform
+import resource
+import tempfile
+import time
+
+from latexmt_core.document_processor import DocumentTranslator
+from latexmt_core.metrics import MetricsRegistry
+from latexmt_core.translation.null import NullTranslatorAligner
+from latexmt_core.worker_pool import TranslationPool, available_cores
+from .corpus import CorpusGenerator, CorpusParams
+from .end_to_end import get_translator_aligner, git_revision
+
+# type imports
+from pathlib import Path
+from latexmt_core.translation import StringType
+
+
+class BusyTranslatorAligner(NullTranslatorAligner):
+    '''
+    `NullTranslatorAligner` spending `work_seconds` of CPU time per translation
+    '''
+
+    work_seconds: float
+
+    def __init__(self, src_lang: str, tgt_lang: str, work_seconds: float, **kwargs):
+        super().__init__(src_lang, tgt_lang, **kwargs)
+        self.work_seconds = work_seconds
+
+    def translate(self, input_text: StringType, glossary: dict[str, str] = {}):
+        deadline = time.thread_time() + self.work_seconds
+        while time.thread_time() < deadline:
+            pass
+        super().translate(input_text, glossary)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--workers', default=None,
+                        help='comma-separated numbers of workers (default: powers of two up to the available cores)')
+    parser.add_argument('--paragraphs', type=int, default=200)
+    parser.add_argument('--work-ms', type=float, default=5.0)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--marian', metavar='TOKENIZER_CHECKPOINT', default=None)
+    parser.add_argument('--output', type=Path, default=None,
+                        help='append the result as a line of JSON to this file')
+    args = parser.parse_args()
+
+    if args.workers is not None:
+        worker_counts = [int(workers) for workers in args.workers.split(',')]
+    else:
+        worker_counts = [1 << exponent for exponent in range(available_cores().bit_length())]
+
+    params = CorpusParams(paragraphs=args.paragraphs, tikz_blocks=0, verbatim_blocks=0)
+    runs = list[dict]()
+    with tempfile.TemporaryDirectory() as work_dir:
+        root_document = CorpusGenerator(params).generate(Path(work_dir, 'corpus'))
+        if args.marian is not None:
+            translator, aligner = get_translator_aligner(args.marian, Path(work_dir, 'model'))
+        else:
+            translator = aligner = BusyTranslatorAligner('de', 'en', args.work_ms / 1000)
+
+        for workers in worker_counts:
+            with TranslationPool(translator, aligner, workers=workers, batch_size=args.batch_size) as pool:
+                metrics = MetricsRegistry()
+                document_translator = DocumentTranslator(translator, aligner, worker_pool=pool, metrics=metrics)
+                start = time.perf_counter()
+                document_translator.process_document(root_document, Path(work_dir, f'output-{workers}'))
+                seconds = time.perf_counter() - start
+            num_paragraphs = metrics.counter('paragraphs_total', status='translated').value
+
+            runs.append({
+                'workers': workers,
+                'threads_per_worker': pool.threads_per_worker,
+                'seconds': seconds,
+                'paragraphs': num_paragraphs,
+                'paragraphs_per_second': num_paragraphs / seconds,
+                'speedup': runs[0]['seconds'] / seconds if len(runs) > 0 else 1.0,
+            })
+            runs[-1]['efficiency'] = runs[-1]['speedup'] / workers
+            print(f'{workers:4} workers  {seconds:8.3f} s  {runs[-1]['paragraphs_per_second']:10.1f} paragraphs/s  '
+                  f'x{runs[-1]['speedup']:.2f}')
+
+    result = {
+        'benchmark': 'worker_pool',
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'backend': 'tiny-marian' if args.marian is not None else f'busy-{args.work_ms}ms',
+        'cores': available_cores(),
+        'corpus_paragraphs': args.paragraphs,
+        'batch_size': args.batch_size,
+        'runs': runs,
+        # of the largest worker process, in kilobytes on Linux
+        'peak_worker_rss_kib': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+    print(json.dumps(result, indent=2))
+    if args.output is not None:
+        with open(args.output, 'a') as output_file:
+            output_file.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,13 @@
 from dataclasses import dataclass
 import logging
-import numpy as np
 from typing import cast
 
 # type imports
-from typing import Sequence
+from typing import Sequence, TYPE_CHECKING
 from abc import ABC
+if TYPE_CHECKING:
+    # numpy is imported on first use, as it dominates the import time of the package
+    import numpy as np
 from latexmt_core.markup_string import Markup, MarkupString
 from latexmt_core.translation import StringType
 
@@ -57,7 +59,7 @@ class Aligner(ABC):
         raise NotImplementedError()
 
     @property
-    def alignments(self) -> np.ndarray:
+    def alignments(self) -> 'np.ndarray':
         '''
         word alignment matrix, with rows represesenting output words and columns
         representing input words
@@ -67,7 +69,7 @@ class Aligner(ABC):
         raise NotImplementedError()
 
     @property
-    def alignments_raw(self) -> np.ndarray:
+    def alignments_raw(self) -> 'np.ndarray':
         '''
         word alignment matrix, with rows represesenting output words and columns
         representing input words
@@ -76,10 +78,20 @@ class Aligner(ABC):
         '''
         raise NotImplementedError()
 
+    @property
+    def settings(self) -> dict[str, object]:
+        '''
+        the options which determine the output of the aligner, besides its
+        class (see `Translator.settings`)
+        '''
+        return {'src_lang': self.src_lang, 'tgt_lang': self.tgt_lang}
+
     def align(self, source_text: StringType, target_text: StringType):
         raise NotImplementedError()
 
     def _get_target_aligned_idxes(self, src_span_start: int, src_span_end: int) -> set[int]:
+        import numpy as np
+
         target_aligned_idxes = set[int]()
         for in_token_idx in range(src_span_start, src_span_end):
             target_aligned_idxes.update(cast(list[int], np.flatnonzero(
@@ -97,6 +109,8 @@ class Aligner(ABC):
         *source text according to the `aligner`'s `alignment` matrix
         '''
 
+        import numpy as np
+
         logger = logging.getLogger(__name__)
 
         target_markup_spans = list[Markup]()
@@ -1,21 +1,30 @@
-import numpy as np
-from transformers.models.bert import BertTokenizer, BertModel
-import torch
+from latexmt_core.model_weights import apply_precision, check_precision, inference_context, load_mapped_model
 
 # type imports
-from typing import Sequence
+from typing import Sequence, TYPE_CHECKING
+if TYPE_CHECKING:
+    # torch and transformers are imported on first use
+    import numpy as np
+    import torch
+    from transformers.models.bert import BertTokenizer, BertModel
 from latexmt_core.alignment import Aligner, StringType, AlignmentWord, TokenizedAlignmentWord, words_spans_to_markupstr
 from latexmt_core.alignment.wordsplit import get_words_and_spans
 from latexmt_core.markup_string import Markup, MarkupString
+from latexmt_core.model_weights import Precision
 
 
 class AwesomeAligner(Aligner):
     '''
     language-agnostic aligner
+
+    optional parameters:
+    - `precision`: `'fp32'` (default), `'int8'` or `'bf16'`;
+      see `model_weights.Precision`
     '''
 
-    __tokenizer: BertTokenizer
-    __model: BertModel
+    __tokenizer: 'BertTokenizer'
+    __model: 'BertModel'
+    __precision: Precision
 
     __source_words: Sequence[TokenizedAlignmentWord]
     __source_markup_spans: Sequence[Markup]
@@ -23,15 +32,22 @@ class AwesomeAligner(Aligner):
     __target_words: Sequence[TokenizedAlignmentWord]
     __target_markup_spans: Sequence[Markup]
 
-    __subword_alignments: torch.Tensor
-    __word_alignments: torch.Tensor
+    __subword_alignments: 'torch.Tensor'
+    __word_alignments: 'torch.Tensor'
 
     def __init__(self, src_lang: str, tgt_lang: str, **kwargs):
+        from transformers.models.bert import BertTokenizer, BertModel
+        import torch
+
+        precision = check_precision(kwargs.pop('precision', 'fp32'))
+
         model = 'bert-base-multilingual-cased'
         self.__tokenizer = BertTokenizer.from_pretrained(model)
-        self.__model = BertModel.from_pretrained(model)  # type: ignore
-        if torch.cuda.is_available():
-            self.__model = self.__model.to('cuda')  # type: ignore
+        if torch.cuda.is_available() and precision != 'int8':
+            self.__model = BertModel.from_pretrained(model).to('cuda')  # type: ignore
+        else:
+            self.__model = load_mapped_model(BertModel, model, **kwargs)  # type: ignore
+        self.__model, self.__precision = apply_precision(self.__model, precision, **kwargs)
         super().__init__(src_lang, tgt_lang)
 
     def __tokenize_words(self, text: StringType) -> tuple[list[TokenizedAlignmentWord], list[Markup], dict[int, int]]:
@@ -86,10 +102,20 @@ class AwesomeAligner(Aligner):
         return words_spans_to_markupstr(self.target_words, self.target_markup_spans)
 
     @property
-    def alignments(self) -> np.ndarray:
+    def precision(self) -> Precision:
+        return self.__precision
+
+    @property
+    def settings(self) -> dict[str, object]:
+        return super().settings | {'precision': self.__precision}
+
+    @property
+    def alignments(self) -> 'np.ndarray':
         return self.__word_alignments.numpy()
 
     def align(self, source_text: StringType, target_text: StringType):
+        import torch
+
         self.__source_words, self.__source_markup_spans, in_token_to_word_idx = \
             self.__tokenize_words(source_text)
         self.__target_words, _, out_token_to_word_idx = \
@@ -100,7 +126,7 @@ class AwesomeAligner(Aligner):
         in_tgt = torch.IntTensor(
             [[subword for word in self.__target_words for subword in word.tokens]]).to(self.__model.device)
 
-        with torch.no_grad():
+        with torch.no_grad(), inference_context(self.__model, self.__precision):
             align_layer = 8
             out_src = self.__model(in_src, output_hidden_states=True)[
                 2][align_layer][0, :]
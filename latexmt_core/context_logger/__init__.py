@@ -1,15 +1,51 @@
-import inspect
 from contextlib import contextmanager
 import logging
+import sys
+import threading
 from typing import cast
 
+from . import tracing
+
 # type imports
-from typing import Any, Iterable, Mapping, Optional
+from typing import Any, Callable, Mapping, Optional
+
+
+class LazyExtra:
+    '''
+    a value for `extra` which is only computed once the record is formatted,
+    i.e. not at all if the record is discarded due to its level
+
+    handlers usually format records immediately; with deferred handling (e.g.
+    `QueueHandler`), `func` must not depend on state which changes meanwhile
+    '''
+
+    __slots__ = ('__func', '__value')
+
+    __func: Callable[[], Any] | None
+    __value: Any
+
+    def __init__(self, func: Callable[[], Any]):
+        self.__func = func
+
+    @property
+    def value(self) -> Any:
+        if self.__func is not None:
+            self.__value = self.__func()
+            self.__func = None
+        return self.__value
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+    def __repr__(self) -> str:
+        return repr(self.value)
 
 
 class ContextLogger(logging.Logger):
+    # never modified in place, so that records can share it
     __log_context: dict[str, Any]
-    __log_frames: list[Iterable[str]]
+    # the contexts to be restored when leaving each frame
+    __log_frames: list[dict[str, Any]]
 
     def __init__(self, name, level=0):
         super().__init__(name, level)
@@ -19,22 +55,54 @@ class ContextLogger(logging.Logger):
 
     def makeRecord(self, name, level, fn, lno, msg, args, exc_info,
                    func=None, extra: Optional[dict[str, Any]] = None, sinfo=None):
-        extra = dict[str, Any]() if extra is None else extra
         return super().makeRecord(name, level, fn, lno, msg, args, exc_info,
                                   func=func,
-                                  extra={'context': self.__log_context | extra},
+                                  extra={'context': self.__log_context | extra if extra else self.__log_context},
                                   sinfo=sinfo)
 
     @contextmanager
     def frame(self, frame: Mapping[str, Any]):
+        '''
+        add `frame` to the context of all records logged within; while tracing
+        (see `tracing.tracing`), the frame is also recorded as a span
+        '''
+        tracer = tracing.get_active_tracer()
+        start_ns = tracer.now() if tracer is not None else 0
         try:
-            self.__log_frames.append(frame.keys())
-            self.__log_context |= frame
+            self.__log_frames.append(self.__log_context)
+            self.__log_context = self.__log_context | frame
             yield
         finally:
-            keys = self.__log_frames.pop()
-            for key in keys:
-                self.__log_context.pop(key)
+            self.__log_context = self.__log_frames.pop()
+            if tracer is not None:
+                tracer.complete(', '.join(frame.keys()), 'frame', start_ns, frame)
+
+
+# loggers created by `logger_from_kwargs`, by the names of their parent and
+# of the logger itself
+_logger_cache = dict[tuple[str, str], ContextLogger]()
+_logger_cache_lock = threading.Lock()
+
+
+def _caller_module_name(depth: int) -> str:
+    '''
+    name of the module `depth` frames above the caller; unlike
+    `inspect.stack`, this neither walks the whole stack nor reads source files
+    '''
+    try:
+        return sys._getframe(depth + 1).f_globals['__name__']
+    except (KeyError, ValueError):
+        raise Exception('could not determine caller from stack')
+
+
+def _create_logger(parent: logging.Logger, name: str) -> ContextLogger:
+    logging.setLoggerClass(ContextLogger)
+
+    if name in logging.Logger.manager.loggerDict \
+            and not issubclass(logging.Logger.manager.loggerDict[name].__class__, ContextLogger):
+        del logging.Logger.manager.loggerDict[name]
+
+    return cast(ContextLogger, parent.getChild(name))
 
 
 def logger_from_kwargs(**kwargs) -> ContextLogger:
@@ -43,27 +111,24 @@ def logger_from_kwargs(**kwargs) -> ContextLogger:
         if not issubclass(_logger.__class__, ContextLogger):
             raise TypeError(
                 f'`{_logger.__class__.__name__}` is not a subclass of `ContextLogger`')
-    else:
-        logging.setLoggerClass(ContextLogger)
-
-        if 'parent_logger' in kwargs:
-            parent = cast(logging.Logger, kwargs['parent_logger'])
-        else:
-            parent = logging.getLogger()
+        return cast(ContextLogger, _logger)
 
-        if 'logger_name' in kwargs:
-            name = cast(str, kwargs['logger_name'])
-        else:
-            caller_module = inspect.getmodule(inspect.stack()[1][0])
-            if caller_module is not None:
-                name = caller_module.__name__
-            else:
-                raise Exception('could not determine caller from stack')
+    if 'parent_logger' in kwargs:
+        parent = cast(logging.Logger, kwargs['parent_logger'])
+    else:
+        parent = logging.getLogger()
 
-        if name in logging.Logger.manager.loggerDict \
-                and not issubclass(logging.Logger.manager.loggerDict[name].__class__, ContextLogger):
-            del logging.Logger.manager.loggerDict[name]
+    if 'logger_name' in kwargs:
+        name = cast(str, kwargs['logger_name'])
+    else:
+        name = _caller_module_name(1)
 
-        _logger = parent.getChild(name)
+    # the cached logger is only valid while `logging` still knows it (e.g. it
+    # has not been replaced through `logging.config`)
+    key = (parent.name, name)
+    _logger = _logger_cache.get(key)
+    if _logger is None or logging.Logger.manager.loggerDict.get(_logger.name) is not _logger:
+        with _logger_cache_lock:
+            _logger = _logger_cache[key] = _create_logger(parent, name)
 
-    return cast(ContextLogger, _logger)
+    return _logger
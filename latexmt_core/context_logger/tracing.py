@@ -0,0 +1,120 @@
+from contextlib import contextmanager, nullcontext
+import json
+import os
+import threading
+import time
+
+# type imports
+from pathlib import Path
+from typing import Any, Iterator, Mapping
+
+
+# longer span arguments are truncated, so that traces stay viewable
+max_arg_length = 200
+
+_null_context = nullcontext()
+
+
+class Tracer:
+    '''
+    collects timed spans as Chrome trace events, to be viewed in
+    `chrome://tracing` or Perfetto (https://ui.perfetto.dev)
+
+    spans are recorded as complete (`'X'`) events with the ids of the process
+    and thread they ran on; threads are named after their Python name
+    '''
+
+    __events: list[dict[str, Any]]
+    __named_threads: set[int]
+    __origin_ns: int
+
+    def __init__(self):
+        self.__events = list()
+        self.__named_threads = set()
+        self.__origin_ns = time.perf_counter_ns()
+
+    def now(self) -> int:
+        return time.perf_counter_ns()
+
+    def complete(self, name: str, category: str, start_ns: int, args: Mapping[str, Any] = {}):
+        '''
+        record a span which started at `start_ns` (see `now`) and ends now
+        '''
+        end_ns = time.perf_counter_ns()
+        pid, tid = os.getpid(), threading.get_native_id()
+
+        if tid not in self.__named_threads:
+            self.__named_threads.add(tid)
+            self.__events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                                  'args': {'name': threading.current_thread().name}})
+
+        # list.append is atomic, so spans may be recorded from any thread
+        self.__events.append({
+            'name': name, 'cat': category, 'ph': 'X',
+            'ts': (start_ns - self.__origin_ns) / 1000, 'dur': (end_ns - start_ns) / 1000,
+            'pid': pid, 'tid': tid,
+            'args': {key: _format_arg(value) for key, value in args.items()},
+        })
+
+    @contextmanager
+    def span(self, name: str, category: str, args: Mapping[str, Any] = {}) -> Iterator[None]:
+        start_ns = self.now()
+        try:
+            yield
+        finally:
+            self.complete(name, category, start_ns, args)
+
+    def to_json(self) -> dict[str, Any]:
+        return {'traceEvents': list(self.__events), 'displayTimeUnit': 'ms'}
+
+    def save(self, path: Path):
+        with open(path, 'w') as trace_file:
+            json.dump(self.to_json(), trace_file, ensure_ascii=False)
+
+
+def _format_arg(value: Any) -> Any:
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+
+    text = str(value)
+    return text if len(text) <= max_arg_length else text[:max_arg_length] + '…'
+
+
+_active_tracer: Tracer | None = None
+
+
+def get_active_tracer() -> Tracer | None:
+    return _active_tracer
+
+
+@contextmanager
+def tracing(path: Path | None = None) -> Iterator[Tracer]:
+    '''
+    record `ContextLogger` frames and pipeline stages as spans while active;
+    if given, the trace is written to `path` at the end
+
+    only a single trace is recorded at a time; nested calls record into the
+    outer trace, and leave writing it to the outermost call
+    '''
+    global _active_tracer
+
+    if _active_tracer is not None:
+        yield _active_tracer
+        return
+
+    tracer = _active_tracer = Tracer()
+    try:
+        yield tracer
+    finally:
+        _active_tracer = None
+        if path is not None:
+            tracer.save(path)
+
+
+def trace_span(name: str, category: str = 'stage', args: Mapping[str, Any] = {}):
+    '''
+    context manager recording a span in the active trace, if any
+    '''
+    if _active_tracer is None:
+        return _null_context
+    return _active_tracer.span(name, category, args)
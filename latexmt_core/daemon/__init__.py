@@ -0,0 +1,395 @@
+'''
+a long-lived process keeping translators and aligners resident, so that many
+small documents can be translated without loading models for each of them
+
+jobs are submitted over a stream socket (Unix or TCP) as single lines of JSON;
+the daemon answers each with a stream of JSON lines ("events"), ending with
+either a `done` or an `error` event (see `TranslationDaemon` and `DaemonClient`)
+
+jobs name paths on the daemon's file system to read and write, so whoever can
+connect to the socket has the daemon's file-system access; Unix sockets are
+only accessible to the daemon's user, and TCP is only served on loopback
+addresses
+'''
+
+from dataclasses import asdict, dataclass, field
+import ipaddress
+import itertools
+import json
+import logging
+import os
+import queue
+import shutil
+import socket
+import socketserver
+import tempfile
+import threading
+
+from latexmt_core.context_logger import ContextLogger, logger_from_kwargs
+from latexmt_core.document_processor import DocumentTranslator
+from latexmt_core.get_translator import get_translator_aligner
+from latexmt_core.metrics import MetricsRegistry
+
+# type imports
+from pathlib import Path
+from typing import Any, Iterator
+from latexmt_core.alignment import Aligner
+from latexmt_core.translation import Translator
+
+
+# typedefs
+type Address = str | tuple[str, int]
+type Event = dict[str, Any]
+type PairKey = tuple[str, str, str, str | None, str]
+
+
+def is_loopback(host: str) -> bool:
+    '''
+    whether every address `host` resolves to is a loopback address
+    '''
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    return len(infos) > 0 and all(ipaddress.ip_address(str(info[4][0]).split('%')[0]).is_loopback
+                                  for info in infos)
+
+
+# `DocumentTranslator` options which jobs may set
+job_options = {'glossary_method', 'glossary_fallback', 'mask_str', 'output_mode', 'prelex', 'incremental',
+               'sentence_memory', 'fuzzy_threshold', 'checkpoint', 'resume', 'dry_run'}
+
+
+@dataclass
+class Job:
+    '''
+    a document to be translated; either `root_document` and `output_dir`
+    (paths on the daemon's file system), or inline `latex`, whose translation
+    is returned in the `done` event
+    '''
+
+    src_lang: str
+    tgt_lang: str
+    trans_type: str = 'opus'
+    align_type: str | None = 'auto'
+    root_document: str | None = None
+    output_dir: str | None = None
+    latex: str | None = None
+    glossary: dict[str, str] = field(default_factory=dict)
+    # keyword arguments of `get_translator_aligner` (e.g. `opus_model_base`)
+    translator_options: dict[str, Any] = field(default_factory=dict)
+    # keyword arguments of `DocumentTranslator`, out of `job_options`
+    options: dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_json(cls, request: dict) -> 'Job':
+        job = cls(**request)
+        if (job.latex is None) == (job.root_document is None):
+            raise ValueError('Exactly one of `root_document` and `latex` must be given')
+        if job.root_document is not None and job.output_dir is None:
+            raise ValueError('`output_dir` must be given along with `root_document`')
+        if len(invalid_options := set(job.options) - job_options) > 0:
+            raise ValueError(f'Invalid options: {', '.join(sorted(invalid_options))}')
+        return job
+
+    @property
+    def pair_key(self) -> PairKey:
+        return (self.src_lang, self.tgt_lang, self.trans_type, self.align_type,
+                json.dumps(self.translator_options, sort_keys=True))
+
+
+class _Submission:
+    '''
+    a queued job, along with the events to be sent back to its client
+    '''
+
+    id: int
+    job: Job
+    events: queue.Queue[Event | None]
+
+    def __init__(self, id: int, job: Job):
+        self.id = id
+        self.job = job
+        self.events = queue.Queue()
+
+    def send(self, event: str, **data):
+        self.events.put({'event': event, 'job': self.id} | data)
+
+
+class _ProgressHandler(logging.Handler):
+    '''
+    forwards the records logged by a worker to the client of its current job
+    '''
+
+    submission: _Submission | None
+
+    def __init__(self, level: int = logging.INFO):
+        super().__init__(level)
+        self.submission = None
+
+    def emit(self, record: logging.LogRecord):
+        if self.submission is not None:
+            self.submission.send('log', level=record.levelname, message=record.getMessage(),
+                                 context=getattr(record, 'context', {}))
+
+
+class TranslationDaemon:
+    '''
+    runs jobs on `workers` threads, queueing up to `max_queued` further jobs;
+    jobs submitted while the queue is full are rejected
+
+    translators and aligners are created by the first job using them (or by
+    `preload`) and kept for all further jobs; as they hold the state of the
+    text being translated, jobs sharing them take turns translating, while
+    parsing and repacking their documents concurrently
+
+    events sent for each job:
+    - `queued`, with the number of jobs ahead of it
+    - `started`
+    - `log`, for every record of level `INFO` or above (as far as enabled for
+      the daemon's logger), with its `context`
+    - `done`, with `output_dir` or the translated `latex`, and `summary`
+      and/or `estimate` (see `DocumentTranslator`), if any
+    - `error`, with a message
+    '''
+
+    workers: int
+    max_queued: int
+    metrics: MetricsRegistry
+
+    __jobs: queue.Queue[_Submission | None]
+    __job_ids: Iterator[int]
+    __threads: list[threading.Thread]
+
+    # resident translators and aligners, along with the lock guarding their use
+    __pairs: dict[PairKey, tuple[Translator, Aligner, threading.Lock]]
+    __pairs_lock: threading.Lock
+
+    __server: socketserver.BaseServer | None
+
+    __logger: ContextLogger
+
+    def __init__(self, workers: int = 1, max_queued: int = 64, metrics: MetricsRegistry | None = None, **kwargs):
+        self.__logger = logger_from_kwargs(**kwargs)
+        self.workers = workers
+        self.max_queued = max_queued
+        self.metrics = metrics if metrics is not None else MetricsRegistry(enabled=False)
+
+        self.__jobs = queue.Queue(maxsize=max_queued)
+        self.__job_ids = itertools.count(1)
+        self.__threads = list()
+        self.__pairs = dict()
+        self.__pairs_lock = threading.Lock()
+        self.__server = None
+
+    def preload(self, src_lang: str, tgt_lang: str, trans_type: str, align_type: str | None = 'auto',
+                **translator_options):
+        '''
+        create a translator and aligner ahead of the first job using them
+        '''
+        self.__get_pair(Job(src_lang, tgt_lang, trans_type, align_type, translator_options=translator_options))
+
+    def __get_pair(self, job: Job) -> tuple[Translator, Aligner, threading.Lock]:
+        # models are only loaded once, while other jobs wait
+        with self.__pairs_lock:
+            pair = self.__pairs.get(job.pair_key)
+            if pair is None:
+                translator, aligner = get_translator_aligner(
+                    job.src_lang, job.tgt_lang, job.trans_type, job.align_type,
+                    logger=self.__logger, **job.translator_options)
+                pair = self.__pairs[job.pair_key] = (translator, aligner, threading.Lock())
+        return pair
+
+    def submit(self, job: Job) -> _Submission:
+        '''
+        queue a job; raises `queue.Full` if too many jobs are queued already
+        '''
+        submission = _Submission(next(self.__job_ids), job)
+        submission.send('queued', position=self.__jobs.qsize())
+        self.__jobs.put_nowait(submission)
+        self.metrics.inc('daemon_jobs_total', status='queued')
+        return submission
+
+    def __run_job(self, submission: _Submission, logger: ContextLogger) -> Event:
+        job = submission.job
+        translator, aligner, translation_lock = self.__get_pair(job)
+        document_translator = DocumentTranslator(
+            translator, aligner, recurse_input=job.latex is None, glossary=job.glossary, metrics=self.metrics,
+            translation_lock=translation_lock, logger=logger, **job.options)
+
+        result: Event = {}
+        if job.latex is not None:
+            # inline documents are translated in a scratch directory
+            work_dir = Path(tempfile.mkdtemp(prefix='latexmt-daemon-'))
+            try:
+                work_dir.joinpath('input.tex').write_text(job.latex)
+                document_translator.process_document(work_dir.joinpath('input.tex'), work_dir.joinpath('output'))
+                if not document_translator.dry_run:
+                    result['latex'] = work_dir.joinpath('output', 'input.tex').read_text()
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            assert job.root_document is not None and job.output_dir is not None
+            document_translator.process_document(Path(job.root_document), Path(job.output_dir))
+            result['output_dir'] = job.output_dir
+
+        if document_translator.incremental_summary is not None:
+            result['summary'] = asdict(document_translator.incremental_summary)
+        if document_translator.dry_run_estimate is not None:
+            result['estimate'] = document_translator.dry_run_estimate.to_json()
+        return result
+
+    def __work(self, worker_idx: int):
+        # every worker logs through a logger of its own, as the context of a
+        # `ContextLogger` is shared by all threads using it
+        logger = logger_from_kwargs(parent_logger=self.__logger, logger_name=f'worker{worker_idx}')
+        progress_handler = _ProgressHandler()
+        logger.addHandler(progress_handler)
+
+        while (submission := self.__jobs.get()) is not None:
+            progress_handler.submission = submission
+            submission.send('started')
+            try:
+                with logger.frame({'job': submission.id}):
+                    result = self.__run_job(submission, logger)
+                submission.send('done', **result)
+                self.metrics.inc('daemon_jobs_total', status='done')
+            except Exception as e:
+                self.__logger.warning('Job failed', extra={'job': submission.id, 'error': e})
+                submission.send('error', error=f'{e.__class__.__name__}: {e}')
+                self.metrics.inc('daemon_jobs_total', status='failed')
+            finally:
+                progress_handler.submission = None
+                submission.events.put(None)
+        # while submission
+
+        logger.removeHandler(progress_handler)
+
+    def start(self):
+        '''
+        start the worker threads
+        '''
+        for worker_idx in range(self.workers):
+            thread = threading.Thread(target=self.__work, args=(worker_idx,),
+                                      name=f'latexmt-daemon-worker{worker_idx}', daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+
+    def stop(self):
+        '''
+        finish all queued jobs, then stop the worker threads and the server
+        '''
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+        for _ in self.__threads:
+            self.__jobs.put(None)
+        for thread in self.__threads:
+            thread.join()
+        self.__threads.clear()
+
+    def serve(self, address: Address):
+        '''
+        accept jobs on a Unix socket (if `address` is a path) or on a TCP port
+        (if it is `(host, port)`) until `stop` is called
+
+        jobs can read and write any file the daemon can, so the Unix socket is
+        created accessible to the daemon's user only, and TCP is refused on
+        addresses other than loopback ones, as there is no authentication
+        '''
+        handle_request = self.__handle_request
+
+        class JobHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if line.strip() == b'':
+                        continue
+                    for event in handle_request(line):
+                        self.wfile.write(json.dumps(event, ensure_ascii=False, default=str).encode() + b'\n')
+                        self.wfile.flush()
+
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            # the socket is created with the permissions of the umask
+            umask = os.umask(0o177)
+            try:
+                server = socketserver.ThreadingUnixStreamServer(address, JobHandler)
+            finally:
+                os.umask(umask)
+        else:
+            if not is_loopback(address[0]):
+                raise ValueError(f'Refusing to serve jobs on non-loopback host {address[0]}, '
+                                 'as they grant access to the file system; use a Unix socket instead')
+            server = socketserver.ThreadingTCPServer(address, JobHandler)
+        server.daemon_threads = True
+
+        self.__server = server
+        self.__logger.info('Serving translation jobs', extra={'address': address})
+        server.serve_forever()
+
+    def __handle_request(self, line: bytes) -> Iterator[Event]:
+        try:
+            submission = self.submit(Job.from_json(json.loads(line)))
+        except queue.Full:
+            self.metrics.inc('daemon_jobs_total', status='rejected')
+            yield {'event': 'error', 'error': f'Too many queued jobs ({self.max_queued})'}
+            return
+        except (TypeError, ValueError) as e:
+            yield {'event': 'error', 'error': f'Invalid job: {e}'}
+            return
+
+        while (event := submission.events.get()) is not None:
+            yield event
+
+
+class DaemonClient:
+    '''
+    submits jobs to a `TranslationDaemon` serving on `address`
+    '''
+
+    address: Address
+    timeout: float | None
+
+    def __init__(self, address: Address, timeout: float | None = None):
+        self.address = address
+        self.timeout = timeout
+
+    def __connect(self) -> socket.socket:
+        if isinstance(self.address, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.address)
+        return sock
+
+    def submit(self, job: Job) -> Iterator[Event]:
+        '''
+        submit a job; yields its events as they arrive, up to and including
+        the final `done` or `error` event
+        '''
+        with self.__connect() as sock, sock.makefile('rwb') as sock_file:
+            sock_file.write(json.dumps(asdict(job), ensure_ascii=False).encode() + b'\n')
+            sock_file.flush()
+
+            for line in sock_file:
+                event = json.loads(line)
+                yield event
+                if event['event'] in ('done', 'error'):
+                    return
+
+        raise ConnectionError('Connection closed before the job finished')
+
+    def translate(self, job: Job) -> Event:
+        '''
+        submit a job and wait for it to finish; returns the `done` event, or
+        raises `RuntimeError` with the message of the `error` event
+        '''
+        for event in self.submit(job):
+            if event['event'] == 'done':
+                return event
+            if event['event'] == 'error':
+                raise RuntimeError(event['error'])
+
+        raise ConnectionError('Connection closed before the job finished')
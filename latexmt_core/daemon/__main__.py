@@ -0,0 +1,53 @@
+'''
+usage: `python -m latexmt_core.daemon (--socket PATH | --port PORT) [--workers N] [--preload SRC:TGT:TRANS[:ALIGN]]...`
+'''
+
+from argparse import ArgumentParser
+import logging
+import signal
+
+from latexmt_core.metrics import MetricsRegistry, serve_prometheus
+from . import TranslationDaemon
+
+
+def main():
+    parser = ArgumentParser(description='Keep translators and aligners resident and translate documents on request')
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument('--socket', help='path of a Unix socket to listen on')
+    address.add_argument('--port', type=int, help='TCP port to listen on (see also `--host`)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='loopback address to listen on; jobs can read and write any file the daemon can, '
+                             'so other hosts are refused')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--max-queued', type=int, default=64)
+    parser.add_argument('--preload', action='append', default=[], metavar='SRC:TGT:TRANS[:ALIGN]',
+                        help='create a translator and aligner at startup (e.g. `de:en:opus:auto`)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve metrics in the Prometheus format on this port')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    metrics = MetricsRegistry()
+    if args.metrics_port is not None:
+        serve_prometheus(metrics, args.host, args.metrics_port)
+
+    daemon = TranslationDaemon(workers=args.workers, max_queued=args.max_queued, metrics=metrics)
+    for pair in args.preload:
+        daemon.preload(*pair.split(':'))
+    daemon.start()
+
+    # `serve` returns once `stop` has shut down the server, which must happen
+    # on another thread
+    signal.signal(signal.SIGTERM, lambda *_: signal.raise_signal(signal.SIGINT))
+    try:
+        daemon.serve(args.socket if args.socket is not None else (args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+
+
+if __name__ == '__main__':
+    main()
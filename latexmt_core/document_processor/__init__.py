@@ -1,29 +1,53 @@
+from contextlib import AbstractContextManager, contextmanager, nullcontext
 from itertools import chain
+import logging
 import os
 import sys
 
 from latexmt_core.context_logger import ContextLogger, logger_from_kwargs
+from latexmt_core.context_logger.tracing import get_active_tracer, trace_span, tracing
+from latexmt_core.get_translator import LazyAligner, LazyTranslator
 import latexmt_core.glossary.align as gloss_align
 import latexmt_core.glossary.srcrepl as gloss_srcrepl
+from latexmt_core.metrics import MetricsRegistry
 from latexmt_core.parsing.to_text import is_space_or_masked, mask_str_default
-from latexmt_core.parsing.unpack import latex_to_nodelist, get_textitems
-from latexmt_core.parsing.repack import nodelist_to_latex, replace_nodes
+from latexmt_core.parsing.unpack import latex_to_nodelist, iter_textitems
+from latexmt_core.parsing.repack import nodelist_to_latex, write_nodelist_latex, replace_nodes_bulk, write_patched_source
 from latexmt_core.parsing.parsplit import parsplit
+from latexmt_core.parsing.sentsplit import sentsplit
 from latexmt_core.parsing.latex_context import get_latex_context
+from latexmt_core.parsing.prelex import OpaqueRegions, carve_opaque_regions, get_opaque_latex_context
+from latexmt_core.parsing.parse_cache import ParseResult
+from latexmt_core.parsing.text_item import to_source_textitem
 
 from latexmt_core.unicode_helpers import to_unicode_latex
+from latexmt_core.worker_pool import TranslationRequest
 
-from .helpers import ensure_dir, textitem_flatlist_to_nodelist
+from .estimate import DryRunEstimate, FileEstimate
+from .journal import CheckpointJournal
+from .manifest import TranslationManifest, TranslationMemory, FileEntry, IncrementalSummary, digest_bytes, markup_digest
+from .helpers import RstripWriter, ensure_dir, textitem_flatlist_to_nodelist, textitem_flatlist_to_source_edit
 
 # type imports
-from typing import Literal, TextIO
+from typing import Iterable, Iterator, Literal, TextIO, TYPE_CHECKING
+if TYPE_CHECKING:
+    # imports numpy, so only imported with `fuzzy_threshold`
+    from .fuzzy import FuzzyTranslationMemory
 from pathlib import Path
 import pylatexenc.latexnodes.nodes as lw
 from latexmt_core.alignment import Aligner, words_spans_to_markupstr
 from latexmt_core.glossary import GlossaryMethod
-from latexmt_core.markup_string import MarkupStartMarker, MarkupEndMarker
-from latexmt_core.parsing.text_item import TextItem
+from latexmt_core.markup_string import MarkupString, MarkupStartMarker, MarkupEndMarker
+from latexmt_core.parsing.parse_cache import ParseCache
+from latexmt_core.parsing.repack import SourceEdit
+from latexmt_core.parsing.text_item import TextItem, SourceTextItem
 from latexmt_core.translation import Translator
+from latexmt_core.worker_pool import PendingTranslation, TranslationPool
+from .manifest import Flatlist
+
+
+# typedefs
+type OutputMode = Literal['nodes', 'spans']
 
 
 class DocumentTranslator:
@@ -37,13 +61,57 @@ class DocumentTranslator:
     __input_queue: list[Path]
 
     __processed_files: list[Path]
+    # input files of the current run which could not be read or written, or
+    # whose paragraphs could not all be translated
+    __failed_files: list[str]
+
+    __manifest: TranslationManifest | None
+    __journal: CheckpointJournal | None
+    __paragraph_memory: TranslationMemory | None
+    __sentence_memory: TranslationMemory | None
+    __fuzzy_memory: 'FuzzyTranslationMemory | None'
+    # digests of the paragraphs and sentences of the file being processed
+    __paragraph_digests: list[str]
+    __sentence_digests: list[str]
+    # number of paragraphs of the file being processed whose translation failed
+    __failed_paragraphs: int
+    # estimate of the file being processed, during a dry run
+    __file_estimate: FileEstimate
+
+    __translation_lock: AbstractContextManager
+    __worker_pool: TranslationPool | None
+    # translations of the file being processed submitted to `__worker_pool`
+    # ahead of time, by the digest of their source text
+    __prefetched: dict[str, PendingTranslation]
+    # whether translators still being loaded (see `LazyTranslator`) have been
+    # waited for, and everything depending on them resolved
+    __translator_ready: bool
+    __glossary_fallback: GlossaryMethod
+
+    # labels identifying the translation and alignment backends in `metrics`
+    __translator_backend: str
+    __aligner_backend: str
 
     __logger: ContextLogger
 
     glossary: dict[str, str]
-    glossary_method: Literal['builtin'] | GlossaryMethod
+    glossary_method: Literal['auto', 'builtin'] | GlossaryMethod
 
     mask_str: str
+    output_mode: OutputMode
+    prelex: bool
+    parse_cache: ParseCache | None
+    incremental: bool
+    sentence_memory: bool
+    fuzzy_threshold: float | None
+    checkpoint: bool
+    resume: bool
+    journal_fsync_interval: int
+    metrics: MetricsRegistry
+    trace_path: Path | None
+    dry_run: bool
+    incremental_summary: IncrementalSummary | None
+    dry_run_estimate: DryRunEstimate | None
 
     def clear_processed(self):
         '''
@@ -64,8 +132,95 @@ class DocumentTranslator:
         glossary_method: Literal['auto'] | GlossaryMethod = 'auto',
         glossary_fallback: GlossaryMethod = 'align',
         mask_str: str = mask_str_default,
+        output_mode: OutputMode = 'nodes',
+        prelex: bool = True,
+        parse_cache: ParseCache | None = None,
+        incremental: bool = False,
+        sentence_memory: bool = False,
+        fuzzy_threshold: float | None = None,
+        checkpoint: bool = False,
+        resume: bool = False,
+        journal_fsync_interval: int = 16,
+        metrics: MetricsRegistry | None = None,
+        trace_path: Path | None = None,
+        dry_run: bool = False,
+        translation_lock: AbstractContextManager | None = None,
+        worker_pool: TranslationPool | None = None,
         **kwargs
     ):
+        '''
+        `translator` and `aligner` may still be loading (see
+        `get_translator_aligner_lazy`); they are only waited for once the first
+        textitem is about to be translated (with `incremental`, `checkpoint` or
+        `dry_run`, at the start of `process_document`), and a `glossary_method`
+        of `'auto'` is resolved then
+
+        `output_mode` selects how translated textitems are put back together:
+        - `'nodes'`: new nodes are spliced into the parsed node tree, which is
+          then re-serialised
+        - `'spans'`: the translated LaTeX of each textitem is patched directly
+          into the original source; everything outside of textitems is kept
+          byte-identical
+
+        `prelex` enables a fast pre-pass which keeps the bodies of environments
+        in `env_denylist` from being parsed at all
+
+        `parse_cache` stores the textitems and included files extracted from
+        each file, so unchanged files need not be parsed again; as the cache
+        holds no nodes, it is only used with `output_mode == 'spans'`
+
+        `incremental` keeps a manifest next to the output directory, recording
+        the translation of each file and paragraph; on subsequent runs, only
+        new or changed paragraphs are translated, and unchanged files are
+        skipped altogether
+
+        `sentence_memory` splits paragraphs which need to be translated into
+        sentences, and only translates sentences not seen before (within the
+        run, or also in previous runs if `incremental` is set)
+
+        `fuzzy_threshold` enables matching texts to be translated against those
+        translated before (within the run, or also in previous runs if
+        `incremental` is set), by their estimated similarity: matches differing
+        only in masks are reused, while other matches at or above the threshold
+        are passed to translators which support hints (see `Translator.hints`)
+
+        `checkpoint` records every translated paragraph and sentence, as well
+        as every completed file, in a journal next to the output directory,
+        which is removed once the document is finished without any failed
+        files (or paragraphs); `resume` (which implies `checkpoint`) continues an interrupted
+        run from its journal. the journal is synced to disk every
+        `journal_fsync_interval` records and after every file (see
+        `CheckpointJournal`)
+
+        `metrics` collects the time spent in every stage of the pipeline, and
+        counts of files, paragraphs, sentences, characters, tokens, cache hits
+        and failures; without a registry, a disabled one is used
+
+        `trace_path` records every logging frame and pipeline stage of
+        `process_document` as a span, and writes them to the given file as
+        Chrome trace events (see `context_logger.tracing`)
+
+        `dry_run` parses the document, extracts its textitems and preprocesses
+        them for the glossary, but neither translates them nor writes any output,
+        manifest or journal; instead, `dry_run_estimate` holds the number of
+        paragraphs, characters and tokens which would be translated per file,
+        and how many would be reused from the manifest or journal of a previous
+        run (with `incremental` or `resume`) or from earlier in the run, after
+        `process_document` (see `DryRunEstimate`)
+
+        `translation_lock` (e.g. a `threading.Lock`) is held while `translator`
+        and `aligner` are used, so that they can be shared between
+        `DocumentTranslator`s running in several threads
+
+        `worker_pool` (created from `translator` and `aligner`) translates the
+        paragraphs (or sentences) of each file in parallel processes; all of
+        them are submitted once the file is parsed, and their translations
+        collected in order. with `fuzzy_threshold`, which depends on the texts
+        translated before, they are submitted one by one instead
+
+        with `incremental`, `sentence_memory` or `checkpoint`, `incremental_summary` holds the numbers of
+        reused and translated paragraphs and sentences after `process_document`
+        '''
         self.__logger = logger_from_kwargs(**kwargs)
         self.__logger.debug('Initialising %s' % (self.__class__.__name__, ),
                             extra={'translator': translator, 'aligner': aligner, 'mask_str': mask_str})
@@ -75,10 +230,78 @@ class DocumentTranslator:
         self.__recurse_input = recurse_input
         self.__input_queue = list()
         self.__processed_files = list()
+        self.__failed_files = list()
         self.glossary = glossary
-        self.glossary_method = (('builtin' if self.__translator.supports_glossary else glossary_fallback)
-                                if glossary_method == 'auto' else glossary_method)
+        self.glossary_method = glossary_method
+        self.__glossary_fallback = glossary_fallback
         self.mask_str = mask_str
+        self.output_mode = output_mode
+        self.prelex = prelex
+        self.parse_cache = parse_cache
+        self.incremental = incremental
+        self.sentence_memory = sentence_memory
+        self.fuzzy_threshold = fuzzy_threshold
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.journal_fsync_interval = journal_fsync_interval
+        self.metrics = metrics if metrics is not None else MetricsRegistry(enabled=False)
+        self.trace_path = trace_path
+        self.dry_run = dry_run
+        self.__translation_lock = translation_lock if translation_lock is not None else nullcontext()
+        self.__worker_pool = worker_pool
+        self.__prefetched = dict()
+        self.__translator_ready = False
+        self.__translator_backend = ''
+        self.__aligner_backend = ''
+        self.incremental_summary = None
+        self.dry_run_estimate = None
+        self.__manifest = None
+        self.__journal = None
+        self.__paragraph_memory = None
+        self.__sentence_memory = None
+        self.__fuzzy_memory = None
+        self.__paragraph_digests = list()
+        self.__failed_paragraphs = 0
+        self.__sentence_digests = list()
+
+        if self.parse_cache is not None and self.output_mode != 'spans':
+            self.__logger.warning('The parse cache is only used with output_mode \'spans\'')
+
+        if not isinstance(translator, LazyTranslator) and not isinstance(aligner, LazyAligner):
+            self.__resolve_translator()
+
+    def __resolve_translator(self):
+        '''
+        wait for a translator and aligner still being loaded (see
+        `LazyTranslator`), then resolve everything depending on them
+        '''
+        if isinstance(self.__translator, LazyTranslator) or isinstance(self.__aligner, LazyAligner):
+            with self.__stage('load_translator'):
+                if isinstance(self.__translator, LazyTranslator):
+                    self.__translator = self.__translator.translator
+                if isinstance(self.__aligner, LazyAligner):
+                    self.__aligner = self.__aligner.aligner
+
+        if self.glossary_method == 'auto':
+            self.glossary_method = 'builtin' if self.__translator.supports_glossary else self.__glossary_fallback
+        self.__translator_backend = self.__translator.__class__.__name__
+        self.__aligner_backend = self.__aligner.__class__.__name__
+        self.__translator_ready = True
+
+    def __stage(self, stage: str, **labels: str):
+        '''
+        context manager timing a stage of the pipeline in `metrics` and, while
+        tracing, recording it as a span
+        '''
+        timer = self.metrics.time('stage_seconds', stage=stage, **labels)
+        if get_active_tracer() is None:
+            return timer
+        return self.__traced_stage(timer, stage, labels)
+
+    @contextmanager
+    def __traced_stage(self, timer, stage: str, labels: dict[str, str]):
+        with timer, trace_span(stage, 'stage', labels):
+            yield
 
     def __get_input_path(self, filename: Path) -> Path:
         return self.__root_document_dir.joinpath(filename)
@@ -86,8 +309,227 @@ class DocumentTranslator:
     def __get_output_path(self, filename: Path) -> Path:
         return self.__output_dir.joinpath(filename)
 
-    def __translate_textitem(self, textitem: TextItem) -> list[lw.LatexNode]:
-        initial_whitespace, paragraphs, final_whitespace = parsplit(textitem.text)  # nopep8
+    def __translate_markupstr(self, in_text: MarkupString) -> Flatlist:
+        '''
+        translate a single paragraph or sentence, mapping its markup into the
+        translation
+        '''
+        source_text = in_text
+        metrics = self.metrics
+
+        fuzzy_match = None
+        if self.__fuzzy_memory is not None:
+            with self.__stage('fuzzy_lookup'):
+                fuzzy_match = self.__fuzzy_memory.lookup(source_text)
+            if fuzzy_match is not None and fuzzy_match.masks_only:
+                metrics.inc('cache_lookups_total', cache='fuzzy', result='masks_only')
+                if self.dry_run:
+                    self.__file_estimate.fuzzy_matches += 1
+                return fuzzy_match.target
+            metrics.inc('cache_lookups_total', cache='fuzzy', result='miss' if fuzzy_match is None else 'similar')
+
+        # the translator and aligner hold the state of the text being translated
+        with self.__translation_lock:
+            if fuzzy_match is not None and self.__translator.supports_hints:
+                self.__translator.hints = [(fuzzy_match.source, ''.join(
+                    elem for elem in fuzzy_match.target if isinstance(elem, str)))]
+
+            if self.glossary_method == 'srcrepl':
+                with self.__stage('glossary'):
+                    in_text = gloss_srcrepl.apply(in_text, self.glossary)
+            if self.dry_run:
+                return self.__count_markupstr(source_text, in_text)
+            if self.__worker_pool is not None:
+                return self.__translate_in_pool(source_text, in_text)
+            try:
+                with self.__stage('translate', backend=self.__translator_backend):
+                    self.__translator.translate(
+                        in_text, self.glossary if self.glossary_method == 'builtin' else {})
+            except Exception:
+                metrics.inc('failures_total', stage='translate', backend=self.__translator_backend)
+                raise
+            finally:
+                self.__translator.hints = []
+            with self.__stage('align', backend=self.__aligner_backend):
+                self.__aligner.align(
+                    in_text, self.__translator.output_text)
+
+            if self.glossary_method == 'align':
+                with self.__stage('glossary'):
+                    out_text = words_spans_to_markupstr(
+                        *gloss_align.apply(self.__aligner, self.glossary),
+                    )
+            else:
+                out_text = self.__aligner.target_text
+
+            if metrics.enabled:
+                metrics.inc('characters_total', len(str(source_text)), direction='source')
+                metrics.inc('characters_total', len(self.__translator.output_text), direction='target')
+                metrics.inc('tokens_total', len(self.__translator.input_tokens),
+                            direction='input', backend=self.__translator_backend)
+                metrics.inc('tokens_total', len(self.__translator.output_tokens),
+                            direction='output', backend=self.__translator_backend)
+
+            out_text_flatlist = out_text.to_markup_list()
+
+        if self.__fuzzy_memory is not None:
+            self.__fuzzy_memory.add(source_text, out_text_flatlist)
+
+        return out_text_flatlist
+
+    def __count_markupstr(self, source_text: MarkupString, in_text: MarkupString) -> Flatlist:
+        '''
+        count the text which would be sent to the translator during a dry run,
+        in place of translating it; returns `source_text` as its "translation"
+        '''
+        try:
+            with self.__stage('count_tokens', backend=self.__translator_backend):
+                tokens = self.__translator.count_tokens(
+                    in_text, self.glossary if self.glossary_method == 'builtin' else {})
+        finally:
+            self.__translator.hints = []
+
+        file_estimate = self.__file_estimate
+        file_estimate.requests += 1
+        file_estimate.characters += len(str(in_text))
+        file_estimate.tokens = None if tokens is None or file_estimate.tokens is None \
+            else file_estimate.tokens + tokens
+
+        out_text_flatlist = source_text.to_markup_list()
+        if self.__fuzzy_memory is not None:
+            self.__fuzzy_memory.add(source_text, out_text_flatlist)
+
+        return out_text_flatlist
+
+    def __translation_request(self, in_text: MarkupString, hints: list[tuple[str, str]] = []) -> TranslationRequest:
+        return TranslationRequest(
+            text=in_text,
+            glossary=self.glossary if self.glossary_method == 'builtin' else {},
+            align_glossary=self.glossary if self.glossary_method == 'align' else None,
+            hints=hints,
+        )
+
+    def __translate_in_pool(self, source_text: MarkupString, in_text: MarkupString) -> Flatlist:
+        '''
+        translate a paragraph or sentence in `worker_pool`, unless it was
+        submitted ahead of time (see `__prefetch`), and wait for its translation
+        '''
+        assert self.__worker_pool is not None
+        metrics = self.metrics
+
+        try:
+            pending = self.__prefetched.pop(markup_digest(source_text), None)
+            if pending is None:
+                pending = self.__worker_pool.submit(self.__translation_request(in_text, self.__translator.hints))
+        finally:
+            self.__translator.hints = []
+
+        try:
+            with self.__stage('worker_wait'):
+                result = pending.result()
+        except Exception:
+            metrics.inc('failures_total', stage='translate', backend=self.__translator_backend)
+            raise
+
+        if metrics.enabled:
+            # as spent in the worker
+            for stage, seconds in result.stage_seconds.items():
+                backend = {'translate': self.__translator_backend, 'align': self.__aligner_backend}.get(stage)
+                metrics.histogram('stage_seconds', stage=stage, **({'backend': backend} if backend else {}))\
+                    .observe(seconds)
+            metrics.inc('characters_total', len(str(source_text)), direction='source')
+            metrics.inc('characters_total', len(result.output_text), direction='target')
+            metrics.inc('tokens_total', result.input_tokens, direction='input', backend=self.__translator_backend)
+            metrics.inc('tokens_total', result.output_tokens, direction='output', backend=self.__translator_backend)
+
+        if self.__fuzzy_memory is not None:
+            self.__fuzzy_memory.add(source_text, result.flatlist)
+
+        return result.flatlist
+
+    def __prefetch(self, textitems: list[TextItem] | list[SourceTextItem]):
+        '''
+        submit every paragraph (or sentence, with `sentence_memory`) of
+        `textitems` which is going to be translated to `worker_pool` at once,
+        so that they are translated in parallel
+        '''
+        assert self.__worker_pool is not None
+        if not self.__translator_ready:
+            self.__resolve_translator()
+
+        requests = dict[str, TranslationRequest]()
+        for textitem in textitems:
+            _, paragraphs, _ = parsplit(textitem.text)
+            for paragraph in paragraphs:
+                if is_space_or_masked(paragraph, textitem.mask_str) or \
+                        (self.__paragraph_memory is not None and markup_digest(paragraph) in self.__paragraph_memory):
+                    continue
+
+                texts = [paragraph]
+                if self.__sentence_memory is not None:
+                    texts = [sentence for sentence, _ in sentsplit(paragraph, textitem.mask_str)
+                             if not is_space_or_masked(sentence, textitem.mask_str)
+                             and markup_digest(sentence) not in self.__sentence_memory]
+
+                for text in texts:
+                    digest = markup_digest(text)
+                    if digest in requests:
+                        continue
+                    if self.glossary_method == 'srcrepl':
+                        with self.__stage('glossary'):
+                            text = gloss_srcrepl.apply(text, self.glossary)
+                    requests[digest] = self.__translation_request(text)
+            # for paragraph
+        # for textitem
+
+        self.__logger.debug('Submitting texts to worker pool', extra={'texts': len(requests)})
+        self.__prefetched = dict(zip(requests, self.__worker_pool.submit_many(requests.values())))
+
+    def __translate_sentences(self, in_text: MarkupString, mask_str: str, memory: TranslationMemory) -> Flatlist:
+        '''
+        translate a paragraph sentence by sentence, reusing the translations of
+        sentences found in `memory`
+
+        each sentence is aligned on its own, so that reused sentences keep the
+        markup mapped into them when they were first translated
+        '''
+        out_text_flatlist: Flatlist = []
+        for sentence, post_space in sentsplit(in_text, mask_str):
+            digest = markup_digest(sentence)
+            self.__sentence_digests.append(digest)
+
+            if is_space_or_masked(sentence, mask_str):
+                sentence_flatlist = sentence.to_markup_list()
+            elif (reused_flatlist := memory.get(digest)) is not None:
+                sentence_flatlist = reused_flatlist
+                self.metrics.inc('sentences_total', status='reused')
+                if self.dry_run_estimate is not None:
+                    if self.dry_run_estimate.seen(digest):
+                        self.__file_estimate.duplicate_sentences += 1
+                    else:
+                        self.__file_estimate.cached_sentences += 1
+            else:
+                sentence_flatlist = self.__translate_markupstr(sentence)
+                self.metrics.inc('sentences_total', status='translated')
+                if self.dry_run_estimate is not None:
+                    self.dry_run_estimate.seen(digest)
+                    self.__file_estimate.sentences += 1
+                memory.put(digest, sentence_flatlist)
+                if self.__journal is not None:
+                    self.__journal.put('sentence', digest, sentence_flatlist)
+
+            out_text_flatlist.extend(sentence_flatlist)
+            out_text_flatlist.append(post_space)
+        # for sentence, post_space
+
+        return out_text_flatlist
+
+    def __translate_textitem(self, textitem: TextItem | SourceTextItem) -> list[str | MarkupStartMarker | MarkupEndMarker]:
+        if not self.__translator_ready:
+            self.__resolve_translator()
+
+        with self.__stage('parsplit'):
+            initial_whitespace, paragraphs, final_whitespace = parsplit(textitem.text)  # nopep8
 
         # TODO: this should be a type
         translated_flatlist: list[str | MarkupStartMarker | MarkupEndMarker]\
@@ -95,27 +537,49 @@ class DocumentTranslator:
 
         for in_text in paragraphs:
             try:
+                # paragraphs translated in a previous (or interrupted) run are
+                # reused as-is
+                digest, reused_flatlist = None, None
+                if self.__paragraph_memory is not None:
+                    digest = markup_digest(in_text)
+                    self.__paragraph_digests.append(digest)
+                    reused_flatlist = self.__paragraph_memory.get(digest)
+
                 if is_space_or_masked(in_text, textitem.mask_str):
                     out_text_flatlist = in_text.to_markup_list()
+                    self.metrics.inc('paragraphs_total', status='skipped')
+                    if self.dry_run:
+                        self.__file_estimate.skipped_paragraphs += 1
+                elif reused_flatlist is not None:
+                    out_text_flatlist = reused_flatlist
+                    self.metrics.inc('paragraphs_total', status='reused')
+                    if self.dry_run_estimate is not None and digest is not None:
+                        if self.dry_run_estimate.seen(digest):
+                            self.__file_estimate.duplicate_paragraphs += 1
+                        else:
+                            self.__file_estimate.cached_paragraphs += 1
                 else:
-                    if self.glossary_method == 'srcrepl':
-                        in_text = gloss_srcrepl.apply(in_text, self.glossary)
-                    self.__translator.translate(
-                        in_text, self.glossary if self.glossary_method == 'builtin' else {})
-                    self.__aligner.align(
-                        in_text, self.__translator.output_text)
-
-                    if self.glossary_method == 'align':
-                        out_text = words_spans_to_markupstr(
-                            *gloss_align.apply(self.__aligner, self.glossary),
-                        )
+                    if self.dry_run_estimate is not None and digest is not None:
+                        self.dry_run_estimate.seen(digest)
+                    if self.__sentence_memory is not None:
+                        out_text_flatlist = self.__translate_sentences(
+                            in_text, textitem.mask_str, self.__sentence_memory)
                     else:
-                        out_text = self.__aligner.target_text
+                        out_text_flatlist = self.__translate_markupstr(in_text)
+
+                    self.metrics.inc('paragraphs_total', status='translated')
+                    if self.dry_run:
+                        self.__file_estimate.paragraphs += 1
 
-                    out_text_flatlist = out_text.to_markup_list()
+                    if self.__paragraph_memory is not None and digest is not None:
+                        self.__paragraph_memory.put(digest, out_text_flatlist)
+                    if self.__journal is not None and digest is not None:
+                        self.__journal.put('paragraph', digest, out_text_flatlist)
             except Exception as e:
                 self.__logger.warning('Translation of paragraph failed',
                                       extra={'error': e, 'in_text': in_text})
+                self.metrics.inc('paragraphs_total', status='failed')
+                self.__failed_paragraphs += 1
                 translated_flatlist.extend([
                     '\n\n',
                     f'\\textbf{{NOTE}}: Translation of the following paragraph failed: {e}',
@@ -142,48 +606,146 @@ class DocumentTranslator:
         # while tmp_idx
         del tmp_idx
 
-        return textitem_flatlist_to_nodelist(textitem, translated_flatlist)
+        return translated_flatlist
 
-    def __process_file(self, input_file: TextIO, output_file: TextIO):
+    def __process_file(self, input_file: TextIO, output_file: TextIO | None) -> list[str]:
         '''
-        translate a LaTeX document and direct the output to `output_file`
+        translate a LaTeX document and direct the output to `output_file`; during
+        a dry run, there is no output
+
+        returns the list of files included by the document
         '''
 
         self.__logger.info(f'Processing file \'{input_file.name}\'')
+        self.__paragraph_digests.clear()
+        self.__sentence_digests.clear()
+        self.__failed_paragraphs = 0
 
-        # TODO: get list of LaTeX packages to be used here
-        input_text = to_unicode_latex(input_file.read(), [])
-
-        self.__logger.debug('Parsing LaTeX')
+        metrics = self.metrics
 
-        out_included_files = list[str]()
-        latex_context = get_latex_context(out_included_files)
-        nodelist = latex_to_nodelist(input_text, latex_context)
-        textitems = get_textitems(nodelist, latex_context, self.mask_str)
+        # TODO: get list of LaTeX packages to be used here
+        with self.__stage('to_unicode_latex'):
+            input_text = to_unicode_latex(input_file.read(), [])
+
+        parse_cache_key = None
+        parse_result = None
+        if self.parse_cache is not None and self.output_mode == 'spans':
+            parse_cache_key = self.parse_cache.key(input_text, self.mask_str, self.prelex)
+            parse_result = self.parse_cache.get(parse_cache_key)
+            metrics.inc('cache_lookups_total', cache='parse', result='miss' if parse_result is None else 'hit')
+
+        opaque_regions = OpaqueRegions()
+        if self.prelex:
+            with self.__stage('prelex'):
+                input_text, opaque_regions = carve_opaque_regions(input_text)
+
+        textitems: Iterator[TextItem] | Iterable[SourceTextItem]
+        if parse_result is not None:
+            self.__logger.debug('Using cached parsing result')
+            out_included_files = parse_result.included_files
+            textitems = parse_result.textitems
+        else:
+            self.__logger.debug('Parsing LaTeX')
+
+            out_included_files = list[str]()
+            latex_context = get_latex_context(out_included_files)
+            if self.prelex:
+                latex_context = get_opaque_latex_context(latex_context, opaque_regions)
+            with self.__stage('parse'):
+                nodelist = latex_to_nodelist(input_text, latex_context)
+            # textitems are extracted lazily, interleaved with their translation
+            textitems = metrics.time_iter(iter_textitems(nodelist, latex_context, self.mask_str),
+                                          'stage_seconds', stage='extract')
+
+        # replacements are collected per parent nodelist and spliced in at once
+        replacements = dict[int, tuple[list[lw.LatexNode],
+                                       list[tuple[list[lw.LatexNode], list[lw.LatexNode]]]]]()
+
+        source_edits = list[SourceEdit]()
+        source_textitems = list[SourceTextItem]()
+
+        # the debug messages below serialise every textitem twice
+        log_textitems = self.__logger.isEnabledFor(logging.DEBUG)
+
+        # texts whose translation depends on those translated before (with
+        # `fuzzy_threshold`) cannot be submitted ahead of time
+        if self.__worker_pool is not None and self.__fuzzy_memory is None and not self.dry_run:
+            textitems = list(textitems)
+            self.__prefetch(textitems)
 
         for index, textitem in enumerate(textitems):
             with self.__logger.frame({'textitem_index': index}):
-                self.__logger.debug(f'Translating textitem {index+1}/{len(textitems)}')  # nopep8
+                if log_textitems:
+                    self.__logger.debug(f'Translating textitem {index+1}')
 
-                translated_nodelist = self.__translate_textitem(textitem)
+                translated_flatlist = self.__translate_textitem(textitem)
+                metrics.inc('textitems_total')
 
-                original = nodelist_to_latex(textitem.nodelist)
-                translated = nodelist_to_latex(translated_nodelist)
+                if self.dry_run:
+                    self.__file_estimate.textitems += 1
+                    continue
 
-                self.__logger.debug(f'Finished translating textitem {index+1}/{len(textitems)}',
-                                    extra=({'original': original, 'translated': translated}))
+                if self.output_mode == 'spans':
+                    with self.__stage('repack'):
+                        if isinstance(textitem, TextItem):
+                            textitem = to_source_textitem(textitem)
+                            source_textitems.append(textitem)
 
-                # delete original nodes and insert newly created nodes holding translated text
-                self.__logger.debug('Reinserting modified nodelist')
-                replace_nodes(textitem.parent_nodelist,
-                              textitem.nodelist, translated_nodelist)
+                        source_edit = textitem_flatlist_to_source_edit(textitem, translated_flatlist)
+                        source_edits.append(source_edit)
+
+                    if log_textitems:
+                        original = input_text[source_edit.start:source_edit.end]
+                        translated = ''.join(fragment if isinstance(fragment, str) else input_text[slice(*fragment)]
+                                             for fragment in source_edit.fragments)
+                else:
+                    assert isinstance(textitem, TextItem)
+                    with self.__stage('repack'):
+                        translated_nodelist = textitem_flatlist_to_nodelist(textitem, translated_flatlist)
+                        replacements.setdefault(id(textitem.parent_nodelist), (textitem.parent_nodelist, []))[1]\
+                            .append((textitem.nodelist, translated_nodelist))
+
+                    if log_textitems:
+                        original = nodelist_to_latex(textitem.nodelist)
+                        translated = nodelist_to_latex(translated_nodelist)
+
+                if log_textitems:
+                    self.__logger.debug(f'Finished translating textitem {index+1}',
+                                        extra=({'original': original, 'translated': translated}))
         # for index, textitem
+        self.__prefetched.clear()
+
+        # textitems are only converted for `source_edits`, which a dry run skips
+        if self.parse_cache is not None and parse_cache_key is not None and parse_result is None \
+                and not self.dry_run:
+            self.parse_cache.put(parse_cache_key, ParseResult(source_textitems, out_included_files))
+
+        # stream the translated document to the output file
+        if output_file is not None:
+            with self.__stage('write'):
+                output_writer = RstripWriter(output_file)
+                write = opaque_regions.restoring(output_writer.write)
+                if self.output_mode == 'spans':
+                    self.__logger.debug('Patching translated textitems into source')
+                    write_patched_source(input_text, source_edits, write)
+                else:
+                    # delete original nodes and insert newly created nodes holding translated text
+                    self.__logger.debug('Reinserting modified nodelists')
+                    for parent_nodelist, parent_replacements in replacements.values():
+                        replace_nodes_bulk(parent_nodelist, parent_replacements)
+
+                    write_nodelist_latex(nodelist, write)
+                output_writer.close()
 
-        print(nodelist_to_latex(nodelist).rstrip(), file=output_file)
+        self.__queue_included_files(out_included_files)
 
+        self.__logger.debug('Finished processing file')
+        return out_included_files
+
+    def __queue_included_files(self, included_files: list[str]):
         if self.__recurse_input:
-            for new_in_filename in out_included_files:
-                if not Path(new_in_filename).exists:
+            for new_in_filename in included_files:
+                if not self.__get_input_path(Path(new_in_filename)).exists():
                     if not new_in_filename.endswith('.tex'):
                         new_in_filename += '.tex'
 
@@ -194,22 +756,178 @@ class DocumentTranslator:
             # for new_in_filename
         # if self.__recurse_input
 
-        self.__logger.debug('Finished processing file')
+    def __settings_digest(self) -> str:
+        '''
+        everything besides the input which determines the translation output
+        '''
+        if not self.__translator_ready:
+            self.__resolve_translator()
+        return digest_bytes(repr((
+            self.__translator.__class__.__qualname__, sorted(self.__translator.settings.items()),
+            self.__aligner.__class__.__qualname__, sorted(self.__aligner.settings.items()),
+            sorted(self.glossary.items()), self.glossary_method,
+            self.mask_str, self.output_mode, self.prelex,
+        )).encode())
+
+    def __reuse_output(self, input_filename: str, entry: FileEntry | None,
+                       source_digest: str, output_path: Path) -> bool:
+        '''
+        if the input file and its output are unchanged since the run recorded
+        in `entry`, keep the output and queue the included files
+        '''
+        if entry is None or entry.source_digest != source_digest:
+            return False
+        try:
+            if digest_bytes(output_path.read_bytes()) != entry.output_digest:
+                return False
+        except OSError:
+            return False
+
+        if self.__manifest is not None:
+            self.__manifest.reuse_file(input_filename, entry)
+        if self.__journal is not None and input_filename not in self.__journal.files:
+            self.__journal.put_file(input_filename, entry)
+        self.__queue_included_files(entry.included_files)
+        return True
+
+    def __process_input_queue(self):
+        while len(self.__input_queue) > 0:
+            input_filename = self.__input_queue.pop(0)
+            input_path = self.__get_input_path(input_filename)
+
+            output_path = self.__get_output_path(input_filename)
+
+            if input_path.resolve() in self.__processed_files:
+                self.__logger.info('Already processed, skipping')
+                continue
+            self.__processed_files.append(input_path.resolve())
+
+            with self.__logger.frame({
+                'input_path': str(input_path),
+                'output_path': str(output_path)
+            }):
+                if not self.dry_run:
+                    ensure_dir(output_path.parent)
+                try:
+                    source_digest = ''
+                    if self.__manifest is not None or self.__journal is not None:
+                        source_digest = digest_bytes(input_path.read_bytes())
+                    if self.__manifest is not None and self.__reuse_output(
+                            str(input_filename), self.__manifest.get_file(str(input_filename)),
+                            source_digest, output_path):
+                        self.__logger.info('Unchanged since the previous run, reusing output')
+                        self.metrics.inc('files_total', status='reused')
+                        if self.dry_run_estimate is not None:
+                            self.dry_run_estimate.reused_files.append(str(input_filename))
+                        continue
+                    if self.__journal is not None and self.__reuse_output(
+                            str(input_filename), self.__journal.files.get(str(input_filename)),
+                            source_digest, output_path):
+                        self.__logger.info('Completed by the interrupted run, reusing output')
+                        self.metrics.inc('files_total', status='resumed')
+                        if self.dry_run_estimate is not None:
+                            self.dry_run_estimate.reused_files.append(str(input_filename))
+                        continue
+
+                    if self.dry_run_estimate is not None:
+                        self.__file_estimate = self.dry_run_estimate.files.setdefault(
+                            str(input_filename), FileEstimate())
+
+                    with open(input_path, 'r') as input_file, \
+                            open(output_path, 'w') if not self.dry_run else nullcontext() as output_file:
+                        included_files = self.__process_file(input_file, output_file)
+                    self.metrics.inc('files_total', status='translated')
+
+                    # the output of a file with failed paragraphs is not
+                    # reused, so that they are translated again by the next
+                    # (or resumed) run
+                    if self.__failed_paragraphs > 0:
+                        self.__failed_files.append(str(input_filename))
+                    elif not self.dry_run and (self.__manifest is not None or self.__journal is not None):
+                        entry = FileEntry(
+                            source_digest=source_digest,
+                            output_digest=digest_bytes(output_path.read_bytes()),
+                            included_files=included_files,
+                            paragraphs=self.__paragraph_digests.copy(),
+                            sentences=self.__sentence_digests.copy(),
+                        )
+                        if self.__manifest is not None:
+                            self.__manifest.put_file(str(input_filename), entry)
+                        if self.__journal is not None:
+                            self.__journal.put_file(str(input_filename), entry)
+                except OSError as os_err:
+                    # no manifest or journal entry is written for the file, so
+                    # that it is translated again by the next (or resumed) run
+                    self.__logger.warning(
+                        f'Could not open input or output file: {os_err}')
+                    self.metrics.inc('files_total', status='failed')
+                    self.__failed_files.append(str(input_filename))
+        # while len(self.__input_queue)
 
     def process_document(self, root_document: Path, output_dir: Path):
-        with self.__logger.frame({
+        with tracing(self.trace_path) if self.trace_path is not None else nullcontext(), self.__logger.frame({
             'root_document': str(root_document),
             'output_dir': str(output_dir),
         }):
             self.__logger.info('Started processing document')
-            ensure_dir(output_dir)
+            if not self.dry_run:
+                ensure_dir(output_dir)
 
             self.__root_document = root_document
             self.__output_dir = output_dir
+            self.__failed_files.clear()
+
+            self.incremental_summary = None
+            self.dry_run_estimate = None
+            if self.dry_run:
+                # tokens can only be counted once the translator is loaded anyway
+                if not self.__translator_ready:
+                    self.__resolve_translator()
+                self.dry_run_estimate = DryRunEstimate(self.__translator_backend, self.__translator.billing_unit)
+            resolved_output_dir = output_dir.resolve()
+
+            self.__manifest = None
+            if self.incremental and str(self.__root_document) != '-':
+                self.__manifest = TranslationManifest(
+                    resolved_output_dir.with_name(f'{resolved_output_dir.name}.manifest.json'),
+                    self.__settings_digest(), logger=self.__logger)
+
+            self.__journal = None
+            if (self.checkpoint or self.resume) and str(self.__root_document) != '-':
+                self.__journal = CheckpointJournal(
+                    resolved_output_dir.with_name(f'{resolved_output_dir.name}.journal'),
+                    self.__settings_digest(), resume=self.resume,
+                    fsync_interval=self.journal_fsync_interval, read_only=self.dry_run, logger=self.__logger)
+
+            self.__paragraph_memory = None
+            if self.__manifest is not None:
+                self.__paragraph_memory = self.__manifest.paragraphs
+            elif self.__journal is not None:
+                self.__paragraph_memory = TranslationMemory()
+
+            self.__sentence_memory = None
+            if self.sentence_memory:
+                self.__sentence_memory = self.__manifest.sentences if self.__manifest is not None \
+                    else TranslationMemory()
+
+            if self.__journal is not None:
+                assert self.__paragraph_memory is not None
+                self.__paragraph_memory.add_previous(self.__journal.paragraphs)
+                if self.__sentence_memory is not None:
+                    self.__sentence_memory.add_previous(self.__journal.sentences)
+
+            self.__fuzzy_memory = None
+            if self.fuzzy_threshold is not None:
+                from .fuzzy import FuzzyTranslationMemory
+                self.__fuzzy_memory = FuzzyTranslationMemory(
+                    self.fuzzy_threshold, self.mask_str,
+                    self.__manifest.fuzzy if self.__manifest is not None else [])
 
             # stdin
             if str(self.__root_document) == '-':
-                self.__process_file(sys.stdin, sys.stdout)
+                if self.dry_run_estimate is not None:
+                    self.__file_estimate = self.dry_run_estimate.files.setdefault('-', FileEstimate())
+                self.__process_file(sys.stdin, None if self.dry_run else sys.stdout)
                 self.__logger.info(
                     f'See \'{self.__output_dir}/\' for supplemental (`\\input`) files')
 
@@ -217,28 +935,55 @@ class DocumentTranslator:
                 self.__input_queue.append(
                     self.__root_document.relative_to(self.__root_document_dir))
 
-                while len(self.__input_queue) > 0:
-                    input_filename = self.__input_queue.pop(0)
-                    input_path = self.__get_input_path(input_filename)
-
-                    output_path = self.__get_output_path(input_filename)
-
-                    if input_path.resolve() in self.__processed_files:
-                        self.__logger.info('Already processed, skipping')
-                        return
-                    self.__processed_files.append(input_path.resolve())
-
-                    with self.__logger.frame({
-                        'input_path': str(input_path),
-                        'output_path': str(output_path)
-                    }):
-                        ensure_dir(output_path.parent)
-                        try:
-                            with open(input_path, 'r') as input_file, open(output_path, 'w') as output_file:
-                                self.__process_file(input_file, output_file)
-                        except OSError as os_err:
-                            self.__logger.warning(
-                                f'Could not open input or output file: {os_err}')
-                # while len(self.__input_queue)
+                try:
+                    self.__process_input_queue()
+                finally:
+                    # keep the journal of an interrupted run
+                    if self.__journal is not None:
+                        self.__journal.close()
+
+            if self.__fuzzy_memory is not None:
+                self.__logger.info(
+                    f'Reused {self.__fuzzy_memory.masks_only_matches} fuzzy matches differing only in masks, '
+                    f'found {self.__fuzzy_memory.similar_matches} similar fuzzy matches')
+
+            if self.__manifest is not None:
+                if self.__fuzzy_memory is not None:
+                    self.__manifest.fuzzy = self.__fuzzy_memory.to_json()
+                if not self.dry_run:
+                    self.__manifest.save()
+                self.incremental_summary = self.__manifest.summary
+            elif self.__paragraph_memory is not None or self.__sentence_memory is not None:
+                self.incremental_summary = IncrementalSummary()
+                if self.__paragraph_memory is not None:
+                    self.incremental_summary.reused_paragraphs = self.__paragraph_memory.reused
+                    self.incremental_summary.translated_paragraphs = self.__paragraph_memory.translated
+                if self.__sentence_memory is not None:
+                    self.incremental_summary.reused_sentences = self.__sentence_memory.reused
+                    self.incremental_summary.translated_sentences = self.__sentence_memory.translated
+
+            if self.dry_run_estimate is not None:
+                total = self.dry_run_estimate.total
+                self.__logger.info(
+                    f'Dry run: would send {total.requests} texts ({total.characters} characters, '
+                    f'{total.tokens} tokens) of {total.paragraphs} paragraphs to the translator, reusing '
+                    f'{total.cached_paragraphs + total.cached_sentences} cached and '
+                    f'{total.duplicate_paragraphs + total.duplicate_sentences} duplicate paragraphs and sentences '
+                    f'({len(self.dry_run_estimate.reused_files)} unchanged files)')
+            elif self.incremental_summary is not None:
+                summary = self.incremental_summary
+                self.__logger.info(
+                    f'Reused {summary.reused_paragraphs} paragraphs ({summary.reused_files} unchanged files) '
+                    f'and {summary.reused_sentences} sentences, translated {summary.translated_paragraphs} '
+                    f'paragraphs and {summary.translated_sentences} sentences')
+
+            # keep the journal of a run with failed files, which can be resumed
+            # once they are fixed
+            if self.__journal is not None and len(self.__failed_files) > 0:
+                self.__logger.warning('Keeping the journal, as some files failed',
+                                      extra={'journal_path': str(self.__journal.path),
+                                             'failed_files': self.__failed_files})
+            elif self.__journal is not None:
+                self.__journal.remove()
 
             self.__logger.info('Finished processing document')
@@ -0,0 +1,190 @@
+from dataclasses import dataclass, asdict, fields
+
+# type imports
+from latexmt_core.translation import BillingUnit
+
+
+# stages whose time grows with the amount of text translated; see `Throughput`
+_translation_stages = ('translate', 'align', 'glossary', 'fuzzy_lookup')
+
+
+@dataclass
+class FileEstimate:
+    '''
+    what translating a single file (or a whole document) would entail
+
+    texts are counted as they would be sent to the translator, i.e. after
+    glossary preprocessing
+    '''
+
+    textitems: int = 0
+    # paragraphs to be translated (with `sentence_memory`, only their sentences
+    # not seen before are), found in the manifest or journal of a previous run,
+    # repeating one seen before in this run, and consisting only of whitespace
+    # or masks
+    paragraphs: int = 0
+    cached_paragraphs: int = 0
+    duplicate_paragraphs: int = 0
+    skipped_paragraphs: int = 0
+    # sentences to be translated, found in a previous run, and repeating one seen
+    # before in this run (with `sentence_memory`)
+    sentences: int = 0
+    cached_sentences: int = 0
+    duplicate_sentences: int = 0
+    # texts which need not be translated, having a fuzzy match differing only in masks
+    fuzzy_matches: int = 0
+    # calls to `Translator.translate`, and their input
+    requests: int = 0
+    characters: int = 0
+    # `None` if the translator cannot count its tokens
+    tokens: int | None = 0
+
+    def add(self, other: 'FileEstimate'):
+        for field in fields(self):
+            if field.name != 'tokens':
+                setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+        self.tokens = None if self.tokens is None or other.tokens is None else self.tokens + other.tokens
+
+    @property
+    def all_paragraphs(self) -> int:
+        return self.paragraphs + self.cached_paragraphs + self.duplicate_paragraphs + self.skipped_paragraphs
+
+
+@dataclass
+class Throughput:
+    '''
+    throughput of a previous run, used to project the duration of a dry run
+    (see `DryRunEstimate.projected_seconds`)
+
+    the time spent translating and aligning is taken to be proportional to the
+    characters translated, all other stages (parsing, repacking, ...) to the
+    number of paragraphs
+    '''
+
+    seconds_per_character: float
+    seconds_per_paragraph: float
+    # output tokens per input token of the translator; `None` if it does not
+    # report its tokens
+    output_tokens_per_input_token: float | None = None
+
+    @classmethod
+    def from_metrics(cls, metrics: dict, backend: str | None = None) -> 'Throughput':
+        '''
+        derive the throughput from the metrics recorded by `DocumentTranslator`
+        (see `MetricsRegistry.to_json`); `backend` restricts translation times
+        to those of the given translator (e.g. `'DeepLTranslator'`)
+        '''
+        characters = sum(counter['value'] for counter in metrics['counters']
+                         if counter['name'] == 'characters_total' and counter['labels'].get('direction') == 'source')
+        paragraphs = sum(counter['value'] for counter in metrics['counters']
+                         if counter['name'] == 'paragraphs_total')
+
+        tokens = {'input': 0, 'output': 0}
+        for counter in metrics['counters']:
+            labels = counter['labels']
+            if counter['name'] == 'tokens_total' and labels.get('direction') in tokens \
+                    and (backend is None or labels.get('backend') == backend):
+                tokens[labels['direction']] += counter['value']
+
+        translation_seconds = 0.0
+        other_seconds = 0.0
+        for histogram in metrics['histograms']:
+            if histogram['name'] != 'stage_seconds':
+                continue
+            labels = histogram['labels']
+            if labels.get('stage') not in _translation_stages:
+                other_seconds += histogram['sum']
+            elif labels.get('stage') != 'translate' or backend is None or labels.get('backend') == backend:
+                translation_seconds += histogram['sum']
+
+        if characters == 0 or paragraphs == 0:
+            raise ValueError('The metrics do not record any translated text')
+
+        return cls(seconds_per_character=translation_seconds / characters,
+                   seconds_per_paragraph=other_seconds / paragraphs,
+                   output_tokens_per_input_token=tokens['output'] / tokens['input'] if tokens['input'] > 0 else None)
+
+
+class DryRunEstimate:
+    '''
+    collects the `FileEstimate` of every file of a document during a dry run of
+    `DocumentTranslator`
+    '''
+
+    backend: str
+    billing_unit: BillingUnit | None
+
+    files: dict[str, FileEstimate]
+    # files left unchanged since a previous (or interrupted) run
+    reused_files: list[str]
+
+    # digests of the paragraphs and sentences seen so far
+    __seen: set[str]
+
+    def __init__(self, backend: str, billing_unit: BillingUnit | None):
+        self.backend = backend
+        self.billing_unit = billing_unit
+        self.files = dict()
+        self.reused_files = list()
+        self.__seen = set()
+
+    def seen(self, digest: str) -> bool:
+        '''
+        whether a paragraph or sentence was seen before in this run; marks it as
+        seen
+        '''
+        if digest in self.__seen:
+            return True
+        self.__seen.add(digest)
+        return False
+
+    @property
+    def total(self) -> FileEstimate:
+        total = FileEstimate()
+        for file_estimate in self.files.values():
+            total.add(file_estimate)
+        return total
+
+    @property
+    def billed_input(self) -> int | None:
+        '''
+        billed characters or input tokens (see `Translator.billing_unit`)
+        '''
+        match self.billing_unit:
+            case 'characters':
+                return self.total.characters
+            case 'tokens':
+                return self.total.tokens
+            case _:
+                return None
+
+    def billed_output(self, throughput: Throughput | None = None) -> int | None:
+        '''
+        projected output tokens, for translators billing them along with the
+        input tokens; in proportion to the input tokens as in the run recorded
+        by `throughput`, or else as many as there are input tokens (the
+        translation is about as long as its source, which the input tokens
+        include along with the prompt)
+        '''
+        tokens = self.total.tokens
+        if self.billing_unit != 'tokens' or tokens is None:
+            return None
+        ratio = throughput.output_tokens_per_input_token if throughput is not None else None
+        return round(tokens * (ratio if ratio is not None else 1.0))
+
+    def projected_seconds(self, throughput: Throughput) -> float:
+        total = self.total
+        return total.characters * throughput.seconds_per_character \
+            + total.all_paragraphs * throughput.seconds_per_paragraph
+
+    def to_json(self, throughput: Throughput | None = None) -> dict:
+        return {
+            'backend': self.backend,
+            'billing_unit': self.billing_unit,
+            'files': {name: asdict(file_estimate) for name, file_estimate in self.files.items()},
+            'reused_files': self.reused_files,
+            'total': asdict(self.total),
+            'billed_input': self.billed_input,
+            'billed_output': self.billed_output(throughput),
+            'projected_seconds': self.projected_seconds(throughput) if throughput is not None else None,
+        }
@@ -0,0 +1,276 @@
+from dataclasses import dataclass
+import numpy as np
+import re
+
+from latexmt_core.parsing.to_text import get_mask_format_str, get_mask_regex, mask_str_default
+from .manifest import flatlist_from_json, flatlist_to_json
+
+# type imports
+from typing import Iterable
+from latexmt_core.markup_string import MarkupString
+from .manifest import Flatlist, JsonFlatlist
+
+
+class MinHashIndex:
+    '''
+    locality-sensitive index over the character n-grams of texts, finding
+    texts whose (estimated) Jaccard similarity exceeds a threshold
+
+    each text is reduced to a MinHash signature of `bands * rows` values;
+    candidates share all values of at least one band, and are ranked by the
+    fraction of equal signature values
+
+    band keys are kept in sorted arrays, which are searched by bisection;
+    recently added texts are kept in dictionaries until `merge_size` of them
+    have accumulated
+    '''
+
+    ngram_size: int
+    bands: int
+    rows: int
+    merge_size: int
+
+    __multipliers: np.ndarray
+    __increments: np.ndarray
+
+    __count: int
+    __signatures: np.ndarray
+
+    # per band: sorted keys and their ids
+    __band_keys: list[np.ndarray]
+    __band_ids: list[np.ndarray]
+    # per band: keys of texts added since the last merge
+    __pending: list[dict[int, list[int]]]
+    __pending_count: int
+
+    def __init__(self, ngram_size: int = 4, bands: int = 8, rows: int = 4, merge_size: int = 2**16):
+        self.ngram_size = ngram_size
+        self.bands = bands
+        self.rows = rows
+        self.merge_size = merge_size
+
+        rng = np.random.default_rng(0)
+        num_perm = bands * rows
+        self.__multipliers = rng.integers(1, 2**63, size=(num_perm, 1), dtype=np.uint64) | np.uint64(1)
+        self.__increments = rng.integers(0, 2**63, size=(num_perm, 1), dtype=np.uint64)
+
+        self.__count = 0
+        self.__signatures = np.zeros((1024, num_perm), dtype=np.uint32)
+        self.__band_keys = [np.zeros(0, dtype=np.uint64) for _ in range(bands)]
+        self.__band_ids = [np.zeros(0, dtype=np.uint32) for _ in range(bands)]
+        self.__pending = [dict() for _ in range(bands)]
+        self.__pending_count = 0
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def signature(self, text: str) -> np.ndarray:
+        codepoints = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        if len(codepoints) == 0:
+            codepoints = np.zeros(1, dtype=np.uint64)
+
+        with np.errstate(over='ignore'):
+            # FNV-style hash of each n-gram
+            n = min(self.ngram_size, len(codepoints))
+            ngram_hashes = np.zeros(len(codepoints) - n + 1, dtype=np.uint64)
+            for offset in range(n):
+                ngram_hashes *= np.uint64(0x100000001b3)
+                ngram_hashes ^= codepoints[offset:len(codepoints) - n + 1 + offset]
+
+            permuted = self.__multipliers * ngram_hashes + self.__increments
+        return (permuted >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+    def __band_keys_of(self, signature: np.ndarray) -> np.ndarray:
+        band_values = signature.reshape(self.bands, self.rows).astype(np.uint64)
+        keys = np.zeros(self.bands, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            for row in range(self.rows):
+                keys = keys * np.uint64(0x9e3779b97f4a7c15) + band_values[:, row]
+        return keys
+
+    def add(self, text: str) -> int:
+        '''
+        returns the id of the added text; ids are assigned consecutively
+        '''
+        signature = self.signature(text)
+
+        text_id = self.__count
+        if text_id == len(self.__signatures):
+            self.__signatures = np.concatenate([self.__signatures, np.zeros_like(self.__signatures)])
+        self.__signatures[text_id] = signature
+        self.__count += 1
+
+        for band, key in enumerate(self.__band_keys_of(signature).tolist()):
+            self.__pending[band].setdefault(key, []).append(text_id)
+        self.__pending_count += 1
+
+        if self.__pending_count >= self.merge_size:
+            self.__merge()
+
+        return text_id
+
+    def __merge(self):
+        for band, pending in enumerate(self.__pending):
+            pending_keys = np.fromiter((key for key, ids in pending.items() for _ in ids),
+                                       dtype=np.uint64, count=self.__pending_count)
+            pending_ids = np.fromiter((text_id for ids in pending.values() for text_id in ids),
+                                      dtype=np.uint32, count=self.__pending_count)
+
+            keys = np.concatenate([self.__band_keys[band], pending_keys])
+            ids = np.concatenate([self.__band_ids[band], pending_ids])
+            order = np.argsort(keys, kind='stable')
+            self.__band_keys[band], self.__band_ids[band] = keys[order], ids[order]
+            pending.clear()
+
+        self.__pending_count = 0
+
+    def query(self, text: str, threshold: float) -> list[tuple[int, float]]:
+        '''
+        returns `(id, similarity)` of the indexed texts with an estimated
+        similarity of at least `threshold`, most similar first
+        '''
+        signature = self.signature(text)
+
+        candidate_ids = list[np.ndarray]()
+        keys = self.__band_keys_of(signature)
+        for band, key in enumerate(keys.tolist()):
+            # search using the numpy scalar, which avoids converting `band_keys`
+            band_keys = self.__band_keys[band]
+            start = band_keys.searchsorted(keys[band], side='left')
+            end = band_keys.searchsorted(keys[band], side='right')
+            if start < end:
+                candidate_ids.append(self.__band_ids[band][start:end])
+            if key in self.__pending[band]:
+                candidate_ids.append(np.array(self.__pending[band][key], dtype=np.uint32))
+
+        if len(candidate_ids) == 0:
+            return []
+
+        candidates = np.unique(np.concatenate(candidate_ids))
+        similarities = (self.__signatures[candidates] == signature).mean(axis=1)
+        selected = similarities >= threshold
+        order = np.argsort(-similarities[selected], kind='stable')
+        return list(zip(candidates[selected][order].tolist(), similarities[selected][order].tolist()))
+
+
+# number of most recent entries kept by `to_json`
+default_max_entries = 100_000
+
+# replaces masks, regardless of their index, for matching
+_mask_placeholder = '\ue002'
+
+
+@dataclass
+class FuzzyMatch:
+    similarity: float
+    source: str
+    target: Flatlist
+    # whether the texts only differ in the numbering of masks; if so, `target`
+    # has been renumbered to match the queried text
+    masks_only: bool
+
+
+class FuzzyTranslationMemory:
+    '''
+    finds previously translated texts similar to a given text
+
+    masks are disregarded for matching, as they are numbered per textitem; two
+    texts which only differ in masks are considered equal
+    '''
+
+    threshold: float
+    mask_str: str
+
+    # numbers of lookups which found a match differing in masks only, or a
+    # match which is merely similar
+    masks_only_matches: int
+    similar_matches: int
+
+    __index: MinHashIndex
+    __mask_regex: re.Pattern
+    __mask_format_str: str
+    __sources: list[JsonFlatlist]
+    __targets: list[JsonFlatlist]
+
+    def __init__(self, threshold: float = 0.8, mask_str: str = mask_str_default,
+                 entries: Iterable[tuple[JsonFlatlist, JsonFlatlist]] = []):
+        self.threshold = threshold
+        self.mask_str = mask_str
+        self.masks_only_matches = 0
+        self.similar_matches = 0
+
+        self.__index = MinHashIndex()
+        self.__mask_regex = re.compile(get_mask_regex(mask_str))
+        self.__mask_format_str = get_mask_format_str(mask_str)
+        self.__sources = list()
+        self.__targets = list()
+
+        for source, target in entries:
+            self.__add(source, target)
+
+    def __len__(self) -> int:
+        return len(self.__sources)
+
+    def __normalize(self, json_flatlist: JsonFlatlist) -> str:
+        return self.__mask_regex.sub(_mask_placeholder, repr(json_flatlist))
+
+    def __text(self, json_flatlist: JsonFlatlist) -> str:
+        return ''.join(elem for elem in json_flatlist if isinstance(elem, str))
+
+    def __plaintext(self, json_flatlist: JsonFlatlist) -> str:
+        '''
+        the text used for matching, with masks replaced by a placeholder
+        '''
+        return self.__mask_regex.sub(_mask_placeholder, self.__text(json_flatlist))
+
+    def __mask_indices(self, json_flatlist: JsonFlatlist) -> list[int]:
+        return [int(m.group(1)) for elem in json_flatlist if isinstance(elem, str)
+                for m in self.__mask_regex.finditer(elem)]
+
+    def __add(self, source: JsonFlatlist, target: JsonFlatlist):
+        self.__index.add(self.__plaintext(source))
+        self.__sources.append(source)
+        self.__targets.append(target)
+
+    def add(self, source: MarkupString, target: Flatlist):
+        self.__add(flatlist_to_json(source.to_markup_list()), flatlist_to_json(target))
+
+    def lookup(self, source: MarkupString) -> FuzzyMatch | None:
+        json_source = flatlist_to_json(source.to_markup_list())
+        matches = self.__index.query(self.__plaintext(json_source), self.threshold)
+        if len(matches) == 0:
+            return None
+
+        # prefer a match differing in masks only
+        normalized_source = self.__normalize(json_source)
+        for entry_id, similarity in matches:
+            if self.__normalize(self.__sources[entry_id]) == normalized_source:
+                self.masks_only_matches += 1
+                return FuzzyMatch(similarity, self.__text(self.__sources[entry_id]),
+                                  self.__renumber_masks(entry_id, json_source), masks_only=True)
+
+        entry_id, similarity = matches[0]
+        self.similar_matches += 1
+        return FuzzyMatch(similarity, self.__text(self.__sources[entry_id]),
+                          flatlist_from_json(self.__targets[entry_id]), masks_only=False)
+
+    def __renumber_masks(self, entry_id: int, json_source: JsonFlatlist) -> Flatlist:
+        '''
+        the target of entry `entry_id`, with masks numbered as in `json_source`
+        '''
+        mask_map = dict(zip(self.__mask_indices(self.__sources[entry_id]), self.__mask_indices(json_source)))
+
+        def renumber(m: re.Match) -> str:
+            mask_idx = int(m.group(1))
+            return self.__mask_format_str.format(idx=mask_map.get(mask_idx, mask_idx))
+
+        return flatlist_from_json([self.__mask_regex.sub(renumber, elem) if isinstance(elem, str) else elem
+                                    for elem in self.__targets[entry_id]])
+
+    def to_json(self, max_entries: int | None = default_max_entries) -> list[tuple[JsonFlatlist, JsonFlatlist]]:
+        '''
+        returns the (at most `max_entries` most recent) entries, as accepted by
+        the constructor
+        '''
+        start = 0 if max_entries is None else max(0, len(self.__sources) - max_entries)
+        return list(zip(self.__sources[start:], self.__targets[start:]))
@@ -3,12 +3,15 @@ from pylatexenc.macrospec import ParsedMacroArgs
 import re
 from typing import cast
 
+from latexmt_core.parsing.repack import SourceEdit
 from latexmt_core.parsing.to_text import get_mask_regex, get_mask_format_str
 
 # type imports
 from pathlib import Path
+from typing import TextIO
 import pylatexenc.latexnodes.nodes as lw
-from latexmt_core.parsing.text_item import TextItem
+from latexmt_core.parsing.repack import SourceFragment
+from latexmt_core.parsing.text_item import TextItem, SourceTextItem
 from latexmt_core.markup_string import MarkupStartMarker, MarkupEndMarker
 
 
@@ -19,12 +22,48 @@ def ensure_dir(dir: Path):
         dir.mkdir(parents=True)
 
 
+class RstripWriter:
+    '''
+    wraps a `TextIO` stream such that trailing whitespace is held back until
+    more non-whitespace output follows; on `close`, the held-back whitespace is
+    dropped and `end` is written instead
+
+    equivalent to `print(text.rstrip(), end=end, file=stream)` for streamed text
+    '''
+
+    stream: TextIO
+    end: str
+    __pending: list[str]
+
+    def __init__(self, stream: TextIO, end: str = '\n'):
+        self.stream = stream
+        self.end = end
+        self.__pending = list()
+
+    def write(self, text: str):
+        stripped = text.rstrip()
+        if len(stripped) == 0:
+            self.__pending.append(text)
+            return
+
+        if len(self.__pending) > 0:
+            self.stream.write(''.join(self.__pending))
+            self.__pending.clear()
+        self.stream.write(stripped)
+        if len(stripped) < len(text):
+            self.__pending.append(text[len(stripped):])
+
+    def close(self):
+        self.__pending.clear()
+        self.stream.write(self.end)
+
+
 def textitem_flatlist_to_nodelist(
     textitem: TextItem,
     translated_flatlist: list[str | MarkupStartMarker | MarkupEndMarker],
 ) -> list[lw.LatexNode]:
     translated_nodelist = list[lw.LatexNode]()
-    translated_pos: int = cast(int, textitem.nodelist[0].pos)
+    translated_pos: int = textitem.pos
 
     nodelist_stack = [translated_nodelist]
     for translated_elem in translated_flatlist:
@@ -42,7 +81,7 @@ def textitem_flatlist_to_nodelist(
                         text,
                         pos=translated_pos,
                         len=len(text),
-                        parsing_state=textitem.nodelist[0].parsing_state)
+                        parsing_state=textitem.first_node.parsing_state)
                     nodelist_stack[-1].append(chars_node)
                     translated_pos += cast(int, chars_node.len)
 
@@ -65,7 +104,7 @@ def textitem_flatlist_to_nodelist(
                     [],
                     pos=translated_pos + macro_start_len,
                     len=0,
-                    parsing_state=textitem.nodelist[0].parsing_state
+                    parsing_state=textitem.first_node.parsing_state
                 )
 
                 if macroname == '':
@@ -77,7 +116,7 @@ def textitem_flatlist_to_nodelist(
                         len=0,
                         nodeargd=ParsedMacroArgs(
                             [group_node], argspec='{'),
-                        parsing_state=textitem.nodelist[0].parsing_state
+                        parsing_state=textitem.first_node.parsing_state
                     )
                     translated_pos += macro_start_len + 1
 
@@ -94,3 +133,50 @@ def textitem_flatlist_to_nodelist(
     # for translated_elem in translated_flatlist
 
     return translated_nodelist
+
+
+def textitem_flatlist_to_source_edit(
+    textitem: SourceTextItem,
+    translated_flatlist: list[str | MarkupStartMarker | MarkupEndMarker],
+) -> SourceEdit:
+    '''
+    like `textitem_flatlist_to_nodelist`, but produces the translated LaTeX
+    directly as a `SourceEdit` on the span of the original source covered by
+    `textitem`, without needing any nodes
+
+    nodes skipped by `textitem` are copied after the translation (as their
+    nodes stay in place after it in `replace_nodes_bulk`), so that edits nested
+    in them are applied
+    '''
+    fragments = list[SourceFragment]()
+
+    for translated_elem in translated_flatlist:
+        match translated_elem:
+            # re-insert masked nodes
+            case str():
+                elem_split = re.split(get_mask_regex(textitem.mask_str), translated_elem)
+                for text, mask_idx in zip(elem_split[::2], chain(map(int, elem_split[1::2]), [None])):
+                    # special case for percent signs
+                    fragments.append(text.replace('%', '\\%'))
+
+                    if mask_idx is not None:
+                        try:
+                            fragments.extend(textitem.masked_spans[mask_idx - 1])
+                        except IndexError:
+                            # TODO: emit warning
+                            fragments.append(get_mask_format_str(textitem.mask_str).format(idx=mask_idx))
+
+            case MarkupStartMarker(macroname):
+                fragments.append('{' if macroname == '' else f'\\{macroname}{{')
+
+            case MarkupEndMarker():
+                fragments.append('}')
+    # for translated_elem in translated_flatlist
+
+    fragments.extend(textitem.skipped_spans)
+
+    return SourceEdit(
+        start=textitem.start,
+        end=textitem.end,
+        fragments=fragments,
+    )
@@ -0,0 +1,157 @@
+from dataclasses import asdict
+import json
+import os
+
+from latexmt_core.context_logger import ContextLogger, logger_from_kwargs
+from .manifest import FileEntry, flatlist_to_json
+
+# type imports
+from pathlib import Path
+from typing import BinaryIO, Literal
+from .manifest import Flatlist, JsonFlatlist
+
+
+journal_version = 1
+
+type RecordKind = Literal['paragraph', 'sentence']
+
+
+class CheckpointJournal:
+    '''
+    append-only log of the paragraphs, sentences and files completed during a
+    run, from which an interrupted run can be resumed
+
+    every record is a single line of JSON, which is flushed to the operating
+    system as soon as it is written; `fsync_interval` records are batched into
+    a single `fsync`, trading the durability of the most recent records in case
+    of a system crash for throughput (`0` only syncs on `close`)
+
+    the journal is only valid for the `settings` it was created with; if those
+    differ, or `resume` is not set, it starts out empty. a partially written
+    final record, as left behind by a crash, is discarded
+
+    a `read_only` journal only loads the records of an existing journal (with
+    `resume`); it is neither written to nor removed
+    '''
+
+    path: Path
+    settings: str
+    fsync_interval: int
+
+    # completed translations, keyed by their digest (see `markup_digest`)
+    paragraphs: dict[str, JsonFlatlist]
+    sentences: dict[str, JsonFlatlist]
+    files: dict[str, FileEntry]
+
+    __file: BinaryIO | None
+    __unsynced: int
+
+    __logger: ContextLogger
+
+    def __init__(self, path: Path, settings: str, resume: bool = False, fsync_interval: int = 16,
+                 read_only: bool = False, **kwargs):
+        self.__logger = logger_from_kwargs(**kwargs)
+        self.path = path
+        self.settings = settings
+        self.fsync_interval = fsync_interval
+        self.__unsynced = 0
+
+        self.paragraphs = dict()
+        self.sentences = dict()
+        self.files = dict()
+
+        valid_length = self.__replay() if resume else 0
+
+        self.__file = None
+        if read_only:
+            return
+
+        self.__file = open(self.path, 'ab' if valid_length > 0 else 'wb')
+        if valid_length > 0:
+            self.__file.truncate(valid_length)
+            self.__logger.info(
+                f'Resuming from journal with {len(self.files)} files, {len(self.paragraphs)} paragraphs '
+                f'and {len(self.sentences)} sentences')
+        else:
+            self.__append({'version': journal_version, 'settings': self.settings})
+
+    def __replay(self) -> int:
+        '''
+        load the records of an existing journal
+
+        returns the length of its valid prefix, or `0` if there is none
+        '''
+        try:
+            with open(self.path, 'rb') as journal_file:
+                lines = journal_file.readlines()
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            self.__logger.warning('Ignoring unreadable journal',
+                                  extra={'journal_path': str(self.path), 'error': e})
+            return 0
+
+        valid_length = 0
+        for line_idx, line in enumerate(lines):
+            try:
+                if not line.endswith(b'\n'):
+                    raise ValueError('incomplete record')
+                record = json.loads(line)
+            except ValueError:
+                self.__logger.warning('Discarding incomplete journal record',
+                                      extra={'journal_path': str(self.path), 'line': line_idx + 1})
+                break
+
+            if line_idx == 0:
+                if record.get('version') != journal_version or record.get('settings') != self.settings:
+                    self.__logger.info('Translation settings changed, ignoring previous journal')
+                    return 0
+            elif 'paragraph' in record:
+                self.paragraphs[record['paragraph']] = record['target']
+            elif 'sentence' in record:
+                self.sentences[record['sentence']] = record['target']
+            elif 'file' in record:
+                name = record.pop('file')
+                self.files[name] = FileEntry(**record)
+
+            valid_length += len(line)
+        # for line_idx, line
+
+        return valid_length
+
+    def __append(self, record: dict):
+        if self.__file is None:
+            return
+        self.__file.write(json.dumps(record, ensure_ascii=False).encode() + b'\n')
+        self.__file.flush()
+
+        self.__unsynced += 1
+        if self.fsync_interval > 0 and self.__unsynced >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self.__file is not None and self.__unsynced > 0:
+            os.fsync(self.__file.fileno())
+            self.__unsynced = 0
+
+    def put(self, kind: RecordKind, digest: str, flatlist: Flatlist):
+        self.__append({kind: digest, 'target': flatlist_to_json(flatlist)})
+
+    def put_file(self, name: str, entry: FileEntry):
+        self.__append({'file': name} | asdict(entry))
+        # a completed file is a natural checkpoint
+        if self.fsync_interval > 0:
+            self.sync()
+
+    def close(self):
+        if self.__file is not None and not self.__file.closed:
+            self.sync()
+            self.__file.close()
+
+    def remove(self):
+        '''
+        close and delete the journal, once the run it records has completed
+        '''
+        if self.__file is not None:
+            self.close()
+            self.path.unlink(missing_ok=True)
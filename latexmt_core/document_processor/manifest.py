@@ -0,0 +1,232 @@
+from dataclasses import dataclass, field, asdict
+import hashlib
+import json
+import os
+
+from latexmt_core.context_logger import ContextLogger, logger_from_kwargs
+from latexmt_core.markup_string import MarkupStartMarker, MarkupEndMarker
+
+# type imports
+from pathlib import Path
+from typing import Iterable
+from latexmt_core.markup_string import MarkupString
+
+
+# typedefs
+type Flatlist = list[str | MarkupStartMarker | MarkupEndMarker]
+type JsonFlatlist = list[str | dict[str, str]]
+
+
+manifest_version = 2
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def markup_digest(text: MarkupString) -> str:
+    '''
+    digest of a paragraph's or sentence's text along with its markup
+    '''
+    return digest_bytes(repr(text.to_markup_list()).encode())
+
+
+def flatlist_to_json(flatlist: Flatlist) -> JsonFlatlist:
+    return [elem if isinstance(elem, str)
+            else {'start' if isinstance(elem, MarkupStartMarker) else 'end': elem.macroname}
+            for elem in flatlist]
+
+
+def flatlist_from_json(json_flatlist: JsonFlatlist) -> Flatlist:
+    return [elem if isinstance(elem, str)
+            else MarkupStartMarker(elem['start']) if 'start' in elem
+            else MarkupEndMarker(elem['end'])
+            for elem in json_flatlist]
+
+
+class TranslationMemory:
+    '''
+    maps digests of source texts (see `markup_digest`) to their translations
+
+    entries carried over from a previous run are only kept (see `to_json`) once
+    they are used again
+    '''
+
+    reused: int
+    translated: int
+
+    __previous: dict[str, JsonFlatlist]
+    __entries: dict[str, JsonFlatlist]
+
+    def __init__(self, previous: dict[str, JsonFlatlist] = {}):
+        self.reused = 0
+        self.translated = 0
+        self.__previous = previous
+        self.__entries = dict()
+
+    def get(self, digest: str) -> Flatlist | None:
+        json_flatlist = self.__entries.get(digest) or self.__previous.get(digest)
+        if json_flatlist is None:
+            return None
+
+        self.__entries[digest] = json_flatlist
+        self.reused += 1
+        return flatlist_from_json(json_flatlist)
+
+    def __contains__(self, digest: str) -> bool:
+        '''
+        whether `get` would find `digest`, without counting it as reused
+        '''
+        return digest in self.__entries or digest in self.__previous
+
+    def put(self, digest: str, flatlist: Flatlist):
+        self.__entries[digest] = flatlist_to_json(flatlist)
+        self.translated += 1
+
+    def add_previous(self, entries: dict[str, JsonFlatlist]):
+        '''
+        make further entries available as if they were from the previous run
+        (e.g. those recorded by a `CheckpointJournal`)
+        '''
+        self.__previous = self.__previous | entries
+
+    def carry_over(self, digests: Iterable[str]):
+        '''
+        keep the given entries from the previous run without using them
+        '''
+        for digest in digests:
+            if digest in self.__previous:
+                self.__entries[digest] = self.__previous[digest]
+                self.reused += 1
+
+    def to_json(self) -> dict[str, JsonFlatlist]:
+        return self.__entries
+
+
+@dataclass
+class FileEntry:
+    '''
+    state of a single input file as of the run which translated it
+    '''
+
+    source_digest: str
+    output_digest: str
+    included_files: list[str]
+    # digests of the file's paragraphs and sentences, in document order
+    paragraphs: list[str] = field(default_factory=list)
+    sentences: list[str] = field(default_factory=list)
+
+
+@dataclass
+class IncrementalSummary:
+    reused_files: int = 0
+    reused_paragraphs: int = 0
+    translated_paragraphs: int = 0
+    reused_sentences: int = 0
+    translated_sentences: int = 0
+
+
+class TranslationManifest:
+    '''
+    records the translation of every file, paragraph and sentence of a
+    document, such that a subsequent run only needs to translate what changed
+
+    the manifest is only valid for the `settings` it was created with (e.g.
+    translator, languages, glossary); if those differ, it starts out empty
+    '''
+
+    path: Path
+    settings: str
+    reused_files: int
+
+    paragraphs: TranslationMemory
+    sentences: TranslationMemory
+    # entries of a `FuzzyTranslationMemory`
+    fuzzy: list[tuple[JsonFlatlist, JsonFlatlist]]
+
+    __previous_files: dict[str, FileEntry]
+    __files: dict[str, FileEntry]
+
+    __logger: ContextLogger
+
+    def __init__(self, path: Path, settings: str, **kwargs):
+        self.__logger = logger_from_kwargs(**kwargs)
+        self.path = path
+        self.settings = settings
+        self.reused_files = 0
+
+        self.__previous_files = dict()
+        self.__files = dict()
+
+        manifest = self.__load()
+        self.paragraphs = TranslationMemory(manifest.get('paragraphs', {}))
+        self.sentences = TranslationMemory(manifest.get('sentences', {}))
+        self.fuzzy = manifest.get('fuzzy', [])
+
+    def __load(self) -> dict:
+        try:
+            with open(self.path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.__logger.warning('Ignoring unreadable manifest',
+                                  extra={'manifest_path': str(self.path), 'error': e})
+            return {}
+
+        if manifest.get('version') != manifest_version or manifest.get('settings') != self.settings:
+            self.__logger.info('Translation settings changed, ignoring previous manifest')
+            return {}
+
+        self.__previous_files = {name: FileEntry(**entry)
+                                 for name, entry in manifest['files'].items()}
+        return manifest
+
+    @property
+    def summary(self) -> IncrementalSummary:
+        return IncrementalSummary(
+            reused_files=self.reused_files,
+            reused_paragraphs=self.paragraphs.reused,
+            translated_paragraphs=self.paragraphs.translated,
+            reused_sentences=self.sentences.reused,
+            translated_sentences=self.sentences.translated,
+        )
+
+    def get_file(self, name: str) -> FileEntry | None:
+        return self.__previous_files.get(name)
+
+    def reuse_file(self, name: str, entry: FileEntry):
+        '''
+        carry over an unchanged file, along with its paragraphs and sentences
+        '''
+        self.__files[name] = entry
+        self.paragraphs.carry_over(entry.paragraphs)
+        self.sentences.carry_over(entry.sentences)
+        self.reused_files += 1
+
+    def put_file(self, name: str, entry: FileEntry):
+        self.__files[name] = entry
+
+    def save(self):
+        '''
+        write the manifest, keeping only files, paragraphs and sentences seen in
+        this run
+        '''
+        manifest = {
+            'version': manifest_version,
+            'settings': self.settings,
+            'files': {name: asdict(entry) for name, entry in self.__files.items()},
+            'paragraphs': self.paragraphs.to_json(),
+            'sentences': self.sentences.to_json(),
+            'fuzzy': self.fuzzy,
+        }
+
+        tmp_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'w') as tmp_file:
+                json.dump(manifest, tmp_file, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.__logger.warning('Could not write manifest',
+                                  extra={'manifest_path': str(self.path), 'error': e})
+            tmp_path.unlink(missing_ok=True)
@@ -1,9 +1,20 @@
+from concurrent.futures import Future
+import threading
 from typing import cast
 
 from latexmt_core.context_logger import logger_from_kwargs
 from latexmt_core.translation import Translator
 from latexmt_core.alignment import Aligner
 
+# type imports
+from typing import Sequence, TYPE_CHECKING
+if TYPE_CHECKING:
+    import numpy as np
+from latexmt_core.alignment import AlignmentWord
+from latexmt_core.glossary import Glossary
+from latexmt_core.markup_string import Markup, MarkupString
+from latexmt_core.translation import BillingUnit, StringType, TokenSequence
+
 
 def get_translator_aligner(src_lang: str, tgt_lang: str,
                            trans_type: str, align_type: str | None,
@@ -89,3 +100,162 @@ def get_translator_aligner(src_lang: str, tgt_lang: str,
             raise NotImplementedError(f'Invalid aligner: {align_type}')  # nopep8
 
     return translator, aligner
+
+
+def get_translator_aligner_lazy(src_lang: str, tgt_lang: str,
+                                trans_type: str, align_type: str | None,
+                                **kwargs) -> tuple['LazyTranslator', 'LazyAligner']:
+    '''
+    like `get_translator_aligner`, but returns at once, while the translator
+    and aligner are created on a background thread
+
+    `DocumentTranslator` only waits for them once it is about to translate,
+    so that loading models overlaps with reading and parsing the document
+    '''
+    future = Future[tuple[Translator, Aligner]]()
+
+    def load():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(get_translator_aligner(src_lang, tgt_lang, trans_type, align_type, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=load, name='latexmt-load-translator', daemon=True).start()
+    return LazyTranslator(future, src_lang, tgt_lang), LazyAligner(future, src_lang, tgt_lang)
+
+
+class LazyTranslator(Translator):
+    '''
+    stands in for a translator created on a background thread (see
+    `get_translator_aligner_lazy`); everything but the languages waits for it,
+    and raises the exception it failed with, if any
+    '''
+
+    __future: Future[tuple[Translator, Aligner]]
+
+    def __init__(self, future: Future[tuple[Translator, Aligner]], src_lang: str, tgt_lang: str):
+        # `Translator.__init__` would set attributes only known once loaded
+        self.src_lang = src_lang
+        self.tgt_lang = tgt_lang
+        self.__future = future
+
+    @property
+    def loaded(self) -> bool:
+        return self.__future.done()
+
+    @property
+    def translator(self) -> Translator:
+        return self.__future.result()[0]
+
+    @property
+    def supports_glossary(self) -> bool:  # type: ignore
+        return self.translator.supports_glossary
+
+    @property
+    def supports_hints(self) -> bool:  # type: ignore
+        return self.translator.supports_hints
+
+    @property
+    def billing_unit(self) -> BillingUnit | None:  # type: ignore
+        return self.translator.billing_unit
+
+    @property
+    def hints(self) -> list[tuple[str, str]]:  # type: ignore
+        return self.translator.hints
+
+    @property
+    def settings(self) -> dict[str, object]:
+        return self.translator.settings
+
+    @hints.setter
+    def hints(self, value: list[tuple[str, str]]):
+        self.translator.hints = value
+
+    @property
+    def input_tokens(self) -> TokenSequence:
+        return self.translator.input_tokens
+
+    @property
+    def input_text(self) -> str:
+        return self.translator.input_text
+
+    @property
+    def output_tokens(self) -> TokenSequence:
+        return self.translator.output_tokens
+
+    @property
+    def output_text(self) -> str:
+        return self.translator.output_text
+
+    def translate(self, input_text: StringType, glossary: Glossary = {}):
+        self.translator.translate(input_text, glossary)
+
+    def count_tokens(self, input_text: StringType, glossary: Glossary = {}) -> int | None:
+        return self.translator.count_tokens(input_text, glossary)
+
+    def __repr__(self):
+        if self.loaded and self.__future.exception() is None:
+            return f'{self.__class__.__name__}({self.translator!r})'
+        return f'{self.__class__.__name__}(src_lang={self.src_lang}, tgt_lang={self.tgt_lang})'
+
+
+class LazyAligner(Aligner):
+    '''
+    stands in for an aligner created on a background thread (see
+    `get_translator_aligner_lazy` and `LazyTranslator`)
+    '''
+
+    __future: Future[tuple[Translator, Aligner]]
+
+    def __init__(self, future: Future[tuple[Translator, Aligner]], src_lang: str, tgt_lang: str):
+        super().__init__(src_lang, tgt_lang)
+        self.__future = future
+
+    @property
+    def loaded(self) -> bool:
+        return self.__future.done()
+
+    @property
+    def aligner(self) -> Aligner:
+        return self.__future.result()[1]
+
+    @property
+    def settings(self) -> dict[str, object]:
+        return self.aligner.settings
+
+    @property
+    def source_words(self) -> Sequence[AlignmentWord]:
+        return self.aligner.source_words
+
+    @property
+    def source_markup_spans(self) -> Sequence[Markup]:
+        return self.aligner.source_markup_spans
+
+    @property
+    def source_text(self) -> MarkupString:
+        return self.aligner.source_text
+
+    @property
+    def target_words(self) -> Sequence[AlignmentWord]:
+        return self.aligner.target_words
+
+    @property
+    def target_markup_spans(self) -> Sequence[Markup]:
+        return self.aligner.target_markup_spans
+
+    @property
+    def target_text(self) -> MarkupString:
+        return self.aligner.target_text
+
+    @property
+    def alignments(self) -> 'np.ndarray':
+        return self.aligner.alignments
+
+    @property
+    def alignments_raw(self) -> 'np.ndarray':
+        return self.aligner.alignments_raw
+
+    def align(self, source_text: StringType, target_text: StringType):
+        self.aligner.align(source_text, target_text)
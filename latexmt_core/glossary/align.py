@@ -1,4 +1,3 @@
-import numpy as np
 from typing import cast
 
 from latexmt_core.alignment.wordsplit import get_words_and_spans
@@ -44,6 +43,8 @@ def apply(aligner: Aligner, glossary: dict[str, str]) -> tuple[Sequence[Alignmen
     if len(glossary) == 0:
         return aligner.target_words, aligner.target_markup_spans
 
+    import numpy as np
+
     glossary_src_idxes = list[tuple[str, int]]()
     for gloss_src in glossary:
         if gloss_src not in str(aligner.source_text):
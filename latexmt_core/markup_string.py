@@ -250,12 +250,20 @@ class MarkupString:
         return self.__markups
 
 
-# monkeypatch for unicode-char macros
+# monkeypatch for unicode-char macros, installed by `install_normalize_override`
 # autopep8: off
 normalize_orig = unicodedata.normalize
 def normalize_override(form, unistr: str | MarkupString) -> str:
     if isinstance(unistr, MarkupString):
         unistr = str(unistr)
     return normalize_orig(form, unistr)
-unicodedata.normalize = normalize_override
 # autopep8: on
+
+
+def install_normalize_override():
+    '''
+    let `unicodedata.normalize` accept `MarkupString`s, as passed to it by the
+    replacements of unicode-char macros in `pylatexenc.latex2text`; called
+    before converting LaTeX to text for the first time
+    '''
+    unicodedata.normalize = normalize_override
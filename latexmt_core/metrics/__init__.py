@@ -0,0 +1,266 @@
+from bisect import bisect_left
+from contextlib import nullcontext
+import threading
+import time
+
+# type imports
+from typing import Iterable, Iterator, TYPE_CHECKING
+if TYPE_CHECKING:
+    # importing `http.server` takes longer than the rest of the package
+    from http.server import ThreadingHTTPServer
+
+
+# typedefs
+type Labels = tuple[tuple[str, str], ...]
+
+
+# upper bounds (in seconds) of the buckets of latency histograms
+default_latency_buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_null_context = nullcontext()
+
+
+class Counter:
+    '''
+    counter which may be incremented from several threads at once
+    '''
+
+    __slots__ = ('value', '__lock')
+
+    value: float
+    __lock: threading.Lock
+
+    def __init__(self):
+        self.value = 0
+        self.__lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        # `+=` is not atomic, increments would be lost otherwise
+        with self.__lock:
+            self.value += amount
+
+
+class Histogram:
+    '''
+    histogram with fixed buckets; `counts[i]` holds the number of observations in
+    `(buckets[i-1], buckets[i]]`, and `counts[-1]` those above all buckets
+
+    observations may be made from several threads at once; `snapshot` reads
+    the counts, sum and count consistently
+    '''
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '__lock')
+
+    buckets: tuple[float, ...]
+    counts: list[int]
+    sum: float
+    count: int
+    __lock: threading.Lock
+
+    def __init__(self, buckets: tuple[float, ...] = default_latency_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.__lock = threading.Lock()
+
+    def observe(self, value: float):
+        bucket_idx = bisect_left(self.buckets, value)
+        with self.__lock:
+            self.counts[bucket_idx] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> tuple[list[int], float, int]:
+        '''
+        returns a copy of `(counts, sum, count)`
+        '''
+        with self.__lock:
+            return self.counts.copy(), self.sum, self.count
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    histogram: Histogram
+    start: float
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class MetricsRegistry:
+    '''
+    counters and latency histograms, identified by a name and a set of labels
+    (e.g. `registry.inc('paragraphs_total', status='translated')`)
+
+    a disabled registry records nothing; `inc`, `time` and `time_iter` return
+    immediately, so instrumented code need not check `enabled` itself
+
+    metrics may be recorded and rendered (e.g. by `serve_prometheus`) from
+    several threads at once
+    '''
+
+    enabled: bool
+    # prepended to every metric name in the Prometheus text format
+    prefix: str
+
+    __counters: dict[tuple[str, Labels], Counter]
+    __histograms: dict[tuple[str, Labels], Histogram]
+    __lock: threading.Lock
+
+    def __init__(self, enabled: bool = True, prefix: str = 'latexmt_'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.__counters = dict()
+        self.__histograms = dict()
+        self.__lock = threading.Lock()
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        key = (name, tuple(sorted(labels.items())))
+        counter = self.__counters.get(key)
+        if counter is None:
+            with self.__lock:
+                counter = self.__counters.setdefault(key, Counter())
+        return counter
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.__histograms.get(key)
+        if histogram is None:
+            with self.__lock:
+                histogram = self.__histograms.setdefault(key, Histogram())
+        return histogram
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        if self.enabled:
+            self.counter(name, **labels).inc(amount)
+
+    def time(self, name: str, **labels: str):
+        '''
+        context manager observing its duration in histogram `name`
+        '''
+        if not self.enabled:
+            return _null_context
+        return _Timer(self.histogram(name, **labels))
+
+    def time_iter[T](self, iterable: Iterable[T], name: str, **labels: str) -> Iterable[T]:
+        '''
+        observe the time taken to produce each item of a (lazy) iterable, but
+        not the time spent by the consumer in between
+        '''
+        if not self.enabled:
+            return iterable
+        return self.__time_iter(iter(iterable), self.histogram(name, **labels))
+
+    def __time_iter[T](self, iterator: Iterator[T], histogram: Histogram) -> Iterator[T]:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                histogram.observe(time.perf_counter() - start)
+                return
+            histogram.observe(time.perf_counter() - start)
+            yield item
+
+    def clear(self):
+        with self.__lock:
+            self.__counters.clear()
+            self.__histograms.clear()
+
+    def __snapshot(self) -> tuple[list[tuple[tuple[str, Labels], Counter]],
+                                  list[tuple[tuple[str, Labels], Histogram]]]:
+        '''
+        the sorted metrics, copied while no other thread adds to them
+        '''
+        with self.__lock:
+            counters = list(self.__counters.items())
+            histograms = list(self.__histograms.items())
+        return sorted(counters, key=lambda item: item[0]), sorted(histograms, key=lambda item: item[0])
+
+    def to_json(self) -> dict:
+        counters, histograms = self.__snapshot()
+
+        histograms_json = list[dict]()
+        for (name, labels), histogram in histograms:
+            counts, histogram_sum, histogram_count = histogram.snapshot()
+            histograms_json.append({'name': name, 'labels': dict(labels), 'buckets': list(histogram.buckets),
+                                    'counts': counts, 'sum': histogram_sum, 'count': histogram_count})
+
+        return {
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': counter.value}
+                for (name, labels), counter in counters
+            ],
+            'histograms': histograms_json,
+        }
+
+    def to_prometheus(self) -> str:
+        '''
+        render all metrics in the Prometheus text exposition format
+        '''
+        lines = list[str]()
+
+        def format_labels(labels: Iterable[tuple[str, str]]) -> str:
+            escaped = [(key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                       for key, value in labels]
+            return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}' if len(escaped) > 0 else ''
+
+        counters, histograms = self.__snapshot()
+
+        last_name = None
+        for (name, labels), counter in counters:
+            if name != last_name:
+                lines.append(f'# TYPE {self.prefix}{name} counter')
+                last_name = name
+            lines.append(f'{self.prefix}{name}{format_labels(labels)} {counter.value}')
+
+        last_name = None
+        for (name, labels), histogram in histograms:
+            if name != last_name:
+                lines.append(f'# TYPE {self.prefix}{name} histogram')
+                last_name = name
+
+            counts, histogram_sum, histogram_count = histogram.snapshot()
+            cumulative_count = 0
+            for upper_bound, count in zip((*map(str, histogram.buckets), '+Inf'), counts):
+                cumulative_count += count
+                lines.append(f'{self.prefix}{name}_bucket{format_labels((*labels, ('le', upper_bound)))} '
+                             f'{cumulative_count}')
+            lines.append(f'{self.prefix}{name}_sum{format_labels(labels)} {histogram_sum}')
+            lines.append(f'{self.prefix}{name}_count{format_labels(labels)} {histogram_count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def serve_prometheus(registry: MetricsRegistry, host: str = '127.0.0.1', port: int = 9464) -> 'ThreadingHTTPServer':
+    '''
+    serve `registry` in the Prometheus text format from a background thread;
+    call `shutdown` on the returned server to stop
+    '''
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,264 @@
+'''
+memory-mapped model weights, and inference precision
+
+`from_pretrained` reads the weights of a model into memory private to the
+process; `load_mapped_model` instead builds the model without weights and
+assigns it copy-on-write mappings of the weights file, so that the weights
+are never read in full, and processes using the same model share the pages of
+the page cache instead of each holding a copy (pages are only read as needed)
+
+`apply_precision` and `inference_context` run models at a lower precision than
+the fp32 of their checkpoints (see `Precision`)
+'''
+
+from contextlib import nullcontext
+import json
+import mmap
+import struct
+
+from latexmt_core.context_logger import logger_from_kwargs
+
+# type imports
+from contextlib import AbstractContextManager
+from pathlib import Path
+from typing import Literal, TYPE_CHECKING
+if TYPE_CHECKING:
+    import torch
+    from transformers import PretrainedConfig, PreTrainedModel
+
+
+# typedefs
+# - `fp32`: as stored in the checkpoint
+# - `int8`: dynamic int8 quantization of all linear layers; CPU only
+# - `bf16`: fp32 weights, but inference under bf16 autocast
+type Precision = Literal['fp32', 'int8', 'bf16']
+precisions: tuple[Precision, ...] = ('fp32', 'int8', 'bf16')
+
+
+# dtypes of the safetensors format, by their names in `torch`
+_safetensors_dtypes = {
+    'F64': 'float64', 'F32': 'float32', 'F16': 'float16', 'BF16': 'bfloat16',
+    'I64': 'int64', 'I32': 'int32', 'I16': 'int16', 'I8': 'int8', 'U8': 'uint8', 'BOOL': 'bool',
+}
+
+
+def read_safetensors(path: Path | str) -> dict[str, 'torch.Tensor']:
+    '''
+    returns the tensors of a safetensors file as mappings of it; tensors which
+    cannot be mapped (as their dtype is unknown, or their data misaligned) are
+    left out
+    '''
+    import torch
+
+    with open(path, 'rb') as weights_file:
+        # the mapping stays open as long as any tensor refers to it
+        mapped = mmap.mmap(weights_file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    # format: header length (little-endian u64), JSON header, data
+    header_length, = struct.unpack('<Q', mapped[:8])
+    header: dict[str, dict] = json.loads(mapped[8:8 + header_length])
+    header.pop('__metadata__', None)
+    data_start = 8 + header_length
+
+    tensors = dict[str, torch.Tensor]()
+    for name, info in header.items():
+        if info['dtype'] not in _safetensors_dtypes:
+            continue
+        dtype: torch.dtype = getattr(torch, _safetensors_dtypes[info['dtype']])
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        begin, end = info['data_offsets']
+        if (data_start + begin) % itemsize != 0 or end == begin:
+            continue
+        tensors[name] = torch.frombuffer(mapped, dtype=dtype, count=(end - begin) // itemsize,
+                                         offset=data_start + begin).reshape(info['shape'])
+    # for name, info
+
+    return tensors
+
+
+def read_weights(model_checkpoint: str) -> dict[str, 'torch.Tensor']:
+    '''
+    returns the weights of `model_checkpoint` (a local directory or a model
+    in the Hugging Face cache) as mappings of its weights file; empty for
+    sharded checkpoints
+    '''
+    import torch
+    from transformers.utils import cached_file
+
+    path = cached_file(model_checkpoint, 'model.safetensors', _raise_exceptions_for_missing_entries=False)
+    if path is not None:
+        return read_safetensors(path)
+
+    path = cached_file(model_checkpoint, 'pytorch_model.bin', _raise_exceptions_for_missing_entries=False)
+    if path is not None:
+        return torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+
+    return {}
+
+
+def _model_from_config(model_class: type, config: 'PretrainedConfig', **model_kwargs) -> 'PreTrainedModel':
+    # `Auto*` classes build the model class of the config
+    from_config = getattr(model_class, 'from_config', None)
+    if from_config is None:
+        from_config = model_class._from_config
+    return from_config(config, **model_kwargs)
+
+
+def _meta_tensor_names(model: 'PreTrainedModel') -> list[str]:
+    return [name for name, tensor in [*model.named_parameters(), *model.named_buffers()]
+            if tensor.device.type == 'meta']
+
+
+def _assign_weights(model: 'PreTrainedModel', weights: dict[str, 'torch.Tensor']) -> int:
+    '''
+    assign the mapped `weights` to the parameters and buffers of `model` (built
+    by `_model_from_config`) without copying them; returns the number of bytes
+    assigned
+
+    weights differing in dtype from those of the model are converted (and thus
+    held in memory), those differing in shape are left out
+    '''
+    # checkpoints of a task model may be loaded into its base model, and
+    # vice versa (e.g. `bert.encoder...` for `BertModel`)
+    prefix = model.base_model_prefix + '.'
+    for name in list(weights):
+        if name.startswith(prefix):
+            weights.setdefault(name.removeprefix(prefix), weights[name])
+        else:
+            weights.setdefault(prefix + name, weights[name])
+
+    state_dict = dict[str, 'torch.Tensor']()
+    mapped_bytes = 0
+    # tied weights are counted once
+    counted = set[int]()
+    for name, tensor in model.state_dict(keep_vars=True).items():
+        mapped = weights.get(name)
+        if mapped is None or mapped.shape != tensor.shape:
+            continue
+        if mapped.dtype != tensor.dtype:
+            mapped = mapped.to(tensor.dtype)
+        elif id(mapped) not in counted:
+            counted.add(id(mapped))
+            mapped_bytes += mapped.numel() * mapped.element_size()
+        state_dict[name] = mapped
+    # for name, tensor
+
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    # e.g. output embeddings tied to the input ones, but missing from the
+    # checkpoint
+    model.tie_weights()
+    return mapped_bytes
+
+
+def load_mapped_model(model_class: type, model_checkpoint: str, model_kwargs: dict = {},
+                      **kwargs) -> 'PreTrainedModel':
+    '''
+    load the model of `model_checkpoint` (a local directory or a model in the
+    Hugging Face cache) on the CPU for inference, as `model_class` (a model
+    class, or an `Auto*` one); `model_kwargs` are passed to `from_config` or
+    `from_pretrained`
+
+    the model is built with empty parameters (see `accelerate`, installed along
+    with `transformers[torch]`), which are assigned the weights mapped from its
+    weights file; parameters missing from the checkpoint are initialised like
+    `from_pretrained` does
+
+    falls back to `from_pretrained` (holding the weights in memory private to
+    the process) for sharded checkpoints, and on failures, which are logged
+    '''
+    import torch
+    from accelerate import init_empty_weights
+    from transformers import AutoConfig, GenerationConfig
+    logger = logger_from_kwargs(**kwargs)
+
+    try:
+        weights = read_weights(model_checkpoint)
+        if len(weights) == 0:
+            raise ValueError('No weights file which can be mapped')
+
+        config = AutoConfig.from_pretrained(model_checkpoint)
+        # parameters are created on the `meta` device, buffers (which are not
+        # necessarily part of the checkpoint) as usual
+        with init_empty_weights():
+            model = _model_from_config(model_class, config, **model_kwargs)
+
+        mapped_bytes = _assign_weights(model, weights)
+
+        missing = _meta_tensor_names(model)
+        if len(missing) > 0:
+            # e.g. sinusoidal position embeddings, which are not saved
+            for module_name in sorted({name.rpartition('.')[0] for name in missing}):
+                module = model.get_submodule(module_name)
+                # every parameter of the module is replaced, as initialising
+                # it writes to them, which must not reach the mapped weights
+                for param_name, param in list(module.named_parameters(recurse=False)):
+                    setattr(module, param_name, torch.nn.Parameter(torch.empty_like(param, device='cpu'),
+                                                                   requires_grad=param.requires_grad))
+                model._init_weights(module)
+            # for module_name
+            # mapped weights of the modules initialised
+            _assign_weights(model, weights)
+            if len(missing := _meta_tensor_names(model)) > 0:
+                raise ValueError(f'Weights missing from the checkpoint: {', '.join(missing)}')
+
+        if model.can_generate():
+            try:
+                model.generation_config = GenerationConfig.from_pretrained(model_checkpoint)
+            except OSError:
+                # as in `from_pretrained`, the generation config defaults to
+                # the model config
+                pass
+        model.eval()
+
+        logger.debug('Loaded model with mapped weights', extra={'model_checkpoint': model_checkpoint,
+                                                                'bytes': mapped_bytes})
+        return model
+
+    except Exception as e:
+        logger.warning('Cannot map model weights, loading them into memory',
+                       extra={'model_checkpoint': model_checkpoint, 'error': e})
+        return model_class.from_pretrained(model_checkpoint, **model_kwargs)
+
+
+def check_precision(precision: str) -> Precision:
+    if precision not in precisions:
+        raise ValueError(f'Invalid precision: {precision} (expected one of {', '.join(precisions)})')
+    return precision  # type: ignore
+
+
+def apply_precision(model: 'PreTrainedModel', precision: Precision, **kwargs) -> tuple['PreTrainedModel', Precision]:
+    '''
+    prepare `model` for inference at `precision`, in place; returns the model
+    along with the precision actually used, as bf16 falls back to fp32 on GPUs
+    not supporting it
+
+    quantization replaces the linear layers only, so that weights mapped by
+    `load_mapped_model` (e.g. embeddings) stay shared
+    '''
+    import torch
+    logger = logger_from_kwargs(**kwargs)
+
+    match precision:
+        case 'int8':
+            if model.device.type != 'cpu':
+                raise ValueError('int8 quantization is only available on the CPU')
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        case 'bf16':
+            if model.device.type == 'cuda' and not torch.cuda.is_bf16_supported():
+                logger.warning('bf16 is not supported by this GPU, falling back to fp32')
+                precision = 'fp32'
+        case _:
+            pass
+
+    return model, precision
+
+
+def inference_context(model: 'PreTrainedModel', precision: Precision) -> AbstractContextManager:
+    '''
+    context to run `model` in, as prepared by `apply_precision`
+    '''
+    if precision != 'bf16':
+        return nullcontext()
+
+    import torch
+    return torch.autocast(model.device.type, dtype=torch.bfloat16)
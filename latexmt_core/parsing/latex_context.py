@@ -1,3 +1,4 @@
+from functools import cache
 from pylatexenc.latexwalker import get_default_latex_context_db
 from pylatexenc.latexnodes import LatexArgumentSpec, ParsingStateDeltaEnterMathMode
 from pylatexenc.macrospec import MacroSpec, EnvironmentSpec
@@ -5,12 +6,18 @@ from pylatexenc.macrospec import MacroSpec, EnvironmentSpec
 from .macro_parsers import CharsArgumentParser, InputArgumentParser
 from .special_commands import math_environs
 
+# type imports
+from pylatexenc.macrospec import LatexContextDb
 
-def get_latex_context(out_included_files: list[str]):
+
+@cache
+def get_static_latex_context() -> LatexContextDb:
     '''
-    returns a `pylatexenc.LatexContextDb` that handles custom macro processing
-    and, when encountering an `\\input` or `\\include` macro, appends its contents
-    to the list passed via `out_included_files`
+    returns the (frozen) part of the `pylatexenc.LatexContextDb` used for
+    parsing which does not depend on the file being parsed
+
+    the context is built on first use and shared afterwards; it must not be
+    modified, but may be extended via `LatexContextDb.extended_with`
     '''
 
     latex_context = get_default_latex_context_db()
@@ -59,12 +66,23 @@ def get_latex_context(out_included_files: list[str]):
                       for name in math_environs]
     )
 
+    latex_context.freeze()
+    return latex_context
+
+
+def get_latex_context(out_included_files: list[str]) -> LatexContextDb:
+    '''
+    returns a `pylatexenc.LatexContextDb` that handles custom macro processing
+    and, when encountering an `\\input` or `\\include` macro, appends its contents
+    to the list passed via `out_included_files`
+
+    only the `\\input` handling is created per call, layered on top of the
+    shared context returned by `get_static_latex_context`
+    '''
+
     input_parser = InputArgumentParser(out_included_files, '{')
-    latex_context.add_context_category(
+    return get_static_latex_context().extended_with(
         'input',
-        prepend=True,
         macros=[MacroSpec('input', arguments_spec_list=[input_parser]),
                 MacroSpec('include', arguments_spec_list=[input_parser])]
     )
-
-    return latex_context
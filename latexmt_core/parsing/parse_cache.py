@@ -0,0 +1,200 @@
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+import pylatexenc
+
+from latexmt_core.context_logger import ContextLogger, logger_from_kwargs
+from latexmt_core.markup_string import Markup, MarkupString
+from . import special_commands
+from .latex_context import get_static_latex_context
+from .text_item import SourceTextItem
+
+# type imports
+from pathlib import Path
+
+
+# bump whenever the parsing or extraction of textitems changes in a way that
+# affects their results
+parser_config_version = 1
+
+# source files whose contents determine the parsing and extraction result
+_parser_modules = [
+    'latex_context.py',
+    'macro_parsers.py',
+    'prelex.py',
+    'special_commands.py',
+    'text_item.py',
+    'to_text.py',
+    'unpack.py',
+    '../markup_string.py',
+]
+
+
+def parser_config_fingerprint() -> str:
+    '''
+    a digest of everything besides the input text which determines the result
+    of parsing and extraction: the parser modules themselves, the (possibly
+    modified) lists in `special_commands`, and the macros and environments
+    known to the LaTeX context
+    '''
+
+    digest = hashlib.sha256()
+    digest.update(f'{parser_config_version}\0{pylatexenc.__version__}\0'.encode())
+
+    package_dir = Path(__file__).parent
+    for module in _parser_modules:
+        digest.update(package_dir.joinpath(module).read_bytes())
+
+    for name in sorted(n for n in dir(special_commands) if not n.startswith('_')):
+        digest.update(f'{name}={getattr(special_commands, name)!r}\0'.encode())
+
+    latex_context = get_static_latex_context()
+    for spec in latex_context.iter_macro_specs():
+        digest.update(f'\\{spec.macroname}\0'.encode())
+    for spec in latex_context.iter_environment_specs():
+        digest.update(f'{{{spec.environmentname}}}\0'.encode())
+
+    return digest.hexdigest()
+
+
+@dataclass
+class ParseResult:
+    '''
+    the cacheable part of parsing and extracting a single file; positions refer
+    to the input text after `to_unicode_latex` and, if enabled, prelexing
+    '''
+
+    textitems: list[SourceTextItem]
+    included_files: list[str]
+
+    def to_json(self) -> dict:
+        return {
+            'textitems': [{
+                'text': textitem.text.to_plaintext(),
+                'markups': [[markup.macroname, markup.start, markup.end] for markup in textitem.text.markups()],
+                'start': textitem.start,
+                'end': textitem.end,
+                'masked_spans': textitem.masked_spans,
+                'mask_str': textitem.mask_str,
+                'skipped_spans': textitem.skipped_spans,
+            } for textitem in self.textitems],
+            'included_files': self.included_files,
+        }
+
+    @classmethod
+    def from_json(cls, result: dict) -> 'ParseResult':
+        '''
+        raises `KeyError`, `TypeError` or `ValueError` for malformed input
+        '''
+        return cls(
+            textitems=[SourceTextItem(
+                text=MarkupString(str(textitem['text']), [Markup(str(macroname), int(start), int(end))
+                                                          for macroname, start, end in textitem['markups']]),
+                start=int(textitem['start']),
+                end=int(textitem['end']),
+                masked_spans=[[(int(start), int(end)) for start, end in spans]
+                              for spans in textitem['masked_spans']],
+                mask_str=str(textitem['mask_str']),
+                skipped_spans=[(int(start), int(end)) for start, end in textitem['skipped_spans']],
+            ) for textitem in result['textitems']],
+            included_files=[str(included_file) for included_file in result['included_files']],
+        )
+
+
+class ParseCache:
+    '''
+    on-disk cache of `ParseResult`s, keyed by a digest of the input text, the
+    parser configuration and any settings affecting the result
+
+    the cache is bounded to `max_size` bytes; once exceeded, the least recently
+    used entries are removed. entries are only ever written atomically, so the
+    cache may be shared between concurrent runs
+
+    entries are stored as JSON, so reading them cannot run code; still, they
+    determine what is translated and where the translations are patched in, so
+    `cache_dir` must only be writable by users trusted with the output
+    '''
+
+    cache_dir: Path
+    max_size: int
+
+    __config_fingerprint: str
+    __logger: ContextLogger
+
+    def __init__(self, cache_dir: Path, max_size: int = 256 * 2**20, **kwargs):
+        self.__logger = logger_from_kwargs(**kwargs)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.__config_fingerprint = parser_config_fingerprint()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def __entry_path(self, key: str) -> Path:
+        return self.cache_dir.joinpath(f'{key}.json')
+
+    def key(self, text: str, *settings: object) -> str:
+        '''
+        returns the cache key for `text`; `settings` should hold every option
+        which influences the parsing or extraction result (e.g. `mask_str`)
+        '''
+        digest = hashlib.sha256(self.__config_fingerprint.encode())
+        digest.update(repr(settings).encode())
+        digest.update(text.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> ParseResult | None:
+        entry_path = self.__entry_path(key)
+        try:
+            with open(entry_path, 'r') as entry_file:
+                result = ParseResult.from_json(json.load(entry_file))
+            # mark the entry as recently used
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.__logger.warning('Discarding unreadable parse cache entry',
+                                  extra={'entry_path': str(entry_path), 'error': e})
+            entry_path.unlink(missing_ok=True)
+            return None
+
+        self.__logger.debug('Parse cache hit', extra={'key': key})
+        return result
+
+    def put(self, key: str, result: ParseResult):
+        entry_path = self.__entry_path(key)
+        tmp_path = entry_path.with_name(f'{entry_path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'w') as tmp_file:
+                json.dump(result.to_json(), tmp_file, ensure_ascii=False)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            self.__logger.warning('Could not write parse cache entry',
+                                  extra={'entry_path': str(entry_path), 'error': e})
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        self.__evict()
+
+    def __evict(self):
+        '''
+        remove the least recently used entries until the cache fits `max_size`
+        '''
+        entries = list[tuple[float, int, Path]]()
+        for entry_path in self.cache_dir.glob('*.json'):
+            try:
+                stat = entry_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            entry_path.unlink(missing_ok=True)
+            total_size -= size
+
+    def clear(self):
+        for entry_path in self.cache_dir.glob('*.json'):
+            entry_path.unlink(missing_ok=True)
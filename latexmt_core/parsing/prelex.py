@@ -0,0 +1,212 @@
+import re
+from pylatexenc.macrospec import EnvironmentSpec
+
+from .special_commands import env_denylist
+
+# type imports
+from pylatexenc.macrospec import LatexContextDb
+from typing import Callable, Iterable
+
+
+# environments whose bodies end at the first matching `\end`, regardless of
+# their contents
+verbatim_environs = [
+    'verbatim',
+    'lstlisting',
+]
+
+_placeholder_start = '\ue000'
+_placeholder_end = '\ue001'
+_placeholder_regex = re.compile(f'{_placeholder_start}(\\d+){_placeholder_end}')
+
+_scan_regex = re.compile(r'[\\%]')
+_verb_regex = re.compile(r'\\verb\*?([^a-zA-Z*\s])')
+_begin_end_regex = re.compile(r'\\(begin|end)\{([^{}\s]+)\}')
+_brace_regex = re.compile(r'\\.|%[^\n]*|[{}]', re.DOTALL)
+
+
+class OpaqueRegions:
+    '''
+    holds the original text of regions carved out of a LaTeX document by
+    `carve_opaque_regions`, and restores it in output text
+    '''
+
+    # names of the environments whose bodies were carved out
+    environments: set[str]
+
+    __originals: list[str]
+
+    def __init__(self):
+        self.environments = set()
+        self.__originals = list()
+
+    def __len__(self) -> int:
+        return len(self.__originals)
+
+    def add(self, original: str) -> str:
+        '''
+        store `original` and return the placeholder to be put in its place
+        '''
+        placeholder = f'{_placeholder_start}{len(self.__originals)}{_placeholder_end}'
+        self.__originals.append(original)
+        return placeholder
+
+    def restore(self, text: str) -> str:
+        if _placeholder_start not in text:
+            return text
+        return _placeholder_regex.sub(
+            lambda m: self.__originals[int(m.group(1))], text)
+
+    def restoring(self, write: Callable[[str], object]) -> Callable[[str], object]:
+        '''
+        wraps an output callback (see `write_nodelist_latex`) such that the
+        original regions are restored in the text passed to it
+        '''
+        if len(self) == 0:
+            return write
+        return lambda text: write(self.restore(text))
+
+
+def _next_begin_end(text: str, pos: int) -> tuple[str, str, int, int] | None:
+    '''
+    returns `(kind, environmentname, start, end)` for the next `\\begin` or
+    `\\end` found in `text` starting at `pos`, skipping comments and `\\verb`
+    macros
+    '''
+    while (m := _scan_regex.search(text, pos)) is not None:
+        pos = m.start()
+        if text[pos] == '%':
+            newline_pos = text.find('\n', pos)
+            pos = len(text) if newline_pos == -1 else newline_pos + 1
+            continue
+
+        if (verb_m := _verb_regex.match(text, pos)) is not None:
+            delim_pos = text.find(verb_m.group(1), verb_m.end())
+            pos = len(text) if delim_pos == -1 else delim_pos + 1
+        elif (begin_end_m := _begin_end_regex.match(text, pos)) is not None:
+            return begin_end_m.group(1), begin_end_m.group(2), pos, begin_end_m.end()
+        else:
+            # skip the escaped character, e.g. `\%` or `\\`
+            pos += 2
+
+    return None
+
+
+def _find_environment_end(text: str, environmentname: str, pos: int) -> int | None:
+    '''
+    returns the start position of the `\\end` matching an environment whose
+    body starts at `pos`
+    '''
+    end_str = f'\\end{{{environmentname}}}'
+    if environmentname in verbatim_environs:
+        end_pos = text.find(end_str, pos)
+        return None if end_pos == -1 else end_pos
+
+    depth = 0
+    while (begin_end := _next_begin_end(text, pos)) is not None:
+        kind, name, start, pos = begin_end
+        if name != environmentname:
+            continue
+        if kind == 'begin':
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+        else:
+            return start
+
+    return None
+
+
+def _is_brace_balanced(text: str) -> bool:
+    depth = 0
+    for m in _brace_regex.finditer(text):
+        match m.group():
+            case '{':
+                depth += 1
+            case '}':
+                depth -= 1
+                if depth < 0:
+                    return False
+    return depth == 0
+
+
+def _find_opaque_bodies(text: str, pos: int,
+                        environments: set[str]) -> tuple[list[tuple[str, int, int]], set[str]]:
+    '''
+    returns `(environmentname, start, end)` for the bodies of the given
+    environments found in `text` starting at `pos` (skipping those nested in
+    another body), and the names of the environments which could not be
+    carved out somewhere (as they are unterminated or their bodies unbalanced)
+    '''
+    bodies = list[tuple[str, int, int]]()
+    failed = set[str]()
+
+    scan_pos = pos
+    while (begin_end := _next_begin_end(text, scan_pos)) is not None:
+        kind, name, _, scan_pos = begin_end
+        if kind != 'begin' or name not in environments:
+            continue
+
+        body_end = _find_environment_end(text, name, scan_pos)
+        # e.g. an environment opened within the definition of another one
+        if body_end is None or (name not in verbatim_environs
+                                and not _is_brace_balanced(text[scan_pos:body_end])):
+            failed.add(name)
+            continue
+
+        bodies.append((name, scan_pos, body_end))
+        scan_pos = body_end
+    # while begin_end
+
+    return bodies, failed
+
+
+def carve_opaque_regions(text: str, environments: Iterable[str] = env_denylist) -> tuple[str, OpaqueRegions]:
+    '''
+    a fast pre-pass over `text`, replacing the bodies (including arguments) of
+    the given environments, which never produce textitems, with short
+    placeholders, so they need not be parsed by `pylatexenc`
+
+    the preamble is left alone, as whether it produces textitems (e.g. stray
+    text, or markup such as `\\textbf`) cannot be told without parsing it
+
+    returns the modified text and an `OpaqueRegions` object which restores the
+    original regions in output text; the modified text must be parsed with a
+    context obtained from `get_opaque_latex_context`
+    '''
+    environments = set(environments)
+    regions = OpaqueRegions()
+    fragments = list[str]()
+
+    pos = 0
+    # every `\\begin` of a carved environment must be carved out, as the
+    # environment takes no arguments in the opaque context; environments which
+    # cannot always be carved out are left alone, and the text scanned again
+    bodies, failed = _find_opaque_bodies(text, pos, environments)
+    while len(failed) > 0:
+        environments -= failed
+        bodies, failed = _find_opaque_bodies(text, pos, environments)
+
+    for name, body_start, body_end in bodies:
+        fragments.append(text[pos:body_start])
+        fragments.append(regions.add(text[body_start:body_end]))
+        regions.environments.add(name)
+        pos = body_end
+
+    fragments.append(text[pos:])
+    return ''.join(fragments), regions
+
+
+def get_opaque_latex_context(latex_context: LatexContextDb, regions: OpaqueRegions) -> LatexContextDb:
+    '''
+    extends `latex_context` such that the environments carved out by
+    `carve_opaque_regions` (as recorded in `regions`) take no arguments, as
+    their arguments are part of the placeholder
+    '''
+    if len(regions.environments) == 0:
+        return latex_context
+
+    return latex_context.extended_with(
+        'opaque-environments',
+        environments=[EnvironmentSpec(name) for name in sorted(regions.environments)],
+    )
@@ -1,16 +1,22 @@
+from dataclasses import dataclass, field
+
 # type imports
 import pylatexenc.latexnodes.nodes as lw
+from typing import Callable, Iterable, Sequence
 
 
-def nodelist_to_latex(nodelist):
+def write_nodelist_latex(nodelist: Iterable[lw.LatexNode | None], write: Callable[[str], object]):
     """
+    serialise `nodelist` to LaTeX, passing the output fragments to `write`
+    (e.g. `list.append` or `TextIO.write`) instead of concatenating them
+
     patching a library bug with re-encoding \\verb macros
     where '|' is just dropped
     """
 
-    def add_args(nodeargd):
+    def write_args(nodeargd):
         if nodeargd is None or nodeargd.argspec is None or nodeargd.argnlist is None:
-            return ""
+            return
 
         delim_start, delim_end = "", ""
         if (
@@ -19,75 +25,182 @@ def nodelist_to_latex(nodelist):
         ):
             delim_start, delim_end = nodeargd.verbatim_delimiters
 
-        argslatex = delim_start
+        write(delim_start)
         for argt, argn in zip(nodeargd.argspec, nodeargd.argnlist):
             if argt == "*":
                 if argn is not None:
-                    argslatex += nodelist_to_latex([argn])
+                    write_nodelist_latex([argn], write)
             elif argt == "[":
                 if argn is not None:
                     # the node is a group node with '[' delimiter char anyway
-                    argslatex += nodelist_to_latex([argn])
+                    write_nodelist_latex([argn], write)
             elif argt == "{":
                 # either a group node with '{' delimiter char, or single node argument
-                argslatex += nodelist_to_latex([argn])
+                write_nodelist_latex([argn], write)
             else:
                 raise ValueError("Unknown argument type: {!r}".format(argt))
-        argslatex += delim_end
-        return argslatex
+        write(delim_end)
 
-    latex = ""
     for n in nodelist:
         if n is None:
             continue
         if n.isNodeType(lw.LatexCharsNode):
-            latex += n.chars
+            write(n.chars)
             continue
 
         if n.isNodeType(lw.LatexMacroNode):
-            latex += r"\%s%s%s" % (
-                n.macroname,
-                n.macro_post_space,
-                add_args(n.nodeargd),
-            )
+            write("\\" + n.macroname + n.macro_post_space)
+            write_args(n.nodeargd)
             continue
 
         if n.isNodeType(lw.LatexSpecialsNode):
-            latex += r"%s%s" % (n.specials_chars, add_args(n.nodeargd))
+            write(n.specials_chars)
+            write_args(n.nodeargd)
             continue
 
         if n.isNodeType(lw.LatexCommentNode):
-            latex += "%" + n.comment + n.comment_post_space
+            write("%" + n.comment + n.comment_post_space)
             continue
 
         if n.isNodeType(lw.LatexGroupNode):
-            latex += n.delimiters[0] + nodelist_to_latex(n.nodelist) + n.delimiters[1]
+            write(n.delimiters[0])
+            write_nodelist_latex(n.nodelist, write)
+            write(n.delimiters[1])
             continue
 
         if n.isNodeType(lw.LatexEnvironmentNode):
-            latex += r"\begin{%s}%s" % (n.envname, add_args(n.nodeargd))
-            latex += nodelist_to_latex(n.nodelist)
-            latex += r"\end{%s}" % (n.envname)
+            write(r"\begin{%s}" % (n.envname))
+            write_args(n.nodeargd)
+            write_nodelist_latex(n.nodelist, write)
+            write(r"\end{%s}" % (n.envname))
             continue
 
         if n.isNodeType(lw.LatexMathNode):
-            latex += n.delimiters[0] + nodelist_to_latex(n.nodelist) + n.delimiters[1]
+            write(n.delimiters[0])
+            write_nodelist_latex(n.nodelist, write)
+            write(n.delimiters[1])
             continue
 
-        latex += "<[UNKNOWN LATEX NODE: '%s']>" % (n.nodeType().__name__)
+        write("<[UNKNOWN LATEX NODE: '%s']>" % (n.nodeType().__name__))
+
 
-    return latex
+def nodelist_to_latex(nodelist: Iterable[lw.LatexNode | None]) -> str:
+    fragments = list[str]()
+    write_nodelist_latex(nodelist, fragments.append)
+    return ''.join(fragments)
 
 
 def replace_nodes(parent_nodelist: list[lw.LatexNode],
                   orig_nodelist: list[lw.LatexNode],
                   new_nodelist: list[lw.LatexNode]):
-    rm_indexes = list(reversed([parent_nodelist[:].index(node)
-                                for node in orig_nodelist]))
-    start_idx = rm_indexes[-1]
+    replace_nodes_bulk(parent_nodelist, [(orig_nodelist, new_nodelist)])
+
+
+def replace_nodes_bulk(parent_nodelist: list[lw.LatexNode],
+                       replacements: Iterable[tuple[Sequence[lw.LatexNode], Sequence[lw.LatexNode]]]):
+    '''
+    apply several `(orig_nodelist, new_nodelist)` replacements to the same
+    `parent_nodelist` at once
+
+    nodes are located by identity rather than `list.index`, and the parent list
+    is rebuilt in a single pass; as with `replace_nodes`, the new nodes are
+    inserted at the position of the first original node
+    '''
+    node_indexes = {id(node): idx for idx, node in enumerate(parent_nodelist)}
+
+    removed_indexes = set[int]()
+    inserted_nodes = dict[int, Sequence[lw.LatexNode]]()
+    for orig_nodelist, new_nodelist in replacements:
+        try:
+            orig_indexes = [node_indexes[id(node)] for node in orig_nodelist]
+        except KeyError:
+            raise ValueError('node to be replaced is not in parent nodelist')
+
+        removed_indexes.update(orig_indexes)
+        inserted_nodes[min(orig_indexes)] = new_nodelist
+
+    spliced_nodelist = list[lw.LatexNode]()
+    for idx, node in enumerate(parent_nodelist):
+        if idx in inserted_nodes:
+            spliced_nodelist.extend(inserted_nodes[idx])
+        if idx not in removed_indexes:
+            spliced_nodelist.append(node)
+
+    parent_nodelist[:] = spliced_nodelist
+
+
+# a piece of patched output: either literal text, or a `(start, end)` span of
+# the original source (to which nested edits are applied in turn)
+type SourceFragment = str | tuple[int, int]
+
+
+@dataclass
+class SourceEdit:
+    start: int
+    end: int
+    fragments: list[SourceFragment]
+    nested_edits: list['SourceEdit'] = field(default_factory=list)
+
+
+def nest_source_edits(edits: Iterable[SourceEdit]) -> list[SourceEdit]:
+    '''
+    sort `edits` by position and move edits lying within the span of another
+    edit into that edit's `nested_edits`
+
+    returns the list of top-level edits
+    '''
+
+    toplevel_edits = list[SourceEdit]()
+    edit_stack = list[SourceEdit]()
+    for edit in sorted(edits, key=lambda edit: (edit.start, -edit.end)):
+        edit.nested_edits = list()
+
+        while len(edit_stack) > 0 and edit_stack[-1].end <= edit.start:
+            edit_stack.pop()
+
+        if len(edit_stack) == 0:
+            toplevel_edits.append(edit)
+        elif edit.end <= edit_stack[-1].end:
+            edit_stack[-1].nested_edits.append(edit)
+        else:
+            raise ValueError(f'overlapping source edits at pos={edit.start}')
+
+        edit_stack.append(edit)
+
+    return toplevel_edits
+
+
+def write_patched_source(source: str, edits: Iterable[SourceEdit], write: Callable[[str], object]):
+    '''
+    apply `edits` to `source` in a single sorted pass and pass the output
+    fragments to `write`; all text outside of the edited spans is copied
+    verbatim
+
+    source spans referenced by an edit's fragments are copied with that edit's
+    nested edits applied; nested edits not covered by any fragment are dropped
+    '''
+
+    def write_span(start: int, end: int, span_edits: Sequence[SourceEdit]):
+        pos = start
+        for edit in span_edits:
+            if edit.start < start or edit.end > end:
+                continue
+            write(source[pos:edit.start])
+            write_edit(edit)
+            pos = edit.end
+        write(source[pos:end])
+
+    def write_edit(edit: SourceEdit):
+        for fragment in edit.fragments:
+            if isinstance(fragment, str):
+                write(fragment)
+            else:
+                write_span(*fragment, edit.nested_edits)
+
+    write_span(0, len(source), nest_source_edits(edits))
 
-    for idx in rm_indexes:
-        parent_nodelist.pop(idx)
 
-    for node in reversed(new_nodelist):
-        parent_nodelist.insert(start_idx, node)
+def patch_source(source: str, edits: Iterable[SourceEdit]) -> str:
+    fragments = list[str]()
+    write_patched_source(source, edits, fragments.append)
+    return ''.join(fragments)
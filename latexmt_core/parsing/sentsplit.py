@@ -0,0 +1,79 @@
+import re
+
+from .to_text import get_mask_regex, mask_str_default
+
+# type imports
+from latexmt_core.markup_string import MarkupString
+
+
+# words which are commonly followed by a period without ending a sentence
+abbreviations = [
+    # de
+    'Abb', 'bzgl', 'bzw', 'ca', 'd.h', 'Dr', 'evtl', 'ggf', 'Hr', 'Kap', 'Nr',
+    'Prof', 's.o', 's.u', 'sog', 'u.a', 'usw', 'vgl', 'z.B', 'z.T',
+    # en
+    'al', 'cf', 'e.g', 'eq', 'Eq', 'etc', 'fig', 'Fig', 'i.e', 'Mr', 'Mrs',
+    'Ms', 'no', 'No', 'resp', 'sec', 'Sec', 'tab', 'Tab', 'vs',
+]
+
+_abbreviations = frozenset(abbreviations)
+
+# sentence-final punctuation, optionally followed by closing quotes and
+# brackets, followed by whitespace
+_sentence_end_regex = re.compile(r'[.!?…]+[\'"»«“”‘’)\]]*(\s+)')
+_sentence_start_regex = re.compile(r'[\'"»«“„‘(\[]*[^\W\d_]')
+_last_word_regex = re.compile(r'(\S+?)[.!?…]*[\'"»«“”‘’)\]]*$')
+
+
+def _is_sentence_start(text: str, pos: int) -> bool:
+    m = _sentence_start_regex.match(text, pos)
+    return m is not None and m.group()[-1].isupper()
+
+
+def _is_abbreviation(text: str) -> bool:
+    '''
+    check if `text`, which ends just before a period, is an abbreviation,
+    an initial or a number (e.g. a German ordinal number)
+    '''
+    m = _last_word_regex.search(text)
+    if m is None:
+        return False
+
+    word = m.group(1).lstrip('([\'"„“‘«»')
+    return word in _abbreviations or len(word) == 1 or word.isdigit()
+
+
+def sentsplit(text: MarkupString, mask_str: str = mask_str_default) -> list[tuple[MarkupString, str]]:
+    '''
+    splits a paragraph (see `parsplit`) into sentences
+
+    returns a list of 2-tuples representing
+    - the sentence, including its final punctuation
+    - the whitespace following the sentence
+
+    sentences are never split within masks or markup, so that every mask and
+    markup belongs to exactly one sentence
+    '''
+    plaintext = str(text)
+
+    protected_spans = [m.span() for m in re.finditer(get_mask_regex(mask_str), plaintext)]
+    protected_spans.extend((markup.start, markup.end) for markup in text.markups())
+
+    sentences = list[tuple[MarkupString, str]]()
+    sentence_start = 0
+    for m in _sentence_end_regex.finditer(plaintext):
+        boundary, next_start = m.span(1)
+
+        if next_start == len(plaintext) or not _is_sentence_start(plaintext, next_start):
+            continue
+        if plaintext[m.start()] == '.' and _is_abbreviation(plaintext[sentence_start:m.start()]):
+            continue
+        if any(start < boundary < end for start, end in protected_spans):
+            continue
+
+        sentences.append((text[sentence_start:boundary], plaintext[boundary:next_start]))
+        sentence_start = next_start
+    # for m
+
+    sentences.append((text[sentence_start:], ''))
+    return sentences
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import cast
 
 # type imports
@@ -8,14 +8,47 @@ from latexmt_core.parsing.to_text import mask_str_default, get_mask_format_str
 from typing import Iterable
 
 
-@dataclass
+@dataclass(slots=True)
 class TextItem:
-    pos: int
+    '''
+    a run of nodes `parent_nodelist[start:end]` to be translated as one unit,
+    except for the nodes at `skipped` (e.g. groups with nested contents, which
+    stay in place and hold TextItems of their own)
+
+    the nodes are not copied, so the indices are only valid as long as
+    `parent_nodelist` is not modified
+    '''
+
     text: MarkupString
-    nodelist: list[lw.LatexNode]
-    masked_nodes: list[lw.LatexNode]
     parent_nodelist: list[lw.LatexNode]
+    start: int
+    end: int
+    masked_nodes: list[lw.LatexNode]
     mask_str: str = mask_str_default
+    skipped: tuple[int, ...] = ()
+
+    @property
+    def nodelist(self) -> list[lw.LatexNode]:
+        if len(self.skipped) == 0:
+            return self.parent_nodelist[self.start:self.end]
+        return [self.parent_nodelist[index] for index in range(self.start, self.end)
+                if index not in self.skipped]
+
+    @property
+    def skipped_nodes(self) -> list[lw.LatexNode]:
+        return [self.parent_nodelist[index] for index in self.skipped]
+
+    @property
+    def first_node(self) -> lw.LatexNode:
+        return self.parent_nodelist[self.start]
+
+    @property
+    def last_node(self) -> lw.LatexNode:
+        return self.parent_nodelist[self.end - 1]
+
+    @property
+    def pos(self) -> int:
+        return cast(int, self.first_node.pos)
 
     def unmask_text(self, text: str) -> str:
         return_text = text
@@ -26,9 +59,14 @@ class TextItem:
 
         return return_text
 
-    def __node_is_markup(self, node) -> bool:
-        return type(node) in [lw.LatexMacroNode, lw.LatexGroupNode] \
-            and node not in self.masked_nodes
+    def __markup_node_filter(self):
+        '''
+        returns a predicate for markup nodes; masked nodes are looked up by
+        identity, as node equality compares their full contents
+        '''
+        masked_node_ids = set(map(id, self.masked_nodes))
+        return lambda node: type(node) in [lw.LatexMacroNode, lw.LatexGroupNode] \
+            and id(node) not in masked_node_ids
 
     def has_markup(self) -> bool:
         '''
@@ -38,8 +76,55 @@ class TextItem:
         markup nodes are macro nodes containing text that is considered to be
         part of the text content, i.e. those macros which are not masked
         '''
-        return any(self.__node_is_markup(node) for node in self.nodelist)
+        return any(map(self.__markup_node_filter(), self.nodelist))
 
     def get_markup_nodes(self) -> Iterable[lw.LatexMacroNode | lw.LatexGroupNode]:
         return cast(filter[lw.LatexMacroNode | lw.LatexGroupNode],
-                    filter(self.__node_is_markup, self.nodelist))
+                    filter(self.__markup_node_filter(), self.nodelist))
+
+
+def node_source_spans(node: lw.LatexNode) -> list[tuple[int, int]]:
+    '''
+    source spans making up the LaTeX code of a masked node
+
+    `LatexNodes2MarkupText` moves the post-space of macro nodes into the
+    extracted text, so it is left out of the span here as well
+    '''
+    start, end = cast(int, node.pos), cast(int, node.pos_end)
+    if not isinstance(node, lw.LatexMacroNode):
+        return [(start, end)]
+
+    name_end = start + 1 + len(node.macroname)
+    args_source = node.parsing_state.s[name_end:end]
+    args_start = end - len(args_source.lstrip())
+    return [(start, name_end)] + ([(args_start, end)] if args_start < end else [])
+
+
+@dataclass(slots=True)
+class SourceTextItem:
+    '''
+    node-free form of a `TextItem`, referring to the source text it was
+    extracted from by position only; it can be stored (see `ParseResult`),
+    unlike the nodes
+    '''
+
+    text: MarkupString
+    start: int
+    end: int
+    # source spans making up the LaTeX code of each masked node
+    masked_spans: list[list[tuple[int, int]]]
+    mask_str: str = mask_str_default
+    # source spans of the nodes skipped by the textitem (see `TextItem`),
+    # which lie within `start` and `end` and are kept after its translation
+    skipped_spans: list[tuple[int, int]] = field(default_factory=list)
+
+
+def to_source_textitem(textitem: TextItem) -> SourceTextItem:
+    return SourceTextItem(
+        text=textitem.text,
+        start=textitem.pos,
+        end=cast(int, textitem.last_node.pos_end),
+        masked_spans=[node_source_spans(node) for node in textitem.masked_nodes],
+        mask_str=textitem.mask_str,
+        skipped_spans=[(cast(int, node.pos), cast(int, node.pos_end)) for node in textitem.skipped_nodes],
+    )
@@ -1,4 +1,6 @@
+from functools import cache
 import re
+import threading
 from typing import cast
 
 from pylatexenc.latex2text import LatexNodes2Text, MacroTextSpec
@@ -6,7 +8,7 @@ from pylatexenc.macrospec import LatexContextDb
 from pylatexenc.latexnodes import ParsingStateDeltaEnterMathMode
 
 from latexmt_core.context_logger import ContextLogger, logger_from_kwargs
-from latexmt_core.markup_string import MarkupString
+from latexmt_core.markup_string import MarkupString, install_normalize_override
 from .special_commands import nontext_macros
 
 # type imports
@@ -29,12 +31,6 @@ def get_mask_regex(mask_str: str = mask_str_default) -> str:
 
 
 class CustomLatexContextDb(LatexContextDb):
-    last_node_unknown: bool
-
-    def __init__(self, **kwargs):
-        super(CustomLatexContextDb, self).__init__(**kwargs)
-        self.last_node_unknown = False
-
     @staticmethod
     def default():
         db = CustomLatexContextDb()
@@ -48,22 +44,17 @@ class CustomLatexContextDb(LatexContextDb):
 
         return db
 
-    def get_macro_spec(self, macroname, raise_if_not_found=False):
-        '''
-        copied from `pylatexenc.macrospec.LatexContextDb`, except an internal
-        flag is set to reflect whether the last macro encountered is unknown
-        '''
-        try:
-            return self.lookup_chain_maps['macros'][macroname]
-        except KeyError:
-            self.last_node_unknown = True
-            if raise_if_not_found:
-                raise
-            return self.unknown_macro_spec
-
 
 class LatexNodes2MaskedText(LatexNodes2Text):
+    '''
+    instances hold per-conversion state (masked nodes, whether the last macro
+    encountered is unknown) and must not be shared between threads; they may be
+    reused for any number of conversions via `convert`
+    '''
+
     masked_nodes: list[lw.LatexNode]
+    masked_node_ids: set[int]
+    last_node_unknown: bool
     __logger: ContextLogger
     latex_context: CustomLatexContextDb
     mask_str: str
@@ -71,9 +62,37 @@ class LatexNodes2MaskedText(LatexNodes2Text):
     def __init__(self, latex_context=None, mask_str: str = mask_str_default, **kwargs):
         super(LatexNodes2MaskedText, self).__init__(latex_context, **kwargs)
         self.masked_nodes = list()
+        self.masked_node_ids = set()
+        self.last_node_unknown = False
         self.mask_str = mask_str
         self.__logger = logger_from_kwargs(**kwargs)
 
+    def convert(self, nodelist: list[lw.LatexNode]):
+        '''
+        reset the per-conversion state, then convert `nodelist` to text
+
+        returns the text along with the list of masked nodes
+        '''
+        self.masked_nodes = list()
+        self.masked_node_ids = set()
+        self.last_node_unknown = False
+        return self.nodelist_to_text(nodelist), self.masked_nodes
+
+    def get_macro_spec(self, macroname):
+        '''
+        look up the macro in `latex_context`, and set `last_node_unknown` if it
+        is unknown
+        '''
+        try:
+            return self.latex_context.lookup_chain_maps['macros'][macroname]
+        except KeyError:
+            self.last_node_unknown = True
+            return self.latex_context.unknown_macro_spec
+
+    def macro_node_to_text(self, node):
+        self.get_macro_spec(node.macroname)
+        return super().macro_node_to_text(node)
+
     @staticmethod
     def mask_nontext_node(node: lw.LatexNode, l2tobj: 'LatexNodes2MaskedText') -> str:
         '''
@@ -92,6 +111,7 @@ class LatexNodes2MaskedText(LatexNodes2Text):
         '''
 
         l2tobj.masked_nodes.append(node)
+        l2tobj.masked_node_ids.add(id(node))
         return get_mask_format_str(l2tobj.mask_str).format(idx=len(l2tobj.masked_nodes))
 
     def node_to_text(self, node, prev_node_hint=None, textcol=0):
@@ -101,13 +121,13 @@ class LatexNodes2MaskedText(LatexNodes2Text):
         '''
         if node is not None:
             # unknown macros and their arguments are masked
-            if self.latex_context.last_node_unknown and (
+            if self.last_node_unknown and (
                 isinstance(node, lw.LatexGroupNode) or
                 isinstance(node, lw.LatexCharsNode) and node.chars == '*'
             ):
                 return self.mask_nontext_node(node, self)
             else:
-                self.latex_context.last_node_unknown = False
+                self.last_node_unknown = False
 
             if isinstance(node, lw.LatexMacroNode) and node.macroname in nontext_macros:
                 return self.mask_nontext_node(node, self)
@@ -156,7 +176,7 @@ class LatexNodes2MarkupText(LatexNodes2MaskedText):
                 post_space = node.macro_post_space
                 node.macro_post_space = ''
             n_s = self.node_to_text(node, textcol=textcol)
-            if isinstance(node, lw.LatexMacroNode | lw.LatexGroupNode) and node not in self.masked_nodes:
+            if isinstance(node, lw.LatexMacroNode | lw.LatexGroupNode) and id(node) not in self.masked_node_ids:
                 # zero-argument macro nodes are not markup
                 if not (isinstance(node, lw.LatexMacroNode) and len(node.nodeargd.argspec) == 0):
                     macroname = '' if isinstance(node, lw.LatexGroupNode) \
@@ -171,7 +191,7 @@ class LatexNodes2MarkupText(LatexNodes2MaskedText):
     def macro_node_to_text(self, node):
         # get macro behavior definition.
         macroname = node.macroname
-        mac = self.latex_context.get_macro_spec(macroname)
+        mac = self.get_macro_spec(macroname)
         if mac is None:
             # default for unknown macros
             mac = MacroTextSpec('', discard=True)
@@ -206,24 +226,58 @@ def footnote_repl(node, l2t=None, **kwargs):
     else:
         return ""
 
-custom_ctxdb = CustomLatexContextDb.default()
-custom_ctxdb.set_unknown_macro_spec(
-    MacroTextSpec('', simplify_repl=LatexNodes2MaskedText.mask_nontext_node))
-custom_ctxdb.set_unknown_environment_spec(
-    MacroTextSpec('', simplify_repl=LatexNodes2MaskedText.mask_nontext_node))
-custom_ctxdb.add_context_category(
-    'custom',
-    prepend=True,
-    macros=[MacroTextSpec(m, simplify_repl='%s') for m in ['enquote', 'footnote']],
-)
-custom_ctxdb.add_context_category(
-    'masked',
-    prepend=True,
-    macros=[
-        MacroTextSpec(m, simplify_repl=LatexNodes2MaskedText.mask_nontext_node)
-        for m in ['cite', 'citep', 'citet', 'citeauthor', 'citeyear', 'input']
-    ],
-)
+@cache
+def get_custom_ctxdb() -> CustomLatexContextDb:
+    '''
+    the context for converting LaTeX to text, built on first use
+    '''
+    install_normalize_override()
+
+    custom_ctxdb = CustomLatexContextDb.default()
+    custom_ctxdb.set_unknown_macro_spec(
+        MacroTextSpec('', simplify_repl=LatexNodes2MaskedText.mask_nontext_node))
+    custom_ctxdb.set_unknown_environment_spec(
+        MacroTextSpec('', simplify_repl=LatexNodes2MaskedText.mask_nontext_node))
+    custom_ctxdb.add_context_category(
+        'custom',
+        prepend=True,
+        macros=[MacroTextSpec(m, simplify_repl='%s') for m in ['enquote', 'footnote']],
+    )
+    custom_ctxdb.add_context_category(
+        'masked',
+        prepend=True,
+        macros=[
+            MacroTextSpec(m, simplify_repl=LatexNodes2MaskedText.mask_nontext_node)
+            for m in ['cite', 'citep', 'citet', 'citeauthor', 'citeyear', 'input']
+        ],
+    )
+    custom_ctxdb.freeze()
+    return custom_ctxdb
+
+
+def __getattr__(name: str):
+    # `custom_ctxdb` used to be a module global, built on import
+    if name == 'custom_ctxdb':
+        return get_custom_ctxdb()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+# converters hold per-conversion state, so each thread gets its own set
+__thread_converters = threading.local()
+
+
+def get_markup_converter(mask_str: str = mask_str_default) -> LatexNodes2MarkupText:
+    '''
+    returns a `LatexNodes2MarkupText` instance for the calling thread, which
+    is reused across calls
+    '''
+    converters: dict[str, LatexNodes2MarkupText] | None = getattr(__thread_converters, 'converters', None)
+    if converters is None:
+        converters = __thread_converters.converters = dict()
+
+    if mask_str not in converters:
+        converters[mask_str] = LatexNodes2MarkupText(latex_context=get_custom_ctxdb(), mask_str=mask_str)
+    return converters[mask_str]
 
 
 def nodelist_to_markupstr(nodelist: list[lw.LatexNode], mask_str: str = mask_str_default) -> tuple[MarkupString, list[lw.LatexNode]]:
@@ -232,8 +286,7 @@ def nodelist_to_markupstr(nodelist: list[lw.LatexNode], mask_str: str = mask_str
     this has _some_ issues (e.g. it eats known markup macros such as \\emph)
     it remains to be seen if we find this to be too limiting
     '''
-    totext = LatexNodes2MarkupText(latex_context=custom_ctxdb, mask_str=mask_str)
-    return totext.nodelist_to_text(nodelist), totext.masked_nodes
+    return get_markup_converter(mask_str).convert(nodelist)
 
 
 def nodelist_to_text(nodelist: list[lw.LatexNode], mask_str: str = mask_str_default) -> tuple[str, list[lw.LatexNode]]:
@@ -242,8 +295,7 @@ def nodelist_to_text(nodelist: list[lw.LatexNode], mask_str: str = mask_str_defa
     this has _some_ issues (e.g. it eats known markup macros such as \\emph)
     it remains to be seen if we find this to be too limiting
     '''
-    totext = LatexNodes2MaskedText(latex_context=custom_ctxdb, mask_str=mask_str)
-    return totext.nodelist_to_text(nodelist), totext.masked_nodes
+    return LatexNodes2MaskedText(latex_context=get_custom_ctxdb(), mask_str=mask_str).convert(nodelist)
 
 
 def is_space_or_masked(text: str | MarkupString, mask_str: str = mask_str_default) -> bool:
@@ -1,9 +1,11 @@
+from dataclasses import dataclass, field
 import logging
-from pylatexenc.latexwalker import LatexWalker, get_default_latex_context_db
+from pylatexenc.latexwalker import LatexWalker
 from pylatexenc.latexnodes import ParsingStateDeltaEnterMathMode
 from pylatexenc.latexnodes.parsers import LatexGeneralNodesParser
 from typing import cast
 
+from .latex_context import get_static_latex_context
 from .to_text import nodelist_to_markupstr, is_space_or_masked, mask_str_default
 from .text_item import TextItem
 from .special_commands import separator_macros, translate_macro_args, env_denylist
@@ -11,7 +13,7 @@ from .special_commands import separator_macros, translate_macro_args, env_denyli
 # type imports
 import pylatexenc.latexnodes.nodes as lw
 from pylatexenc.macrospec import LatexContextDb
-from typing import Optional
+from typing import Iterator, Optional
 
 
 def latex_to_nodelist(text: str, latex_context: Optional[LatexContextDb] = None) -> list[lw.LatexNode]:
@@ -28,155 +30,241 @@ def last_node_has_parbreak(nodelist: list[lw.LatexNode]) -> bool:
     return len(nodelist) > 0 and isinstance(nodelist[-1], lw.LatexCharsNode) and nodelist[-1].chars.endswith('\n\n')
 
 
-def get_textitems(
-    nodelist: list[lw.LatexNode],
-    latex_context: LatexContextDb = get_default_latex_context_db(),
-    mask_str: str = mask_str_default
-) -> list[TextItem]:
-    logger = logging.getLogger(__name__)
+@dataclass
+class _TextitemFrame:
+    '''
+    scanning state of a single nodelist in `iter_textitems`
+    '''
 
-    # list of extracted TextItems to be returned
-    textitems = list[TextItem]()
+    nodelist: list[lw.LatexNode]
+    index: int = 0
 
-    # list of nodes associated with the next TextItem to be added to the list
-    textitem_nodelist = list[lw.LatexEnvironmentNode | lw.LatexNode]()
+    # list of nodes associated with the next TextItem to be yielded, the
+    # indices of its first and (past its) last node in `nodelist`, and those of
+    # the nodes left out of it in between
+    textitem_nodelist: list[lw.LatexNode] = field(default_factory=list)
+    textitem_start: int = 0
+    textitem_end: int = 0
+    textitem_skipped: list[int] = field(default_factory=list)
 
     # nodes with nested contents found during iteration (e.g. sections)
-    # they are recursively processed before `textitems` is returned
-    nested_nodes = list[lw.LatexGroupNode | lw.LatexMathNode |
-                        lw.LatexEnvironmentNode]()
+    # they are processed once no TextItem is pending in this nodelist
+    nested_nodes: list[lw.LatexNode] = field(default_factory=list)
+
+    previous_macro: lw.LatexMacroNode | None = None
 
-    def finish_textitem():
+    def finish_textitem(self, mask_str: str) -> TextItem | None:
         '''
-        helper function: package intermediary nodelist into a TextItem to be
-        returned, only if the plaintext representation contains more than
-        whitespace and non-text macros
+        package intermediary nodelist into a TextItem to be returned, only if
+        the plaintext representation contains more than whitespace and non-text
+        macros
 
         in any case, clear the intermediary nodelist for the next TextItem
         '''
 
-        if len(textitem_nodelist) > 0:
+        textitem = None
+        if len(self.textitem_nodelist) > 0:
             # use `pylatexenc` built-in functionality for extracting plain text, modified to
             # mask out non-text macros and math environments
             textitem_text, masked_nodes = nodelist_to_markupstr(
-                textitem_nodelist, mask_str
+                self.textitem_nodelist, mask_str
             )
 
             if not is_space_or_masked(textitem_text, mask_str):
-                textitems.append(
-                    TextItem(
-                        pos=cast(int, textitem_nodelist[0].pos),
-                        text=textitem_text,
-                        nodelist=textitem_nodelist.copy(),
-                        masked_nodes=masked_nodes,
-                        parent_nodelist=nodelist,
-                        mask_str=mask_str
-                    )
+                textitem = TextItem(
+                    text=textitem_text,
+                    parent_nodelist=self.nodelist,
+                    start=self.textitem_start,
+                    end=self.textitem_end,
+                    masked_nodes=masked_nodes,
+                    mask_str=mask_str,
+                    skipped=tuple(index for index in self.textitem_skipped if index < self.textitem_end)
                 )
 
-        textitem_nodelist.clear()
-
-    previous_macro: lw.LatexNode | None = None
-    for node in nodelist:
-        assert node.parsing_state is not None
-        if not node.parsing_state.in_math_mode:
-            match node:
-                case lw.LatexCharsNode():
-                    previous_macro = None
-                    textitem_nodelist.append(node)
-
-                case lw.LatexGroupNode():
-                    # do not recurse into arguments of unknown macros
-                    is_probably_argument = (
-                        previous_macro is not None and
-                        (latex_context.get_macro_spec(previous_macro.macroname)
-                         == latex_context.unknown_macro_spec)
-                    )
-
-                    if not is_probably_argument:
-                        previous_macro = None
-
-                    # treat char-only group nodes and unknown macro arguments as part of the text
-                    if is_probably_argument or all(isinstance(node, lw.LatexCharsNode | lw.LatexGroupNode)
-                                                   for node in node.nodelist):
-                        textitem_nodelist.append(node)
-                    else:
-                        nested_nodes.append(node)
-
-                # special whitespace, newlines, etc.
-                # may want to do something with this later (e.g. in `parsplit`)
-                case lw.LatexSpecialsNode():
-                    previous_macro = None
-                    textitem_nodelist.append(node)
-
-                case lw.LatexMathNode():
-                    previous_macro = None
-                    # find nested `\text` nodes
-                    nested_nodes.append(node)
-
-                    # 'inline' math is treated as part of the text
-                    # 'display' math is treated as part of text too
-                    if last_node_has_parbreak(textitem_nodelist):
-                        finish_textitem()
-                    else:
-                        textitem_nodelist.append(node)
-
-                case lw.LatexMacroNode():
-                    previous_macro = node
-                    # translate section titles, etc.
-                    if node.macroname in translate_macro_args:
-                        for arg_index in translate_macro_args[node.macroname]:
-                            try:
-                                nested_nodes.append(
-                                    node.nodeargd.argnlist[arg_index])
-                            except IndexError:
-                                logger.warning(f'Could not find macro argument {arg_index} for macro \'' +
-                                               f'{node.latex_verbatim()}\'; perhaps a macro definition is missing?')
-
-                    if node.macroname in separator_macros:
-                        finish_textitem()
-                    else:
-                        textitem_nodelist.append(node)
-
-                case lw.LatexEnvironmentNode():
-                    previous_macro = None
-                    # is this a math environment?
-                    if isinstance(node.spec.body_parsing_state_delta, ParsingStateDeltaEnterMathMode):
-                        # find nested `\text` nodes
-                        nested_nodes.append(node)
-
-                        # 'inline' math is treated as part of the text
-                        # 'display' math is treated as part of text too
-                        if last_node_has_parbreak(textitem_nodelist):
-                            finish_textitem()
-                        else:
-                            textitem_nodelist.append(node)
-
-                    else:
-                        finish_textitem()
-                        if node.environmentname not in env_denylist:
-                            nested_nodes.append(node)
-
-                # possibly temporary: break text items on comments
-                # currently, `replace_nodes` breaks if the nodelist to be replaced is discontinuous
-                #   (TODO: emit a warning if that occurs)
-                case lw.LatexCommentNode():
-                    finish_textitem()
-            # match node
-
-        else:
-            if isinstance(node, lw.LatexMacroNode) and node.macroname == 'text':
-                nested_nodes.append(node.nodeargd.argnlist[0])
-
-    finish_textitem()
-
-    for n in (n for n in nested_nodes if hasattr(n, 'nodelist')):
+        self.textitem_nodelist.clear()
+        self.textitem_skipped.clear()
+        return textitem
+
+    def nested_frames(self) -> list['_TextitemFrame']:
+        '''
+        create frames for the pending nested nodes, and clear them
+        '''
+
+        frames = list[_TextitemFrame]()
+        for n in (n for n in self.nested_nodes if hasattr(n, 'nodelist')):
             nested_nodelist = n.nodelist
             if isinstance(nested_nodelist, lw.LatexNodeList):
                 nested_nodelist = nested_nodelist.nodelist
-            textitems.extend(get_textitems(nested_nodelist, latex_context, mask_str))
+            frames.append(_TextitemFrame(nested_nodelist))
+
+        self.nested_nodes.clear()
+        return frames
+
+
+def _process_node(frame: _TextitemFrame, node: lw.LatexNode,
+                  latex_context: LatexContextDb, mask_str: str) -> TextItem | None:
+    '''
+    add `node` to the pending TextItem or the nested nodes of `frame`
 
-    return textitems
+    returns a TextItem, if `node` finishes one
+    '''
+
+    logger = logging.getLogger(__name__)
+
+    assert node.parsing_state is not None
+    if node.parsing_state.in_math_mode:
+        if isinstance(node, lw.LatexMacroNode) and node.macroname == 'text':
+            frame.nested_nodes.append(node.nodeargd.argnlist[0])
+        return None
+
+    match node:
+        case lw.LatexCharsNode():
+            frame.previous_macro = None
+            frame.textitem_nodelist.append(node)
+
+        case lw.LatexGroupNode():
+            # do not recurse into arguments of unknown macros
+            is_probably_argument = (
+                frame.previous_macro is not None and
+                (latex_context.get_macro_spec(frame.previous_macro.macroname)
+                 == latex_context.unknown_macro_spec)
+            )
+
+            if not is_probably_argument:
+                frame.previous_macro = None
+
+            # treat char-only group nodes and unknown macro arguments as part of the text
+            if is_probably_argument or all(isinstance(node, lw.LatexCharsNode | lw.LatexGroupNode)
+                                           for node in node.nodelist):
+                frame.textitem_nodelist.append(node)
+            else:
+                frame.nested_nodes.append(node)
+
+        # special whitespace, newlines, etc.
+        # may want to do something with this later (e.g. in `parsplit`)
+        case lw.LatexSpecialsNode():
+            frame.previous_macro = None
+            frame.textitem_nodelist.append(node)
+
+        case lw.LatexMathNode():
+            frame.previous_macro = None
+            # find nested `\text` nodes
+            frame.nested_nodes.append(node)
+
+            # 'inline' math is treated as part of the text
+            # 'display' math is treated as part of text too
+            if last_node_has_parbreak(frame.textitem_nodelist):
+                return frame.finish_textitem(mask_str)
+            else:
+                frame.textitem_nodelist.append(node)
+
+        case lw.LatexMacroNode():
+            frame.previous_macro = node
+            # translate section titles, etc.
+            if node.macroname in translate_macro_args:
+                for arg_index in translate_macro_args[node.macroname]:
+                    try:
+                        frame.nested_nodes.append(
+                            node.nodeargd.argnlist[arg_index])
+                    except IndexError:
+                        logger.warning(f'Could not find macro argument {arg_index} for macro \'' +
+                                       f'{node.latex_verbatim()}\'; perhaps a macro definition is missing?')
+
+            if node.macroname in separator_macros:
+                return frame.finish_textitem(mask_str)
+            else:
+                frame.textitem_nodelist.append(node)
+
+        case lw.LatexEnvironmentNode():
+            frame.previous_macro = None
+            # is this a math environment?
+            if isinstance(node.spec.body_parsing_state_delta, ParsingStateDeltaEnterMathMode):
+                # find nested `\text` nodes
+                frame.nested_nodes.append(node)
+
+                # 'inline' math is treated as part of the text
+                # 'display' math is treated as part of text too
+                if last_node_has_parbreak(frame.textitem_nodelist):
+                    return frame.finish_textitem(mask_str)
+                else:
+                    frame.textitem_nodelist.append(node)
+
+            else:
+                textitem = frame.finish_textitem(mask_str)
+                if node.environmentname not in env_denylist:
+                    frame.nested_nodes.append(node)
+                return textitem
+
+        # possibly temporary: break text items on comments
+        # currently, `replace_nodes` breaks if the nodelist to be replaced is discontinuous
+        #   (TODO: emit a warning if that occurs)
+        case lw.LatexCommentNode():
+            return frame.finish_textitem(mask_str)
+    # match node
+
+    return None
+
+
+def iter_textitems(
+    nodelist: list[lw.LatexNode],
+    latex_context: Optional[LatexContextDb] = None,
+    mask_str: str = mask_str_default
+) -> Iterator[TextItem]:
+    '''
+    yields the TextItems found in `nodelist` and (recursively) in its nested
+    nodes as soon as each is complete
+
+    nodelists are processed iteratively using an explicit stack; nested nodes
+    are processed as soon as no TextItem is pending in their parent nodelist,
+    so TextItems are yielded in document order
+    '''
+
+    if latex_context is None:
+        latex_context = get_static_latex_context()
+
+    frame_stack = [_TextitemFrame(nodelist)]
+    while len(frame_stack) > 0:
+        frame = frame_stack[-1]
+
+        if len(frame.nested_nodes) > 0 and len(frame.textitem_nodelist) == 0:
+            frame_stack.extend(reversed(frame.nested_frames()))
+            continue
+
+        if frame.index == len(frame.nodelist):
+            textitem = frame.finish_textitem(mask_str)
+            if textitem is not None:
+                yield textitem
+            if len(frame.nested_nodes) == 0:
+                frame_stack.pop()
+            continue
+
+        # textitems are runs of nodes, which start at the first node added to
+        # an empty `textitem_nodelist`
+        if len(frame.textitem_nodelist) == 0:
+            frame.textitem_start = frame.index
+        node_index = frame.index
+        node = frame.nodelist[node_index]
+        frame.index += 1
+
+        pending_nodes = len(frame.textitem_nodelist)
+        textitem = _process_node(frame, node, latex_context, mask_str)
+        if len(frame.textitem_nodelist) > pending_nodes:
+            frame.textitem_end = frame.index
+        elif 0 < pending_nodes == len(frame.textitem_nodelist):
+            # neither added nor finishing the pending textitem (e.g. a group
+            # with nested contents): the node stays in place when it is replaced
+            frame.textitem_skipped.append(node_index)
+        if textitem is not None:
+            yield textitem
+    # while len(frame_stack)
+
+
+def get_textitems(
+    nodelist: list[lw.LatexNode],
+    latex_context: Optional[LatexContextDb] = None,
+    mask_str: str = mask_str_default
+) -> list[TextItem]:
+    return list(iter_textitems(nodelist, latex_context, mask_str))
 
 
 if __name__ == '__main__':
@@ -1,6 +1,6 @@
 # type imports
 from abc import ABC
-from typing import Union, Sequence
+from typing import Literal, Union, Sequence
 
 # type imports
 from latexmt_core.glossary import Glossary
@@ -11,6 +11,8 @@ from latexmt_core.markup_string import MarkupString
 type StringType = Union[str, MarkupString]
 type TokenType = int
 type TokenSequence = Sequence[TokenType]
+# what usage of a translation API is billed by
+type BillingUnit = Literal['characters', 'tokens']
 
 
 class Translator(ABC):
@@ -18,11 +20,20 @@ class Translator(ABC):
     tgt_lang: str
 
     supports_glossary: bool
+    supports_hints: bool
+    billing_unit: BillingUnit | None
+
+    # pairs of similar source texts and their translations, to be considered
+    # by the next call to `translate` if the translator `supports_hints`
+    hints: list[tuple[str, str]]
 
     def __init__(self, src_lang: str, tgt_lang: str):
         self.src_lang = src_lang
         self.tgt_lang = tgt_lang
         self.supports_glossary = False
+        self.supports_hints = False
+        self.billing_unit = None
+        self.hints = []
 
     @property
     def input_tokens(self) -> TokenSequence:
@@ -43,5 +54,20 @@ class Translator(ABC):
     def translate(self, input_text: StringType, glossary: Glossary = {}):
         raise NotImplementedError()
 
+    def count_tokens(self, input_text: StringType, glossary: Glossary = {}) -> int | None:
+        '''
+        number of input tokens a call to `translate` would pass to the model,
+        without translating; `None` if the translator does not know
+        '''
+        return None
+
+    @property
+    def settings(self) -> dict[str, object]:
+        '''
+        the options which determine the output of the translator, besides its
+        class; translations are only reused across runs with equal settings
+        '''
+        return {'src_lang': self.src_lang, 'tgt_lang': self.tgt_lang}
+
     def __repr__(self):
-        return f'{self.__class__.__name__}(src_lang={self.src_lang}, tgt_lang={self.tgt_lang})'
+        return f'{self.__class__.__name__}({', '.join(f'{key}={value}' for key, value in self.settings.items())})'
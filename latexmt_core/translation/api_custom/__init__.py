@@ -27,6 +27,10 @@ class CustomTranslator(Translator):
 
         self.__endpoint = endpoint
 
+    @property
+    def settings(self) -> dict[str, object]:
+        return super().settings | {'endpoint': self.__endpoint}
+
     @property
     def input_tokens(self) -> TokenSequence:
         return []
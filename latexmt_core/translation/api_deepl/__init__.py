@@ -35,6 +35,8 @@ class DeepLTranslator(Translator):
 
         super().__init__(src_lang, tgt_lang)
         self.supports_glossary = True
+        # the characters of the source text
+        self.billing_unit = 'characters'
 
         self.__logger = logger_from_kwargs(**kwargs)
         self.__logger.debug(
@@ -6,6 +6,7 @@ from latexmt_core.context_logger import ContextLogger, logger_from_kwargs
 from latexmt_core.translation import Translator
 
 # type imports
+from typing import Any
 from openai.types.chat import ChatCompletion, ChatCompletionMessageParam
 from latexmt_core.translation import StringType, TokenSequence
 
@@ -25,15 +26,25 @@ class OpenAITranslator(Translator):
     __prompt = 'Translate the text you receive from {src_lang} to {tgt_lang}, and respond only with the translated output.'
     __glossary_prompt = ('Use the following glossary to guide translation. ' +
                          'One entry per line, source and target term(s) are separated by a comma.\n\n')
+    __hints_prompt = ('The following similar texts have been translated before. ' +
+                      'Keep your translation consistent with them where applicable.\n\n')
 
     __input_text: str
     __result: ChatCompletion
 
+    # `tiktoken` encoding of the model, `None` if unavailable and `False` until
+    # first needed; see `count_tokens`
+    __encoding: Any
+
     __logger: ContextLogger
 
     def __init__(self, src_lang: str, tgt_lang: str, **kwargs):
         super().__init__(src_lang, tgt_lang)
         self.supports_glossary = True
+        self.supports_hints = True
+        # prompt and completion tokens
+        self.billing_unit = 'tokens'
+        self.__encoding = False
 
         self.__model = kwargs.pop('openai_model', 'gpt-4o')
         self.__prompt = kwargs.pop('openai_prompt', self.__prompt)
@@ -44,6 +55,10 @@ class OpenAITranslator(Translator):
 
         self.__openai_client = OpenAI(api_key=get_api_token())
 
+    @property
+    def settings(self) -> dict[str, object]:
+        return super().settings | {'model': self.__model, 'prompt': self.__prompt}
+
     @property
     def input_tokens(self) -> TokenSequence:
         return []
@@ -66,9 +81,7 @@ class OpenAITranslator(Translator):
         assert message.content is not None
         return message.content
 
-    def translate(self, input_text: StringType, glossary: dict[str, str] = {}):
-        self.__input_text = str(input_text)
-
+    def __get_messages(self, input_text: str, glossary: dict[str, str]) -> list[ChatCompletionMessageParam]:
         messages: list[ChatCompletionMessageParam] = [
             {
                 'role': 'developer',
@@ -87,7 +100,7 @@ class OpenAITranslator(Translator):
                 'content': [
                         {
                             'type': 'text',
-                            'text': self.input_text
+                            'text': input_text
                         },
                 ]
             },
@@ -107,6 +120,27 @@ class OpenAITranslator(Translator):
                 ]
             })
 
+        if len(self.hints) > 0:
+            hints_str = '\n\n'.join(f'{src_text}\n=>\n{tgt_text}'
+                                     for (src_text, tgt_text)
+                                     in self.hints)
+            messages.insert(1, {
+                'role': 'developer',
+                'content': [
+                    {
+                        'type': 'text',
+                        'text': self.__hints_prompt + hints_str
+                    }
+                ]
+            })
+
+        return messages
+
+    def translate(self, input_text: StringType, glossary: dict[str, str] = {}):
+        self.__input_text = str(input_text)
+
+        messages = self.__get_messages(self.input_text, glossary)
+
         self.__result = self.__openai_client.chat.completions.create(
             model=self.__model,
             messages=messages
@@ -118,3 +152,27 @@ class OpenAITranslator(Translator):
 
         self.__logger.debug('Got OpenAI API result',
                             extra={'result': vars(self.__result)})
+
+    def count_tokens(self, input_text: StringType, glossary: dict[str, str] = {}) -> int:
+        '''
+        counts the tokens of the prompt sent for `input_text` with `tiktoken`,
+        if it is installed and knows the model; otherwise, they are estimated
+        at four characters per token
+
+        the completion is billed as well, and usually about as long as the
+        input text itself
+        '''
+        if self.__encoding is False:
+            try:
+                import tiktoken
+                self.__encoding = tiktoken.encoding_for_model(self.__model)
+            except Exception as e:
+                self.__logger.debug('Estimating tokens from characters', extra={'error': e})
+                self.__encoding = None
+
+        texts = [part['text']
+                 for message in self.__get_messages(str(input_text), glossary)
+                 for part in message['content']]  # type: ignore
+        if self.__encoding is None:
+            return sum(-(-len(text) // 4) for text in texts)
+        return sum(len(self.__encoding.encode(text)) for text in texts)
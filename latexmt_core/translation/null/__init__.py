@@ -1,11 +1,11 @@
-import numpy as np
-
 from latexmt_core.alignment.wordsplit import get_words_and_spans
 from latexmt_core.context_logger import ContextLogger, logger_from_kwargs
 from latexmt_core.markup_string import MarkupString
 
 # type imports
-from typing import Sequence
+from typing import Sequence, TYPE_CHECKING
+if TYPE_CHECKING:
+    import numpy as np
 from latexmt_core.alignment import Aligner, AlignmentWord
 from latexmt_core.markup_string import Markup
 from latexmt_core.translation import Translator, StringType, TokenSequence
@@ -77,7 +77,8 @@ class NullTranslatorAligner(Translator, Aligner):
         return self.source_text
 
     @property
-    def alignments(self) -> np.ndarray:
+    def alignments(self) -> 'np.ndarray':
+        import numpy as np
         return np.identity(len(self.__words), dtype=int)
 
     def align(self, source_text: StringType, target_text: StringType):
@@ -1,23 +1,26 @@
-import numpy as np
-from transformers.tokenization_utils import BatchEncoding
-import torch
 from typing import cast
 
 from latexmt_core.alignment.wordsplit import get_words_and_spans
-from latexmt_core.context_logger import ContextLogger, logger_from_kwargs
+from latexmt_core.context_logger import ContextLogger, LazyExtra, logger_from_kwargs
 from latexmt_core.markup_string import Markup, MarkupString
-from .model import get_model, get_tokenizer
+from latexmt_core.model_weights import check_precision, inference_context
+from .model import get_model, get_model_checkpoint, get_tokenizer
 
 # type imports
-from typing import Any, Optional, Sequence
-from transformers import PreTrainedTokenizer, PreTrainedModel
-from transformers.models.marian import MarianTokenizer, MarianMTModel
+from typing import Any, Optional, Sequence, TYPE_CHECKING
+if TYPE_CHECKING:
+    # torch and transformers are imported on first use (see `model.py`)
+    import numpy as np
+    import torch
+    from transformers import PreTrainedTokenizer, PreTrainedModel
+    from transformers.tokenization_utils import BatchEncoding
 from latexmt_core.alignment import Aligner, AlignmentWord, TokenizedAlignmentWord, words_spans_to_markupstr
+from latexmt_core.model_weights import Precision
 from latexmt_core.translation import Translator, StringType, TokenSequence
 
 
 class OpusTransformersTranslatorAligner(Translator, Aligner):
-    __input: BatchEncoding
+    __input: 'BatchEncoding'
     __output: Any
 
     __input_prefix: str = ''
@@ -34,11 +37,13 @@ class OpusTransformersTranslatorAligner(Translator, Aligner):
     __source_markup_spans: Sequence[Markup]
     __target_markup_spans: Sequence[Markup]
 
-    __attentions: torch.Tensor
-    __word_alignments: torch.Tensor
+    __attentions: 'torch.Tensor'
+    __word_alignments: 'torch.Tensor'
 
-    __tokenizer: PreTrainedTokenizer
-    __model: PreTrainedModel
+    __tokenizer: 'PreTrainedTokenizer'
+    __model: 'PreTrainedModel'
+    __model_checkpoint: str
+    __precision: Precision
 
     __logger: ContextLogger
 
@@ -52,6 +57,8 @@ class OpusTransformersTranslatorAligner(Translator, Aligner):
         - `opus_input_prefix`: a prefix to be added to the input, for multilingual translation models;
           e.g. `>>ita<<`;
           implicitly includes a newline
+        - `precision`: `'fp32'` (default), `'int8'` or `'bf16'`;
+          see `model_weights.Precision`
         '''
 
         super().__init__(src_lang, tgt_lang)
@@ -59,15 +66,20 @@ class OpusTransformersTranslatorAligner(Translator, Aligner):
         # optionally set up alternative model
         model_base: Optional[str] = kwargs.pop('opus_model_base', None)
 
+        precision = check_precision(kwargs.pop('precision', 'fp32'))
+
         # optionally set up input prefix
         self.input_prefix = kwargs.pop('opus_input_prefix', '')
         if self.input_prefix != '':
             self.input_prefix += ' '
 
         self.__logger = logger_from_kwargs(**kwargs)
-        self.__logger.debug('Initialising %s (%s -> %s) with model_base=%s' %
-                            (self.__class__.__name__, src_lang, tgt_lang, model_base))
-        self.__model = get_model(src_lang, tgt_lang, model_base)
+        self.__logger.debug('Initialising %s (%s -> %s) with model_base=%s, precision=%s' %
+                            (self.__class__.__name__, src_lang, tgt_lang, model_base, precision))
+        self.__model, self.__precision = get_model(src_lang, tgt_lang, model_base, precision)
+        self.__model_checkpoint = get_model_checkpoint(src_lang, tgt_lang, model_base) \
+            if model_base is not None \
+            else get_model_checkpoint(src_lang, tgt_lang)
         self.__tokenizer = get_tokenizer(src_lang, tgt_lang, model_base)
 
     def __tokenize_words(self, text: StringType, all_tokens: Optional[TokenSequence] = None) \
@@ -117,6 +129,8 @@ class OpusTransformersTranslatorAligner(Translator, Aligner):
         return words, markup_spans, token_to_word_idx, all_tokens
 
     def __tokenize(self, text: StringType):
+        from transformers.tokenization_utils import BatchEncoding
+
         self.__logger.debug('Tokenising input text')
 
         self.__source_words, self.__source_markup_spans, self.__in_token_to_word_idx, input_tokens = \
@@ -131,19 +145,22 @@ class OpusTransformersTranslatorAligner(Translator, Aligner):
 
     def __set_output(self):
         self.__logger.debug('Passing input to model',
-                            extra={'input_text': self.input_text, 'input_tokens': self.source_words})
-        self.__output = self.__model.generate(**self.__input,  # type: ignore
-                                              num_beams=8,
-                                              num_return_sequences=1,
-                                              # early_stopping=True,
-                                              # this seems to cause tokens to be lost sometimes ??
-                                              # e.g. '#1_ #2_ #3_ #4_ mit #5_' -> '#2_ #3_ #4_ with #5_'
-                                              return_dict_in_generate=True,
-                                              output_attentions=True)
+                            extra={'input_text': LazyExtra(lambda: self.input_text), 'input_tokens': self.source_words})
+        with inference_context(self.__model, self.__precision):
+            self.__output = self.__model.generate(**self.__input,  # type: ignore
+                                                  num_beams=8,
+                                                  num_return_sequences=1,
+                                                  # early_stopping=True,
+                                                  # this seems to cause tokens to be lost sometimes ??
+                                                  # e.g. '#1_ #2_ #3_ #4_ mit #5_' -> '#2_ #3_ #4_ with #5_'
+                                                  return_dict_in_generate=True,
+                                                  output_attentions=True)
         self.__logger.debug('Done translating',
-                            extra={'output_text': self.output_text})
+                            extra={'output_text': LazyExtra(lambda: self.output_text)})
 
     def __set_attentions(self):
+        import torch
+
         self.__logger.debug('Obtaining alignments via attention')
 
         # this seems to give the best results
@@ -173,17 +190,29 @@ class OpusTransformersTranslatorAligner(Translator, Aligner):
 
         self.__attentions = attention_matrix
 
+    @property
+    def precision(self) -> Precision:
+        return self.__precision
+
+    @property
+    def settings(self) -> dict[str, object]:
+        return super().settings | {'model_checkpoint': self.__model_checkpoint,
+                                   'input_prefix': self.input_prefix, 'precision': self.__precision}
+
     @property
     def is_marian(self) -> bool:
+        from transformers.models.marian import MarianMTModel
         return isinstance(self.__model, MarianMTModel)
 
     @property
-    def __input_tokens(self) -> torch.Tensor:
+    def __input_tokens(self) -> 'torch.Tensor':
+        import torch
         return cast(torch.Tensor, self.__input['input_ids'])\
             .type(torch.int32)[0, :-1]
 
     @property
-    def __output_tokens(self) -> torch.Tensor:
+    def __output_tokens(self) -> 'torch.Tensor':
+        import torch
         return cast(torch.Tensor, self.__output['sequences'])\
             .type(torch.int32)[0, 1:-1]
 
@@ -210,6 +239,9 @@ class OpusTransformersTranslatorAligner(Translator, Aligner):
         self.__input = self.__input.to(self.__model.device)
         self.__set_output()
 
+    def count_tokens(self, input_text: StringType, glossary: dict[str, str] = {}) -> int:
+        return len(self.__tokenizer(self.input_prefix + str(input_text))['input_ids'])
+
     @property
     def source_words(self) -> Sequence[AlignmentWord]:
         return self.__source_words
@@ -235,10 +267,12 @@ class OpusTransformersTranslatorAligner(Translator, Aligner):
         return words_spans_to_markupstr(self.target_words, self.target_markup_spans)
 
     @property
-    def alignments(self) -> np.ndarray:
+    def alignments(self) -> 'np.ndarray':
         return self.__word_alignments.numpy()
 
     def align(self, source_text: StringType, target_text: StringType):
+        import torch
+
         if not self.is_marian:
             self.__logger.warning(
                 'Cannot guarantee useful alignments with non-MarianMT models!')
@@ -1,12 +1,16 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-import torch
 from typing import cast
 
+from latexmt_core.model_weights import apply_precision, load_mapped_model
+
 # type imports
-from typing import Optional
-from transformers import PreTrainedTokenizer, PreTrainedModel
+from typing import Optional, TYPE_CHECKING
+if TYPE_CHECKING:
+    from transformers import PreTrainedTokenizer, PreTrainedModel
+from latexmt_core.model_weights import Precision
 
-__loaded_models = dict[str, tuple[PreTrainedTokenizer, PreTrainedModel]]()
+__loaded_tokenizers = dict[str, 'PreTrainedTokenizer']()
+# models by checkpoint and requested precision, along with the precision used
+__loaded_models = dict[tuple[str, Precision], tuple['PreTrainedModel', Precision]]()
 
 
 def get_model_checkpoint(source: str, target: str, model_base: str = 'Helsinki-NLP/opus-mt-{src}-{tgt}') -> str:
@@ -20,32 +24,60 @@ def get_model_checkpoint(source: str, target: str, model_base: str = 'Helsinki-N
     return model_base.format(src=source, tgt=target)
 
 
-def update_model(model_checkpoint: str):
+def update_tokenizer(model_checkpoint: str):
+    global __loaded_tokenizers
+
+    # transformers is only imported once a model is needed
+    from transformers import AutoTokenizer, PreTrainedTokenizer
+
+    if model_checkpoint in __loaded_tokenizers:
+        return
+
+    __loaded_tokenizers[model_checkpoint] = cast(PreTrainedTokenizer,
+                                                 AutoTokenizer.from_pretrained(model_checkpoint))
+
+
+def update_model(model_checkpoint: str, precision: Precision = 'fp32'):
+    '''
+    load the model of `model_checkpoint` for inference at `precision` (see
+    `model_weights.Precision`); int8 models stay on the CPU
+    '''
     global __loaded_models
 
-    tokenizer = cast(PreTrainedTokenizer,
-                     AutoTokenizer.from_pretrained(model_checkpoint))
-    model = cast(PreTrainedModel,
-                 AutoModelForSeq2SeqLM.from_pretrained(model_checkpoint, attn_implementation='eager'))
-    if torch.cuda.is_available():
+    # torch and transformers are only imported once a model is needed
+    from transformers import AutoModelForSeq2SeqLM, PreTrainedModel
+    import torch
+
+    if (model_checkpoint, precision) in __loaded_models:
+        return
+
+    model_kwargs = {'attn_implementation': 'eager'}
+    if torch.cuda.is_available() and precision != 'int8':
+        model = cast(PreTrainedModel, AutoModelForSeq2SeqLM.from_pretrained(model_checkpoint, **model_kwargs))
         model = model.to('cuda')  # type: ignore
+    else:
+        model = load_mapped_model(AutoModelForSeq2SeqLM, model_checkpoint, model_kwargs)
 
-    __loaded_models[model_checkpoint] = (tokenizer, model)
+    __loaded_models[model_checkpoint, precision] = apply_precision(model, precision)
 
 
-def get_tokenizer(source: str = 'de', target: str = 'en', model_base: Optional[str] = None) -> PreTrainedTokenizer:
+def get_tokenizer(source: str = 'de', target: str = 'en', model_base: Optional[str] = None) -> 'PreTrainedTokenizer':
     model_checkpoint = get_model_checkpoint(source, target, model_base) \
         if model_base is not None \
         else get_model_checkpoint(source, target)
 
-    update_model(model_checkpoint)
-    return __loaded_models[model_checkpoint][0]
+    update_tokenizer(model_checkpoint)
+    return __loaded_tokenizers[model_checkpoint]
 
 
-def get_model(source: str = 'de', target: str = 'en', model_base: Optional[str] = None) -> PreTrainedModel:
+def get_model(source: str = 'de', target: str = 'en', model_base: Optional[str] = None,
+              precision: Precision = 'fp32') -> tuple['PreTrainedModel', Precision]:
+    '''
+    returns the model along with the precision it runs at (see `update_model`)
+    '''
     model_checkpoint = get_model_checkpoint(source, target, model_base) \
         if model_base is not None \
         else get_model_checkpoint(source, target)
 
-    update_model(model_checkpoint)
-    return __loaded_models[model_checkpoint][1]
+    update_model(model_checkpoint, precision)
+    return __loaded_models[model_checkpoint, precision]
@@ -0,0 +1,229 @@
+'''
+a pool of forked processes translating and aligning texts in parallel
+
+a single translator cannot use many cores, due to the GIL and the limited
+intra-op scaling of PyTorch; `TranslationPool` instead loads the translator and
+aligner once, then forks its workers, which share the memory holding the model
+weights copy-on-write (see also `model_weights`), and each use a share of the
+cores
+'''
+
+from dataclasses import dataclass, field
+import gc
+import multiprocessing
+import os
+import sys
+import time
+
+from latexmt_core.context_logger import ContextLogger, logger_from_kwargs
+from latexmt_core.get_translator import LazyAligner, LazyTranslator
+import latexmt_core.glossary.align as gloss_align
+
+# type imports
+from multiprocessing.pool import AsyncResult, Pool
+from typing import Iterable, TYPE_CHECKING
+from latexmt_core.alignment import Aligner, words_spans_to_markupstr
+from latexmt_core.markup_string import MarkupString
+from latexmt_core.translation import Translator
+if TYPE_CHECKING:
+    from latexmt_core.document_processor.manifest import Flatlist
+
+
+@dataclass
+class TranslationRequest:
+    '''
+    a paragraph or sentence to be translated and aligned, as it is passed to
+    the translator (i.e. after glossary preprocessing)
+    '''
+
+    text: MarkupString
+    # passed to `Translator.translate`
+    glossary: dict[str, str] = field(default_factory=dict)
+    # applied by `glossary.align`, if not `None`
+    align_glossary: dict[str, str] | None = None
+    hints: list[tuple[str, str]] = field(default_factory=list)
+
+
+@dataclass
+class TranslationResult:
+    flatlist: 'Flatlist'
+    output_text: str
+    input_tokens: int
+    output_tokens: int
+    # time spent by the worker in the stages `translate`, `align` and `glossary`
+    stage_seconds: dict[str, float]
+
+
+# the translator and aligner of a worker process
+_worker_translator: Translator
+_worker_aligner: Aligner
+
+
+def _init_worker(translator: Translator, aligner: Aligner, threads: int):
+    global _worker_translator, _worker_aligner
+
+    # passed on fork, not pickled
+    _worker_translator = translator
+    _worker_aligner = aligner
+
+    if 'torch' in sys.modules:
+        import torch
+        torch.set_num_threads(threads)
+
+
+def _translate(request: TranslationRequest) -> TranslationResult:
+    translator, aligner = _worker_translator, _worker_aligner
+    stage_seconds = dict[str, float]()
+
+    start = time.perf_counter()
+    translator.hints = request.hints
+    try:
+        translator.translate(request.text, request.glossary)
+    finally:
+        translator.hints = []
+    stage_seconds['translate'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    aligner.align(request.text, translator.output_text)
+    stage_seconds['align'] = time.perf_counter() - start
+
+    if request.align_glossary is not None:
+        start = time.perf_counter()
+        out_text = words_spans_to_markupstr(*gloss_align.apply(aligner, request.align_glossary))
+        stage_seconds['glossary'] = time.perf_counter() - start
+    else:
+        out_text = aligner.target_text
+
+    return TranslationResult(
+        flatlist=out_text.to_markup_list(),
+        output_text=translator.output_text,
+        input_tokens=len(translator.input_tokens),
+        output_tokens=len(translator.output_tokens),
+        stage_seconds=stage_seconds,
+    )
+
+
+def _translate_batch(requests: list[TranslationRequest]) -> list[TranslationResult | Exception]:
+    # failures are returned along with the other results of the batch
+    results = list[TranslationResult | Exception]()
+    for request in requests:
+        try:
+            results.append(_translate(request))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class PendingTranslation:
+    '''
+    the result of a request submitted to a `TranslationPool`
+    '''
+
+    __batch: AsyncResult
+    __index: int
+
+    def __init__(self, batch: AsyncResult, index: int):
+        self.__batch = batch
+        self.__index = index
+
+    def result(self) -> TranslationResult:
+        '''
+        wait for the result; raises the exception of a failed translation
+        '''
+        result = self.__batch.get()[self.__index]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def available_cores() -> int:
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class TranslationPool:
+    '''
+    forks `workers` processes, each translating and aligning with its copy of
+    `translator` and `aligner`, using `threads_per_worker` threads for PyTorch
+    (by default, an equal share of the available cores)
+
+    the pool should be created before `translator` is first used, as the
+    thread pools of PyTorch do not survive forking; requests are sent to the
+    workers in batches of `batch_size`, and their results can be collected in
+    the order they were submitted (see `submit_many`)
+
+    only available where processes can be forked (i.e. not on Windows)
+    '''
+
+    translator: Translator
+    aligner: Aligner
+    workers: int
+    threads_per_worker: int
+    batch_size: int
+
+    __pool: Pool
+
+    __logger: ContextLogger
+
+    def __init__(self, translator: Translator, aligner: Aligner, workers: int | None = None,
+                 threads_per_worker: int | None = None, batch_size: int = 4, **kwargs):
+        self.__logger = logger_from_kwargs(**kwargs)
+
+        # the model must be loaded before forking, so that it is shared
+        if isinstance(translator, LazyTranslator):
+            translator = translator.translator
+        if isinstance(aligner, LazyAligner):
+            aligner = aligner.aligner
+        self.translator = translator
+        self.aligner = aligner
+
+        self.workers = workers if workers is not None else available_cores()
+        self.threads_per_worker = threads_per_worker if threads_per_worker is not None \
+            else max(1, available_cores() // self.workers)
+        self.batch_size = batch_size
+
+        self.__logger.info('Starting worker processes', extra={
+            'workers': self.workers, 'threads_per_worker': self.threads_per_worker})
+        # objects existing before forking are kept out of garbage collection in
+        # the workers, which would otherwise touch (and thereby copy) them
+        gc.freeze()
+        try:
+            self.__pool = multiprocessing.get_context('fork').Pool(
+                self.workers, initializer=_init_worker,
+                initargs=(translator, aligner, self.threads_per_worker))
+        finally:
+            gc.unfreeze()
+
+    def submit_many(self, requests: Iterable[TranslationRequest]) -> list[PendingTranslation]:
+        '''
+        submit requests in batches, to be translated in parallel; returns their
+        pending results, in order
+        '''
+        requests = list(requests)
+        pending = list[PendingTranslation]()
+        for batch_start in range(0, len(requests), self.batch_size):
+            batch = self.__pool.apply_async(_translate_batch,
+                                            (requests[batch_start:batch_start + self.batch_size], ))
+            pending.extend(PendingTranslation(batch, index)
+                           for index in range(min(self.batch_size, len(requests) - batch_start)))
+        return pending
+
+    def submit(self, request: TranslationRequest) -> PendingTranslation:
+        return self.submit_many([request])[0]
+
+    def translate(self, request: TranslationRequest) -> TranslationResult:
+        return self.submit(request).result()
+
+    def close(self):
+        '''
+        finish all submitted requests, then stop the workers
+        '''
+        self.__pool.close()
+        self.__pool.join()
+
+    def __enter__(self) -> 'TranslationPool':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
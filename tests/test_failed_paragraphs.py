@@ -0,0 +1,92 @@
+'''
+regression tests for runs in which the translation of paragraphs failed, whose
+output must not be reused by later runs
+
+run with `python -m unittest discover tests` (or `pytest`)
+'''
+
+from pathlib import Path
+import tempfile
+import unittest
+
+from latexmt_core.document_processor import DocumentTranslator
+from latexmt_core.translation.null import NullTranslatorAligner
+
+
+failing_input = ('Ein Absatz hier.\n\n'
+                 'Ein Fehler hier.\n\n'
+                 'Noch ein Satz.\n')
+failed_note = 'Translation of the following paragraph failed'
+
+
+class FailingTranslatorAligner(NullTranslatorAligner):
+    '''
+    fails to translate paragraphs containing `Fehler`, as long as `failing` is
+    set
+    '''
+
+    failing: bool = True
+
+    def translate(self, input_text, glossary: dict[str, str] = {}):
+        if self.failing and 'Fehler' in str(input_text):
+            raise RuntimeError('translation failed')
+        super().translate(input_text, glossary)
+
+
+class FailedParagraphsTest(unittest.TestCase):
+    def run_twice(self, **kwargs) -> tuple[DocumentTranslator, str]:
+        '''
+        translate `failing_input` with a failing translator, then again with a
+        working one; returns the second document translator and its output
+        '''
+        translator = FailingTranslatorAligner('de', 'en')
+        with tempfile.TemporaryDirectory() as work_dir:
+            input_path = Path(work_dir, 'main.tex')
+            input_path.write_text(failing_input)
+            output_dir = Path(work_dir, 'output')
+
+            DocumentTranslator(translator, translator, **kwargs).process_document(input_path, output_dir)
+            self.assertIn(failed_note, Path(output_dir, 'main.tex').read_text())
+
+            translator.failing = False
+            document_translator = DocumentTranslator(translator, translator, **kwargs)
+            document_translator.process_document(input_path, output_dir)
+            return document_translator, Path(output_dir, 'main.tex').read_text()
+
+    def test_incremental_retries_failed_paragraphs(self):
+        document_translator, output = self.run_twice(incremental=True)
+
+        self.assertNotIn(failed_note, output)
+        self.assertIn('Ein Fehler hier.', output)
+        summary = document_translator.incremental_summary
+        assert summary is not None
+        self.assertEqual(summary.reused_files, 0)
+        self.assertEqual(summary.translated_paragraphs, 1)
+
+    def test_resume_retries_failed_paragraphs(self):
+        translator = FailingTranslatorAligner('de', 'en')
+        with tempfile.TemporaryDirectory() as work_dir:
+            input_path = Path(work_dir, 'main.tex')
+            input_path.write_text(failing_input)
+            output_dir = Path(work_dir, 'output')
+            journal_path = Path(work_dir, 'output.journal')
+
+            DocumentTranslator(translator, translator, checkpoint=True).process_document(input_path, output_dir)
+            self.assertTrue(journal_path.exists())
+            self.assertNotIn('"file"', journal_path.read_text())
+
+            translator.failing = False
+            document_translator = DocumentTranslator(translator, translator, resume=True)
+            document_translator.process_document(input_path, output_dir)
+            output = Path(output_dir, 'main.tex').read_text()
+
+        self.assertNotIn(failed_note, output)
+        self.assertIn('Ein Fehler hier.', output)
+        summary = document_translator.incremental_summary
+        assert summary is not None
+        self.assertEqual(summary.translated_paragraphs, 1)
+        self.assertFalse(journal_path.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
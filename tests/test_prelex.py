@@ -0,0 +1,52 @@
+'''
+regression tests for the pre-pass carving out regions which need not be parsed
+
+run with `python -m unittest discover tests` (or `pytest`)
+'''
+
+from pathlib import Path
+import tempfile
+import unittest
+
+from latexmt_core.document_processor import DocumentTranslator
+from latexmt_core.parsing.prelex import carve_opaque_regions
+from latexmt_core.translation.null import NullTranslatorAligner
+
+
+prelex_input = ('\\documentclass{article}\n'
+                '\\newcommand{\\foo}[1]{\\textbf{#1}}\n'
+                '\\textbf{Gruppe im Vorspann}\n'
+                '\\begin{document}\n'
+                'Eine Gruppe hier.\n'
+                '\\begin{tikzpicture}\\node {Gruppe};\\end{tikzpicture}\n'
+                '\\end{document}\n')
+
+
+class PrelexTest(unittest.TestCase):
+    def test_preamble_kept(self):
+        text, regions = carve_opaque_regions(prelex_input)
+
+        self.assertIn('\\textbf{Gruppe im Vorspann}', text)
+        self.assertNotIn('\\node', text)
+        self.assertEqual(regions.restore(text), prelex_input)
+
+    def test_output_matches_without_prelex(self):
+        translator = NullTranslatorAligner('de', 'en')
+        glossary = {'Gruppe': 'Group'}
+        with tempfile.TemporaryDirectory() as work_dir:
+            input_path = Path(work_dir, 'main.tex')
+            input_path.write_text(prelex_input)
+
+            outputs = dict[bool, str]()
+            for prelex in [False, True]:
+                output_dir = Path(work_dir, f'output-{prelex}')
+                DocumentTranslator(translator, translator, glossary=glossary, prelex=prelex) \
+                    .process_document(input_path, output_dir)
+                outputs[prelex] = Path(output_dir, 'main.tex').read_text()
+
+        self.assertIn('Group im Vorspann', outputs[True])
+        self.assertEqual(outputs[True], outputs[False])
+
+
+if __name__ == '__main__':
+    unittest.main()
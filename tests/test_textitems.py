@@ -0,0 +1,57 @@
+'''
+regression tests for textitems interrupted by nodes with nested contents
+
+run with `python -m unittest discover tests` (or `pytest`)
+'''
+
+from pathlib import Path
+import tempfile
+import unittest
+
+from latexmt_core.document_processor import DocumentTranslator
+from latexmt_core.parsing.latex_context import get_latex_context
+from latexmt_core.parsing.unpack import get_textitems, latex_to_nodelist
+from latexmt_core.translation.null import NullTranslatorAligner
+
+
+group_input = ('Ein Absatz hier.\n\n'
+               '{\\large Gruppe mit \\begin{tikzpicture}x\\end{tikzpicture} drin}\n\n'
+               'Noch ein Satz.\n')
+group_source = '{\\large Gruppe mit \\begin{tikzpicture}x\\end{tikzpicture} drin}'
+
+
+class SkippedGroupTest(unittest.TestCase):
+    def test_textitem_leaves_out_group(self):
+        latex_context = get_latex_context([])
+        nodelist = latex_to_nodelist(group_input, latex_context)
+        textitems = get_textitems(nodelist, latex_context)
+
+        for textitem in textitems:
+            if textitem.parent_nodelist is nodelist:
+                self.assertNotIn(group_source, ''.join(node.latex_verbatim() for node in textitem.nodelist))
+
+        skipped = [node for textitem in textitems for node in textitem.skipped_nodes]
+        self.assertEqual([node.latex_verbatim() for node in skipped], [group_source])
+
+    def test_group_kept_in_output(self):
+        translator = NullTranslatorAligner('de', 'en')
+        # the glossary changes the text of the group's own textitem as well
+        glossary = {'Gruppe': 'Group'}
+        with tempfile.TemporaryDirectory() as work_dir:
+            input_path = Path(work_dir, 'main.tex')
+            input_path.write_text(group_input)
+
+            for output_mode in ['nodes', 'spans']:
+                with self.subTest(output_mode=output_mode):
+                    output_dir = Path(work_dir, f'output-{output_mode}')
+                    DocumentTranslator(translator, translator, glossary=glossary, output_mode=output_mode) \
+                        .process_document(input_path, output_dir)
+                    output = Path(output_dir, 'main.tex').read_text()
+
+                    self.assertEqual(output.count(group_source.replace('Gruppe', 'Group')), 1)
+                    self.assertEqual(output.count('Noch ein Satz.'), 1)
+                    self.assertIn('Ein Absatz hier.', output)
+
+
+if __name__ == '__main__':
+    unittest.main()
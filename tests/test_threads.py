@@ -0,0 +1,51 @@
+'''
+regression test for textitem extraction on many threads at once (see
+`benchmarks/to_text_threads.py` for the larger stress test)
+
+run with `python -m unittest discover tests` (or `pytest`)
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+from benchmarks.corpus import CorpusGenerator, CorpusParams
+from benchmarks.to_text_threads import extract
+from latexmt_core.parsing.latex_context import get_latex_context
+from latexmt_core.parsing.unpack import latex_to_nodelist
+
+
+class ThreadedExtractionTest(unittest.TestCase):
+    threads = 8
+    copies = 8
+
+    def test_threads_match_serial_run(self):
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            # macros unknown to the LaTeX context take the slow path of the
+            # conversion to text
+            params = CorpusParams(paragraphs=20, tikz_blocks=0, verbatim_blocks=0, unknown_macro_density=0.5)
+            input_text = CorpusGenerator(params).generate(Path(corpus_dir)).read_text()
+
+        latex_context = get_latex_context([])
+        # every copy is converted once, as the conversion modifies the nodes
+        nodelists = [latex_to_nodelist(input_text, latex_context) for _ in range(self.copies + 1)]
+        expected = extract(nodelists.pop())
+        self.assertGreater(len(expected), 0)
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with ThreadPoolExecutor(self.threads) as executor:
+                results = list(executor.map(extract, nodelists))
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        for copy, result in enumerate(results):
+            with self.subTest(copy=copy):
+                self.assertEqual(result, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()